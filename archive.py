@@ -0,0 +1,250 @@
+"""Архив закрытых заказов: старые заказы вместе с платежами, штрафами и отзывами переносятся
+из оперативных таблиц в таблицы *archive (models.RentalOrderArchive и др.) с теми же id.
+
+Переносятся закрытые заказы (order_status = Closed), начатые раньше чем ARCHIVE_AFTER_DAYS дней
+назад, без неоплаченных штрафов — долги остаются в оперативных таблицах. Каждая пачка из
+ARCHIVE_BATCH заказов — отдельная транзакция: INSERT ... SELECT в архив и DELETE из оперативных
+таблиц. В PostgreSQL заказы пачки блокируются FOR UPDATE SKIP LOCKED, поэтому перенос можно
+запускать из нескольких процессов одновременно.
+
+Запуск — задача archive планировщика (scheduler.py) раз в ARCHIVE_INTERVAL_SECONDS или вручную:
+    python archive.py --days 365
+Тем же запуском удаляются надгробия старше TOMBSTONE_DAYS (sync.prune_tombstones).
+
+Чтение: списки заказов, платежей, штрафов и отзывов и финансовая ведомость подключают архив
+через UNION ALL (with_archive) только тогда, когда запрос может его задеть (needs_archive):
+нижняя граница даты (start_from, payment_from, issue_from) не позже самой поздней даты в архиве,
+а фильтр статуса заказа не исключает Closed. Запросы за свежие даты и по открытым заказам
+архив не читают. Самая поздняя дата архива (и то, пуст ли он) запоминается в процессе на
+ARCHIVE_PROBE_SECONDS, а не запрашивается на каждый список.
+
+Архив только для чтения: PUT/DELETE архивной записи — 409 (archived_error), /{resource}/{id}/related
+находит её в архиве (relations.load_related).
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import delete, exists, false, func, insert, union_all
+from sqlalchemy.sql.util import ClauseAdapter
+from sqlmodel import Session, select
+
+from sync import prune_tombstones
+from models import (
+    RentalOrder, Payment, Fine, Review,
+    RentalOrderArchive, PaymentArchive, FineArchive, ReviewArchive,
+)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "1000"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "0"))
+ARCHIVE_PROBE_SECONDS = float(os.getenv("ARCHIVE_PROBE_SECONDS", "30"))
+
+# Статус заказов, которые переносятся в архив
+ARCHIVED_STATUS = "Closed"
+
+# Параметр транзакции переноса: по нему триггеры счётчиков /stats/ и ленты /feed/ пропускают DELETE
+# (migrations/009_archive_stats.sql, 010_archive_feed.sql) — перенесённые строки не исчезают
+ARCHIVING_SETTING = "car_rental.archiving"
+
+ARCHIVED_DETAIL = "Запись перенесена в архив: изменять и удалять её нельзя"
+
+logger = logging.getLogger("car_rental.archive")
+
+# Оперативная модель -> архивная
+ARCHIVES = {
+    RentalOrder: RentalOrderArchive,
+    Payment: PaymentArchive,
+    Fine: FineArchive,
+    Review: ReviewArchive,
+}
+
+# Фильтр нижней границы даты и колонка даты, по которым решается, нужен ли архив
+ARCHIVE_RANGES = {
+    RentalOrder: ("start_from", "start_date"),
+    Payment: ("payment_from", "payment_date"),
+    Fine: ("issue_from", "issue_date"),
+}
+
+# Дети заказа переносятся вслед за ним (в архиве они ссылаются на архивные заказы)
+ORDER_CHILDREN = (Payment, Fine, Review)
+
+
+# ---------- Чтение ----------
+
+def combined(model):
+    """Оперативная таблица и её архив одним подзапросом UNION ALL с колонками оперативной."""
+    table = model.__table__
+    archive = ARCHIVES[model].__table__
+    return union_all(
+        select(*table.columns),
+        select(*[archive.c[column.key] for column in table.columns]),
+    ).subquery(f"{table.name}_all")
+
+
+def with_archive(statement, *models):
+    """Тот же запрос, но вместо таблиц models — они вместе с архивом.
+
+    Колонки оперативной таблицы в условиях, сортировке и подзапросах заменяются колонками
+    UNION ALL; PostgreSQL и SQLite переносят условия внутрь каждой половины объединения.
+    """
+    for model in models:
+        statement = ClauseAdapter(combined(model)).traverse(statement)
+    return statement
+
+
+def entities_with_archive(model, statement):
+    """ORM-запрос select(model) вместе с архивом: строки UNION ALL загружаются как объекты модели."""
+    core = with_archive(statement.with_only_columns(*model.__table__.columns), model)
+    return select(model).from_statement(core)
+
+
+_newest = {}  # модель -> (время проверки, самая поздняя дата архива или None, если архив пуст)
+
+
+def newest_archived(session: Session, model):
+    """Самая поздняя дата в архиве модели (для отзывов — наибольший id); None — архив пуст.
+
+    Запоминается на ARCHIVE_PROBE_SECONDS; перенос в этом процессе сбрасывает значение сразу,
+    перенос в другом процессе станет виден не позже чем через ARCHIVE_PROBE_SECONDS.
+    """
+    checked = _newest.get(model)
+    if checked is not None and time.monotonic() - checked[0] < ARCHIVE_PROBE_SECONDS:
+        return checked[1]
+    archive = ARCHIVES[model]
+    _, column = ARCHIVE_RANGES.get(model, (None, "id"))
+    # max() по индексированной колонке — одно чтение края индекса
+    newest = session.execute(select(func.max(getattr(archive, column)))).scalar()
+    _newest[model] = (time.monotonic(), newest)
+    return newest
+
+
+def needs_archive(session: Session, model, filters: dict) -> bool:
+    """Может ли запрос с такими фильтрами задеть архивные строки модели."""
+    if model not in ARCHIVES:
+        return False
+    if model is RentalOrder and filters.get("order_status") not in (None, ARCHIVED_STATUS):
+        return False
+    newest = newest_archived(session, model)
+    if newest is None:
+        return False
+    name, _ = ARCHIVE_RANGES.get(model, (None, None))
+    lower = filters.get(name) if name else None
+    return lower is None or lower <= newest
+
+
+def is_archived(session: Session, model, item_id: int) -> bool:
+    archive = ARCHIVES.get(model)
+    return archive is not None and session.execute(select(archive.id).where(archive.id == item_id)).first() is not None
+
+
+def archived_error(session: Session, model, item_id: int, detail: str) -> HTTPException:
+    """Ошибка для записи, которой нет в оперативной таблице: 409, если она в архиве, иначе 404 с detail."""
+    if is_archived(session, model, item_id):
+        return HTTPException(status_code=409, detail=ARCHIVED_DETAIL)
+    return HTTPException(status_code=404, detail=detail)
+
+
+# ---------- Перенос ----------
+
+def _is_postgres(session: Session) -> bool:
+    return session.get_bind().dialect.name == "postgresql"
+
+
+def archive_batch(session: Session, cutoff: datetime, batch: int = ARCHIVE_BATCH) -> int:
+    """Переносит одну пачку заказов, начатых раньше cutoff, и коммитит; возвращает число заказов."""
+    candidates = (
+        select(RentalOrder.id)
+        .where(
+            RentalOrder.order_status == ARCHIVED_STATUS,
+            RentalOrder.start_date < cutoff,
+            ~exists().where(Fine.order_id == RentalOrder.id, Fine.is_paid == false()),
+        )
+        .order_by(RentalOrder.id)
+        .limit(batch)
+    )
+    if _is_postgres(session):
+        candidates = candidates.with_for_update(skip_locked=True)
+    ids = list(session.execute(candidates).scalars())
+    if not ids:
+        session.rollback()
+        return 0
+
+    keys = {RentalOrder: RentalOrder.id, **{model: model.order_id for model in ORDER_CHILDREN}}
+    if _is_postgres(session):
+        # Только до конца транзакции пачки (is_local = true)
+        session.execute(select(func.set_config(ARCHIVING_SETTING, "on", True)))
+    # Сначала заказы — на них ссылаются архивные дети; удаляются в обратном порядке
+    for model in (RentalOrder, *ORDER_CHILDREN):
+        table = model.__table__
+        source = select(*table.columns).where(keys[model].in_(ids))
+        session.execute(insert(ARCHIVES[model].__table__).from_select([c.key for c in table.columns], source))
+    for model in (*ORDER_CHILDREN, RentalOrder):
+        session.execute(delete(model.__table__).where(keys[model].in_(ids)))
+    session.commit()
+    _newest.clear()
+    return len(ids)
+
+
+_status = {"runs": 0, "orders": 0, "last_run": None, "last_orders": 0, "last_seconds": None, "error": None}
+
+
+def archive_closed_orders(engine, days: int = ARCHIVE_AFTER_DAYS, batch: int = ARCHIVE_BATCH) -> int:
+    """Переносит в архив все подходящие заказы пачками; возвращает их число."""
+    cutoff = datetime.now() - timedelta(days=days)
+    started = time.monotonic()
+    moved = 0
+    try:
+        while True:
+            with Session(engine) as session:
+                count = archive_batch(session, cutoff, batch)
+            moved += count
+            if count < batch:
+                break
+    except Exception as e:
+        _status["error"] = str(e)
+        raise
+    finally:
+        elapsed = time.monotonic() - started
+        _status.update(runs=_status["runs"] + 1, orders=_status["orders"] + moved,
+                       last_run=datetime.now().isoformat(timespec="seconds"),
+                       last_orders=moved, last_seconds=round(elapsed, 3))
+    _status["error"] = None
+    if moved:
+        logger.info("Архив: перенесено %s заказов старше %s за %.1f с", moved, cutoff.date(), elapsed)
+    return moved
+
+
+def archive_job(engine) -> dict:
+    """Задача планировщика: перенос в архив и очистка старых надгробий."""
+    orders = archive_closed_orders(engine)
+    with Session(engine) as session:
+        tombstones = prune_tombstones(session)
+    return {"orders": orders, "tombstones": tombstones}
+
+
+def archive_status() -> dict:
+    return {
+        "interval_seconds": ARCHIVE_INTERVAL_SECONDS,
+        "after_days": ARCHIVE_AFTER_DAYS,
+        **_status,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос старых закрытых заказов в архив")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="заказы, начатые раньше N дней назад")
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH, help="заказов в одной транзакции")
+    args = parser.parse_args()
+
+    from database import engine
+    print(f"перенесено заказов: {archive_closed_orders(engine, args.days, args.batch)}")
+    with Session(engine) as session:
+        print(f"удалено надгробий: {prune_tombstones(session)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Асинхронные версии CRUD-эндпоинтов (AsyncSession + asyncpg).
+
+Пока запрос ждёт PostgreSQL, обработчик не занимает поток threadpool, поэтому один
+воркер uvicorn держит сотни запросов одновременно. Режим подключения задаётся
+переменной окружения ASYNC_API:
+- off     — асинхронные эндпоинты не подключаются;
+- prefix  — (по умолчанию) доступны по /async/..., синхронные остаются на своих путях;
+- primary — асинхронные обслуживают основные пути (/vehicles/ и т.д.) вместо синхронных.
+Так одну и ту же нагрузку можно подать на оба варианта и сравнить.
+"""
+import os
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.exc import IntegrityError
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import get_async_session
+from models import RESOURCES, RentalOrder
+from pagination import (
+    PageParams, build_page_query, delta_page, fast_page, finish_page, filters_from_query, page_columns, page_model,
+    projection, with_sync_token, NEXT_CURSOR_HEADER,
+)
+from sync import deleted_ids, sync_token
+from archive import archived_error, entities_with_archive, needs_archive, with_archive
+from fastjson import FAST_JSON
+from crud import find_dependents, insert_returning, update_returning, delete_returning
+from orders import insert_order, patch_order, release_vehicle, integrity_error
+from cache import cache_key, invalidate, is_cached, make_entry, response_cache
+
+ASYNC_API = os.getenv("ASYNC_API", "prefix")
+
+async_router = APIRouter()
+
+
+async def _write(session: AsyncSession, write, *args):
+    """Выполняет запись из crud/orders через run_sync и фиксирует транзакцию."""
+    try:
+        result = await session.run_sync(write, *args)
+        await session.commit()
+    except IntegrityError as e:
+        # 409 — только пересечение бронирований заказа, остальные ограничения — 400 с причиной
+        await session.rollback()
+        raise integrity_error(e)
+    return result
+
+
+def _add_routes(resource: str, model):
+    tags = [f"async: {resource}"]
+
+    async def _page(request: Request, response: Response, page: PageParams, session: AsyncSession):
+        # Те же фильтры из белого списка, что и у синхронных списков
+        filters = filters_from_query(model, request.query_params)
+        token = sync_token()
+        statement = build_page_query(model, page, filters)
+        fields = projection(model, page.fields)
+        if page.updated_since is not None:
+            deleted = await session.run_sync(deleted_ids, model, page.updated_since) if not page.after else []
+            connection = await session.connection()
+            statement = statement.with_only_columns(*page_columns(model, page, fields))
+            result = delta_page(model, page, await connection.execute(statement), deleted, fields)
+            return with_sync_token(result, page, token)
+        archived = await session.run_sync(needs_archive, model, filters)
+        if FAST_JSON or fields:
+            connection = await session.connection()
+            statement = statement.with_only_columns(*page_columns(model, page, fields))
+            if archived:
+                statement = with_archive(statement, model)
+            return with_sync_token(fast_page(model, page, await connection.execute(statement), fields), page, token)
+        if archived:
+            rows = (await session.execute(entities_with_archive(model, statement))).scalars().all()
+        else:
+            rows = (await session.exec(statement)).all()
+        items, next_cursor = finish_page(model, page, rows)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        with_sync_token(response, page, token)
+        return items
+
+    @async_router.get(f"/{resource}/", response_model=page_model(model), tags=tags, name=f"async_list_{resource}")
+    async def list_items(
+        request: Request,
+        response: Response,
+        page: PageParams = Depends(),
+        session: AsyncSession = Depends(get_async_session),
+    ):
+        # Справочники — через тот же кэш, что и синхронные списки
+        if is_cached(model):
+            key = cache_key(request, model)
+            entry = response_cache.get(key)
+            if entry is None:
+                version = response_cache.version(model.__tablename__)
+                entry = make_entry(model, await _page(request, response, page, session), response)
+                response_cache.put(key, entry, version)
+            return entry.respond(request)
+        return await _page(request, response, page, session)
+
+    @async_router.post(f"/{resource}/", response_model=model, tags=tags, name=f"async_create_{resource}")
+    async def create_item(item: model, session: AsyncSession = Depends(get_async_session)):
+        # Та же синхронная логика, что и у обычных эндпоинтов: INSERT ... RETURNING,
+        # для заказов — с проверкой пересечений бронирований. Даты приводятся к типам модели (asyncpg не принимает строки)
+        if model is RentalOrder:
+            item = await _write(session, insert_order, item)
+        else:
+            item = await _write(session, insert_returning, model, item)
+        invalidate(model)
+        return item
+
+    @async_router.put(f"/{resource}/{{item_id}}", response_model=model, tags=tags, name=f"async_update_{resource}")
+    async def update_item(item_id: int, item_data: model, session: AsyncSession = Depends(get_async_session)):
+        changes = item_data.dict(exclude_unset=True)
+        if model is RentalOrder:
+            db_item = await _write(session, patch_order, item_id, changes)
+        else:
+            db_item = await _write(session, update_returning, model, item_id, changes)
+        if not db_item:
+            # Архивные заказы, платежи, штрафы и отзывы — 409, остальное — 404
+            raise await session.run_sync(archived_error, model, item_id, "Запись не найдена")
+        invalidate(model)
+        return db_item
+
+    @async_router.delete(f"/{resource}/{{item_id}}", tags=tags, name=f"async_delete_{resource}")
+    async def delete_item(item_id: int, session: AsyncSession = Depends(get_async_session)):
+        tables = await session.run_sync(find_dependents, model, item_id)
+        if tables:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Нельзя удалить запись: есть связанные данные ({', '.join(tables)})."
+            )
+
+        db_item = await session.run_sync(delete_returning, model, item_id)
+        if not db_item:
+            raise await session.run_sync(archived_error, model, item_id, "Запись не найдена")
+        if model is RentalOrder:
+            await session.run_sync(release_vehicle, db_item)
+        await session.commit()
+        invalidate(model)
+        return {"ok": True}
+
+for _resource, _model in RESOURCES.items():
+    _add_routes(_resource, _model)
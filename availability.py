@@ -0,0 +1,91 @@
+"""Поиск свободных автомобилей по интервалам заказов и ремонтов.
+
+Занятость авто определяется не флагом Vehicle.status, а пересечением интервалов:
+- заказ занимает [start_date, end_date_actual или end_date_planned), отменённые не учитываются;
+- ремонт занимает [start_date, end_date] по дням, открытый ремонт (end_date = NULL) — бессрочно.
+
+В PostgreSQL условия записаны через tsrange/daterange и оператор &&, чтобы использовать
+GiST-индексы из migrations/002_booking_intervals.sql (там же ограничение EXCLUDE,
+которое не даёт двум заказам одного авто пересечься даже при гонке запросов).
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, exists, func, literal, or_
+from sqlmodel import Session, select
+
+from models import CarModel, Vehicle, RentalOrder, Maintenance
+
+# Статусы заказов, которые не занимают машину
+INACTIVE_ORDER_STATUSES = ("Cancelled",)
+
+
+def _is_postgres(session: Session) -> bool:
+    return session.get_bind().dialect.name == "postgresql"
+
+
+def order_overlap(session: Session, start: datetime, end: datetime):
+    """Условие "заказ пересекается с интервалом [start, end)"."""
+    order_end = func.coalesce(RentalOrder.end_date_actual, RentalOrder.end_date_planned)
+    if _is_postgres(session):
+        # То же выражение, что и в ограничении EXCLUDE, — планировщик использует его GiST-индекс
+        overlap = func.tsrange(RentalOrder.start_date, order_end).op("&&")(func.tsrange(start, end))
+    else:
+        overlap = and_(RentalOrder.start_date < end, order_end > start)
+    return and_(overlap, RentalOrder.order_status.notin_(INACTIVE_ORDER_STATUSES))
+
+
+def maintenance_overlap(session: Session, start: datetime, end: datetime):
+    """Условие "ремонт пересекается с днями интервала [start, end]"."""
+    if _is_postgres(session):
+        period = func.daterange(Maintenance.start_date, Maintenance.end_date, literal("[]"))
+        return period.op("&&")(func.daterange(start.date(), end.date(), literal("[]")))
+    return and_(
+        Maintenance.start_date <= end.date(),
+        or_(Maintenance.end_date.is_(None), Maintenance.end_date >= start.date()),
+    )
+
+
+def busy_conditions(session: Session, start: datetime, end: datetime, exclude_order_id: Optional[int] = None):
+    """Коррелированные EXISTS: у авто есть пересекающийся заказ или ремонт."""
+    orders = order_overlap(session, start, end)
+    if exclude_order_id is not None:
+        orders = and_(orders, RentalOrder.id != exclude_order_id)
+    has_order = exists().where(RentalOrder.vehicle_id == Vehicle.id, orders)
+    has_maintenance = exists().where(Maintenance.vehicle_id == Vehicle.id, maintenance_overlap(session, start, end))
+    return has_order, has_maintenance
+
+
+def find_available(
+    session: Session,
+    start: datetime,
+    end: datetime,
+    car_class: Optional[str] = None,
+    model_id: Optional[int] = None,
+    limit: int = 100,
+):
+    """Автомобили, свободные на весь интервал [start, end)."""
+    has_order, has_maintenance = busy_conditions(session, start, end)
+    statement = select(Vehicle).where(~has_order, ~has_maintenance)
+    if model_id is not None:
+        statement = statement.where(Vehicle.model_id == model_id)
+    if car_class:
+        statement = statement.join(CarModel).where(CarModel.car_class == car_class)
+    return session.exec(statement.order_by(Vehicle.id).limit(limit)).all()
+
+
+def lock_vehicle(session: Session, vehicle_id: int) -> Optional[Vehicle]:
+    """SELECT ... FOR UPDATE: бронирования одного авто проверяются и записываются по очереди."""
+    return session.exec(select(Vehicle).where(Vehicle.id == vehicle_id).with_for_update()).first()
+
+
+def is_vehicle_busy(
+    session: Session,
+    vehicle_id: int,
+    start: datetime,
+    end: datetime,
+    exclude_order_id: Optional[int] = None,
+) -> bool:
+    has_order, has_maintenance = busy_conditions(session, start, end, exclude_order_id)
+    statement = select(or_(has_order, has_maintenance)).where(Vehicle.id == vehicle_id)
+    return bool(session.exec(statement).first())
@@ -0,0 +1,405 @@
+# benchmark.py
+"""Воспроизводимый бенчмарк API.
+
+Поднимает приложение из main.py в том же процессе (или обращается к --url) и по очереди
+нагружает эндпоинты с заданной параллельностью:
+- списки и связанные записи всех десяти ресурсов, поиск свободных машин;
+- создание, изменение и удаление записей каждого ресурса (созданные записи удаляются в конце),
+  для заказов — полный сценарий бронирования через POST /orders/.
+
+По каждому эндпоинту выводятся p50/p95/p99 задержки, пропускная способность, число ошибок
+и число SQL-запросов на один HTTP-запрос (только в режиме без --url).
+
+Холодный старт (--cold-start N, без --url): N раз запускается новый процесс, который импортирует
+main.py, выполняет startup приложения и первый запрос. Время каждого этапа и всего процесса
+сохраняется вместе с результатами эндпоинтов и сравнивается с базовой линией по p95.
+
+Пример:
+    DATABASE_URL=sqlite:///bench.db python benchmark.py --generate --save baseline.json
+    DATABASE_URL=sqlite:///bench.db python benchmark.py --compare baseline.json
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import httpx
+from sqlalchemy import event
+
+from models import RESOURCES
+
+QUERY_COUNT_HEADER = "X-Bench-Queries"
+
+# Порог регрессии по умолчанию: p95 хуже или пропускная способность ниже на 20%
+DEFAULT_THRESHOLD = 0.2
+
+# Заказы бенчмарка бронируются в далёком будущем, чтобы не пересекаться с данными базы
+ORDER_EPOCH = datetime(2100, 1, 1, 10)
+
+_request_queries = contextvars.ContextVar("request_queries", default=None)
+
+
+def _count_query(*args):
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+# Первый запрос при замере холодного старта
+COLD_START_PATH = "/vehicles/?limit=50"
+
+
+def migrate_schema(engine):
+    from migrate import MigrationError, migrate
+    try:
+        migrate(engine)
+    except MigrationError as e:
+        sys.exit(str(e))
+
+
+def instrumented_app():
+    """Приложение из main.py, которое сообщает число SQL-запросов в заголовке ответа."""
+    import database
+    from main import app
+
+    event.listen(database.engine, "before_cursor_execute", _count_query)
+    if database.async_engine is not None:
+        event.listen(database.async_engine.sync_engine, "before_cursor_execute", _count_query)
+    migrate_schema(database.engine)
+
+    async def counting_app(scope, receive, send):
+        if scope["type"] != "http":
+            return await app(scope, receive, send)
+        # Счётчик в contextvar виден и обработчикам в пуле потоков (контекст копируется)
+        counter = [0]
+        _request_queries.set(counter)
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (QUERY_COUNT_HEADER.lower().encode(), str(counter[0]).encode())
+                ]
+            await send(message)
+
+        await app(scope, receive, send_with_count)
+
+    return counting_app
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class Scenario:
+    """Один эндпоинт: функция i -> (метод, путь, json), ожидаемые коды ответа."""
+
+    def __init__(self, name: str, make_request, expected=(200,), on_response=None):
+        self.name = name
+        self.make_request = make_request
+        self.expected = expected
+        self.on_response = on_response
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, count: int, concurrency: int) -> dict:
+    latencies, queries, errors = [], [], []
+    indexes = iter(range(count))
+
+    async def worker():
+        for i in indexes:
+            method, path, body = scenario.make_request(i)
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if QUERY_COUNT_HEADER in response.headers:
+                queries.append(int(response.headers[QUERY_COUNT_HEADER]))
+            if response.status_code not in scenario.expected:
+                errors.append(f"{response.status_code} {response.text[:200]}")
+            elif scenario.on_response:
+                scenario.on_response(i, response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def payload_factories(ids: dict, rng: random.Random) -> dict:
+    """Тело POST для каждого ресурса; ссылки — на существующие записи базы."""
+    def pick(resource):
+        return rng.choice(ids[resource])
+
+    def order(i):
+        vehicles = ids["vehicles"]
+        # Каждому запросу — своё окно: машина по кругу, окна одной машины идут подряд без пересечений
+        start = ORDER_EPOCH + timedelta(days=3 * (i // len(vehicles)))
+        return {
+            "client_id": pick("clients"), "vehicle_id": vehicles[i % len(vehicles)], "employee_id": pick("employees"),
+            "start_date": start.isoformat(), "end_date_planned": (start + timedelta(days=2)).isoformat(),
+            "total_cost": 7000, "payment_status": "Unpaid", "order_status": "Open",
+        }
+
+    today = date.today().isoformat()
+    return {
+        "models": lambda i: {"brand": "Bench", "model_name": f"M{i}", "class": "Economy", "daily_rate": 2000, "deposit_amount": 5000},
+        "vehicles": lambda i: {"model_id": pick("models"), "license_plate": f"Б{i:06d}", "vin_code": f"BENCH{i:012d}", "color": "White", "current_mileage": 0, "status": "Available"},
+        "clients": lambda i: {"full_name": f"Бенчмарк {i}", "driver_license_num": f"{i:010d}", "passport_data": f"{i:010d}", "phone": "+79000000000", "birth_date": "1990-01-01"},
+        "employees": lambda i: {"full_name": f"Бенчмарк {i}", "position": "Менеджер"},
+        "orders": order,
+        "maintenance": lambda i: {"vehicle_id": pick("vehicles"), "start_date": today, "end_date": today, "service_type": "ТО", "cost": 3000},
+        "fines": lambda i: {"order_id": pick("orders"), "violation_type": "Speeding", "amount": 500, "issue_date": today},
+        "payments": lambda i: {"order_id": pick("orders"), "amount": 1000, "payment_date": f"{today}T12:00:00", "payment_type": "Income", "method": "Card"},
+        "insurance": lambda i: {"vehicle_id": pick("vehicles"), "policy_number": f"BENCH{i}", "insurance_company": "Бенчмарк", "start_date": today, "end_date": today, "cost": 10000},
+        "reviews": lambda i: {"order_id": pick("orders"), "car_rating": 5, "client_rating": 5, "comment": "Бенчмарк"},
+    }
+
+
+# Что меняет PUT в сценарии изменения
+UPDATES = {
+    "models": {"daily_rate": 2100},
+    "vehicles": {"current_mileage": 10},
+    "clients": {"phone": "+79000000001"},
+    "employees": {"position": "Старший менеджер"},
+    "orders": {"total_cost": 7500},
+    "maintenance": {"cost": 3500},
+    "fines": {"is_paid": True},
+    "payments": {"method": "Cash"},
+    "insurance": {"cost": 11000},
+    "reviews": {"car_rating": 4},
+}
+
+
+async def sample_ids(client: httpx.AsyncClient) -> dict:
+    ids = {}
+    for resource in RESOURCES:
+        response = await client.get(f"/{resource}/", params={"limit": 500})
+        response.raise_for_status()
+        ids[resource] = [item["id"] for item in response.json()]
+    return ids
+
+
+def build_scenarios(ids: dict, resources: list, args) -> list:
+    rng = random.Random(args.seed)
+    factories = payload_factories(ids, rng)
+    scenarios = []
+
+    # Чтение
+    for resource in resources:
+        scenarios.append(Scenario(f"GET /{resource}/", lambda i, r=resource: ("GET", f"/{r}/?limit=50", None)))
+        if ids[resource]:
+            sample = ids[resource]
+            scenarios.append(Scenario(
+                f"GET /{resource}/{{id}}/related",
+                lambda i, r=resource, s=sample: ("GET", f"/{r}/{s[i % len(s)]}/related", None),
+            ))
+    start = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    scenarios.append(Scenario(
+        "GET /availability/",
+        lambda i: ("GET", f"/availability/?start={start.isoformat()}&end={(start + timedelta(days=3)).isoformat()}", None),
+    ))
+
+    # Запись: создаём, меняем и удаляем одни и те же записи
+    created = {resource: {} for resource in resources}
+    missing = [r for r in ("models", "vehicles", "clients", "employees", "orders") if not ids[r]]
+    writable = [r for r in resources if not missing]
+    if missing:
+        print(f"Нет данных в {', '.join(missing)}: сценарии записи пропущены (запустите с --generate)", file=sys.stderr)
+
+    for resource in writable:
+        def remember(i, response, r=resource):
+            created[r][i] = response.json()["id"]
+        scenarios.append(Scenario(
+            f"POST /{resource}/",
+            lambda i, r=resource: ("POST", f"/{r}/", factories[r](i)),
+            on_response=remember,
+        ))
+    for resource in writable:
+        scenarios.append(Scenario(
+            f"PUT /{resource}/{{id}}",
+            lambda i, r=resource: ("PUT", f"/{r}/{created[r].get(i, 0)}", UPDATES[r]),
+        ))
+    for resource in writable:
+        scenarios.append(Scenario(
+            f"DELETE /{resource}/{{id}}",
+            lambda i, r=resource: ("DELETE", f"/{r}/{created[r].get(i, 0)}", None),
+        ))
+    return scenarios
+
+
+async def run(args) -> dict:
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        transport = httpx.ASGITransport(app=instrumented_app(), raise_app_exceptions=False)
+        client = httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60)
+
+    async with client:
+        ids = await sample_ids(client)
+        resources = args.resources or list(RESOURCES)
+        results = {}
+        for scenario in build_scenarios(ids, resources, args):
+            # Прогрев на тех же индексах, что и замер, только для чтения: записи не должны дублироваться
+            if scenario.name.startswith("GET ") and args.warmup:
+                await run_scenario(client, scenario, args.warmup, args.concurrency)
+            results[scenario.name] = stats = await run_scenario(client, scenario, args.requests, args.concurrency)
+            print(
+                f"{scenario.name:<36} p50 {stats['p50_ms']:>8.2f}  p95 {stats['p95_ms']:>8.2f}  p99 {stats['p99_ms']:>8.2f} ms"
+                f"  {stats['rps']:>8.1f} rps  queries {stats['queries_per_request'] if stats['queries_per_request'] is not None else '-':>5}"
+                f"  errors {stats['errors']}",
+                file=sys.stderr,
+            )
+            if stats["first_error"]:
+                print(f"    {stats['first_error']}", file=sys.stderr)
+    return results
+
+
+def cold_start_probe():
+    """Выполняется в отдельном процессе: печатает JSON с длительностью этапов в мс."""
+    started = time.perf_counter()
+    from main import app
+    imported = time.perf_counter()
+    from fastapi.testclient import TestClient
+    with TestClient(app) as client:
+        ready = time.perf_counter()
+        status = client.get(COLD_START_PATH).status_code
+        answered = time.perf_counter()
+    print(json.dumps({
+        "import": (imported - started) * 1000,
+        "startup": (ready - imported) * 1000,
+        "first request": (answered - ready) * 1000,
+        "status": status,
+    }))
+
+
+def run_cold_start(count: int) -> dict:
+    stages = {"import": [], "startup": [], "first request": [], "total": []}
+    errors = []
+    for _ in range(count):
+        started = time.perf_counter()
+        probe = subprocess.run([sys.executable, __file__, "--cold-start-probe"], capture_output=True, text=True)
+        total = (time.perf_counter() - started) * 1000
+        try:
+            timings = json.loads(probe.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            errors.append(f"код {probe.returncode}: {probe.stderr.strip()[-200:]}")
+            continue
+        if timings.pop("status") != 200:
+            errors.append(f"{COLD_START_PATH}: {probe.stdout.strip()[-200:]}")
+        timings["total"] = total
+        for stage, value in timings.items():
+            stages[stage].append(value)
+
+    results = {}
+    for stage, values in stages.items():
+        results[f"cold start: {stage}"] = stats = {
+            "requests": len(values),
+            "errors": len(errors),
+            "first_error": errors[0] if errors else None,
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+            "rps": 0.0,
+            "queries_per_request": None,
+        }
+        print(f"{'cold start: ' + stage:<36} p50 {stats['p50_ms']:>8.2f}  p95 {stats['p95_ms']:>8.2f}  "
+              f"p99 {stats['p99_ms']:>8.2f} ms  errors {stats['errors']}", file=sys.stderr)
+    if errors:
+        print(f"    {errors[0]}", file=sys.stderr)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Список регрессий относительно сохранённого результата."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {current['p95_ms']} ms")
+        if base["rps"] and current["rps"] < base["rps"] / (1 + threshold):
+            regressions.append(f"{name}: rps {base['rps']} -> {current['rps']}")
+        if base.get("queries_per_request") is not None and current.get("queries_per_request") is not None \
+                and current["queries_per_request"] > base["queries_per_request"]:
+            regressions.append(f"{name}: запросов к БД {base['queries_per_request']} -> {current['queries_per_request']}")
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{name}: ошибок {base['errors']} -> {current['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк эндпоинтов API")
+    parser.add_argument("--url", help="адрес запущенного сервера; по умолчанию приложение поднимается в процессе")
+    parser.add_argument("--requests", type=int, default=200, help="запросов на каждый эндпоинт")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=10, help="запросов прогрева для эндпоинтов чтения")
+    parser.add_argument("--resources", nargs="*", choices=list(RESOURCES), help="только эти ресурсы")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--generate", action="store_true", help="заполнить базу generate_data.py (небольшой объём)")
+    parser.add_argument("--save", help="сохранить результат в JSON (базовая линия)")
+    parser.add_argument("--compare", help="сравнить с сохранённым JSON; код выхода 1 при регрессии")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--cold-start", type=int, default=5, help="запусков процесса для замера холодного старта; 0 — без замера")
+    parser.add_argument("--cold-start-probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_start_probe:
+        cold_start_probe()
+        return
+
+    if args.generate:
+        from database import engine
+        from generate_data import build_parser, generate
+        migrate_schema(engine)
+        generate(build_parser().parse_args([
+            "--seed", str(args.seed), "--models", "20", "--vehicles", "500",
+            "--clients", "2000", "--employees", "20", "--orders", "10000",
+        ]))
+
+    results = asyncio.run(run(args))
+    if args.cold_start and not args.url:
+        results.update(run_cold_start(args.cold_start))
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "url": args.url,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.threshold)
+        for line in regressions:
+            print(f"РЕГРЕССИЯ {line}")
+        if regressions:
+            sys.exit(1)
+        print("Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Пакетные операции: создание, изменение и удаление многих записей одной транзакцией.
+
+Для каждого ресурса из models.RESOURCES регистрируются:
+- POST   /{resource}/bulk — массив новых записей;
+- PUT    /{resource}/bulk — массив изменений, в каждом обязателен id;
+- DELETE /{resource}/bulk — {"ids": [...]}.
+
+Каждый элемент валидируется отдельно, внешние ключи и зависимые записи проверяются
+одним запросом на всю пачку, а запись в БД идёт одним executemany и одним commit.
+Ответ содержит результат по каждому элементу (по индексу в исходном массиве).
+"""
+import os
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlmodel import Session, select
+
+from database import get_session
+from models import RESOURCES, RentalOrder, Vehicle
+from crud import DEPENDENTS, SERVER_FIELDS
+from sync import record_deletes
+from feed import record
+from orders import book_order, update_order_fields, integrity_error
+from cache import invalidate
+
+# Максимальный размер пачки
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "1000"))
+
+bulk_router = APIRouter()
+
+
+class BulkResult:
+    """Результаты по элементам пачки."""
+
+    def __init__(self, size: int):
+        self.items = [None] * size
+
+    def ok(self, index: int, item_id):
+        self.items[index] = {"index": index, "ok": True, "id": item_id}
+
+    def error(self, index: int, error):
+        self.items[index] = {"index": index, "ok": False, "error": jsonable_encoder(error)}
+
+    def ok_ids(self) -> list:
+        return [r["id"] for r in self.items if r and r["ok"]]
+
+    def as_dict(self) -> dict:
+        succeeded = sum(1 for r in self.items if r and r["ok"])
+        return {"succeeded": succeeded, "failed": len(self.items) - succeeded, "results": self.items}
+
+
+def _check_size(items: list):
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Слишком большая пачка: максимум {BULK_MAX_ITEMS} записей")
+
+
+def _validate(model, data: dict):
+    """Возвращает (объект, None) или (None, ошибки валидации)."""
+    try:
+        return model.model_validate(data), None
+    except ValidationError as e:
+        return None, e.errors(include_url=False)
+
+
+def check_foreign_keys(session: Session, model, objects: Dict[int, Any], result: BulkResult):
+    """Проверяет FK всей пачки одним запросом на каждую родительскую таблицу."""
+    for fk in model.__table__.foreign_keys:
+        column, parent_column = fk.parent, fk.column
+        values = {getattr(obj, column.name) for obj in objects.values()} - {None}
+        if not values:
+            continue
+        existing = set(session.exec(select(parent_column).where(parent_column.in_(values))).all())
+        for index, obj in list(objects.items()):
+            value = getattr(obj, column.name)
+            if value is not None and value not in existing:
+                result.error(index, f"{column.name}={value}: запись {parent_column.table.name} не найдена")
+                del objects[index]
+
+
+def _commit(session: Session, model):
+    try:
+        session.commit()
+        invalidate(model)
+    except IntegrityError as e:
+        session.rollback()
+        raise HTTPException(status_code=409, detail=f"Пачка отклонена базой данных: {e.orig}")
+    except DBAPIError as e:
+        session.rollback()
+        raise HTTPException(status_code=400, detail=f"Пачка отклонена базой данных: {e.orig}")
+
+
+def bulk_create(session: Session, model, items: List[dict]) -> dict:
+    result = BulkResult(len(items))
+    objects = {}
+    for index, data in enumerate(items):
+        data = {k: v for k, v in data.items() if k not in SERVER_FIELDS}  # id назначает база, updated_at — сервер
+        obj, errors = _validate(model, data)
+        if errors:
+            result.error(index, errors)
+        else:
+            objects[index] = obj
+    check_foreign_keys(session, model, objects, result)
+
+    if model is RentalOrder:
+        # Заказы проходят проверку пересечения бронирований по одному, каждый в своей точке сохранения
+        for index, obj in objects.items():
+            try:
+                with session.begin_nested():
+                    order = book_order(session, obj)
+                    session.flush()
+                result.ok(index, order.id)
+            except HTTPException as e:
+                result.error(index, e.detail)
+            except IntegrityError as e:
+                result.error(index, integrity_error(e).detail)
+    elif objects:
+        # Одна вставка executemany; RETURNING отдаёт id в порядке строк
+        table = model.__table__
+        rows = [obj.model_dump(exclude={"id"}) for obj in objects.values()]
+        ids = session.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        for index, new_id in zip(objects, ids):
+            result.ok(index, new_id)
+
+    record(session, model, "insert", result.ok_ids())
+    _commit(session, model)
+    return result.as_dict()
+
+
+def bulk_update(session: Session, model, items: List[dict]) -> dict:
+    result = BulkResult(len(items))
+    ids = {}
+    for index, data in enumerate(items):
+        if not isinstance(data.get("id"), int):
+            result.error(index, "Не указан id записи")
+        else:
+            ids[index] = data["id"]
+
+    # Текущие версии всех записей пачки — одним запросом
+    existing = {obj.id: obj for obj in session.exec(select(model).where(model.id.in_(set(ids.values())))).all()}
+
+    merged = {}
+    for index, item_id in ids.items():
+        db_obj = existing.get(item_id)
+        if db_obj is None:
+            result.error(index, "Запись не найдена")
+            continue
+        changes = {k: v for k, v in items[index].items() if k not in SERVER_FIELDS}
+        obj, errors = _validate(model, {**db_obj.model_dump(), **changes})
+        if errors:
+            result.error(index, errors)
+        else:
+            merged[index] = obj
+    check_foreign_keys(session, model, merged, result)
+
+    if model is RentalOrder:
+        for index, obj in merged.items():
+            changes = {k: getattr(obj, k) for k in items[index] if k not in SERVER_FIELDS}
+            try:
+                with session.begin_nested():
+                    update_order_fields(session, existing[obj.id], changes)
+                    session.flush()
+                result.ok(index, obj.id)
+            except HTTPException as e:
+                result.error(index, e.detail)
+            except IntegrityError as e:
+                result.error(index, integrity_error(e).detail)
+    elif merged:
+        # UPDATE ... WHERE id = :id, выполняемый executemany (строки группируются по набору полей)
+        rows = [
+            {"id": obj.id, **{k: getattr(obj, k) for k in items[index] if k not in SERVER_FIELDS and k in model.model_fields}}
+            for index, obj in merged.items()
+        ]
+        session.execute(update(model), rows)
+        for index, obj in merged.items():
+            result.ok(index, obj.id)
+
+    record(session, model, "update", result.ok_ids())
+    _commit(session, model)
+    return result.as_dict()
+
+
+def bulk_delete(session: Session, model, ids: List[int]) -> dict:
+    result = BulkResult(len(ids))
+    found = set(session.exec(select(model.id).where(model.id.in_(set(ids)))).all())
+
+    # Записи, на которые ссылаются дети, — по одному запросу на каждую дочернюю таблицу
+    blocked = {}
+    for column in DEPENDENTS.get(model, []):
+        for parent_id in session.exec(select(column).where(column.in_(found)).distinct()).all():
+            blocked.setdefault(parent_id, []).append(column.class_.__tablename__)
+
+    to_delete = set()
+    for index, item_id in enumerate(ids):
+        if item_id not in found:
+            result.error(index, "Запись не найдена")
+        elif item_id in blocked:
+            result.error(index, f"Нельзя удалить запись: есть связанные данные ({', '.join(blocked[item_id])}).")
+        else:
+            to_delete.add(item_id)
+            result.ok(index, item_id)
+
+    if to_delete:
+        if model is RentalOrder:
+            # Освобождаем машины открытых заказов, как и при удалении по одному
+            vehicle_ids = select(RentalOrder.vehicle_id).where(
+                RentalOrder.id.in_(to_delete), RentalOrder.order_status == "Open"
+            )
+            released = session.execute(
+                update(Vehicle)
+                .where(Vehicle.id.in_(vehicle_ids), Vehicle.status == "Rented")
+                .values(status="Available")
+                .returning(Vehicle.id)
+            ).scalars().all()
+            record(session, Vehicle, "update", released)
+        session.execute(delete(model).where(model.id.in_(to_delete)))
+        record_deletes(session, model, sorted(to_delete))
+        record(session, model, "delete", to_delete)
+    _commit(session, model)
+    return result.as_dict()
+
+
+def _add_routes(resource: str, model):
+    tags = [f"bulk: {resource}"]
+
+    @bulk_router.post(f"/{resource}/bulk", tags=tags, name=f"bulk_create_{resource}", summary="Пакетное создание")
+    def create_many(items: List[Dict[str, Any]], session: Session = Depends(get_session)):
+        _check_size(items)
+        return bulk_create(session, model, items)
+
+    @bulk_router.put(f"/{resource}/bulk", tags=tags, name=f"bulk_update_{resource}", summary="Пакетное изменение")
+    def update_many(items: List[Dict[str, Any]], session: Session = Depends(get_session)):
+        _check_size(items)
+        return bulk_update(session, model, items)
+
+    @bulk_router.delete(f"/{resource}/bulk", tags=tags, name=f"bulk_delete_{resource}", summary="Пакетное удаление")
+    def delete_many(ids: List[int] = Body(..., embed=True), session: Session = Depends(get_session)):
+        _check_size(ids)
+        return bulk_delete(session, model, ids)
+
+
+for _resource, _model in RESOURCES.items():
+    _add_routes(_resource, _model)
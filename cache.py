@@ -0,0 +1,168 @@
+"""Кэш ответов для редко меняющихся справочников (модели, сотрудники) с ETag.
+
+Готовое тело JSON-ответа списка хранится в памяти процесса по ключу «таблица + параметры
+запроса»: при попадании не нужно ни идти в БД, ни заново валидировать строки. Клиент,
+приславший If-None-Match с текущим ETag, получает 304 без тела.
+
+Записи любой таблицы из CACHED_MODELS сбрасываются после commit в обработчиках
+создания/изменения/удаления (обычных, асинхронных, пакетных и импорта). Кэш у каждого
+воркера свой, поэтому изменения, сделанные другим процессом, видны не позже чем через CACHE_TTL.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from models import CarModel, Employee
+from pagination import NEXT_CURSOR_HEADER
+from sync import SYNC_TOKEN_HEADER
+
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))               # сколько секунд хранить ответ
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))  # ответов в памяти, старые вытесняются
+CACHE_MAX_AGE = int(os.getenv("CACHE_MAX_AGE", "0"))            # max-age для браузера; 0 — всегда сверять ETag
+
+CACHED_MODELS = (CarModel, Employee)
+
+# Заголовки ответа, которые сохраняются вместе с телом. Токен синхронизации из кэша старше
+# реального — клиент при следующей синхронизации лишь получит часть записей повторно
+CACHED_HEADERS = (NEXT_CURSOR_HEADER, SYNC_TOKEN_HEADER)
+
+
+class CachedEntry:
+    def __init__(self, body: bytes, headers: dict):
+        self.body = body
+        self.etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+        self.headers = headers
+        self.expires_at = time.monotonic() + CACHE_TTL
+
+    def respond(self, request: Request) -> Response:
+        headers = {
+            **self.headers,
+            "ETag": self.etag,
+            "Cache-Control": f"private, max-age={CACHE_MAX_AGE}" if CACHE_MAX_AGE else "no-cache",
+        }
+        if _etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+
+def _etag_matches(header, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Сравнение слабое: W/"x" совпадает с "x"
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+class ResponseCache:
+    """LRU с ограничением по числу записей и TTL; счётчики попаданий и промахов."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}  # таблица -> номер версии, растёт при каждом сбросе
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def version(self, table: str) -> int:
+        with self._lock:
+            return self._versions.get(table, 0)
+
+    def put(self, key, entry: CachedEntry, version: int):
+        with self._lock:
+            # Таблицу успели изменить, пока строился ответ, — такой ответ уже устарел
+            if self._versions.get(key[0], 0) != version:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, table: str):
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+            for key in [k for k in self._entries if k[0] == table]:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": CACHE_TTL,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+response_cache = ResponseCache()
+
+_adapters = {model: TypeAdapter(List[model]) for model in CACHED_MODELS}
+
+
+def is_cached(model) -> bool:
+    return model in _adapters
+
+
+def cache_key(request: Request, model) -> tuple:
+    return (model.__tablename__, tuple(sorted(request.query_params.multi_items())))
+
+
+def make_entry(model, items, response: Response) -> CachedEntry:
+    if isinstance(items, Response):
+        # Быстрый путь (FAST_JSON) уже вернул готовый ответ
+        body, response = items.body, items
+    else:
+        # Сериализация та же, что у response_model: алиасы полей, Decimal строкой
+        body = _adapters[model].dump_json(items, by_alias=True)
+    headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+    return CachedEntry(body, headers)
+
+
+def cached_list(request: Request, model, build) -> Response:
+    """Ответ списка из кэша; build(response) строит список, если в кэше его нет."""
+    key = cache_key(request, model)
+    entry = response_cache.get(key)
+    if entry is None:
+        version = response_cache.version(model.__tablename__)
+        response = Response()
+        entry = make_entry(model, build(response), response)
+        response_cache.put(key, entry, version)
+    return entry.respond(request)
+
+
+def invalidate(model):
+    """Сбросить кэш таблицы после изменения данных (для некэшируемых таблиц ничего не делает)."""
+    if is_cached(model):
+        response_cache.invalidate(model.__tablename__)
@@ -0,0 +1,169 @@
+"""Сжатие ответов API: brotli (если установлен пакет brotli) или gzip по заголовку Accept-Encoding.
+
+Сжимаются текстовые ответы (JSON, NDJSON, CSV) не меньше COMPRESS_MIN_BYTES; потоковые
+(выгрузка /{resource}/export) — по частям, с flush после каждой, чтобы клиент получал
+данные сразу. Ответы, у которых уже есть Content-Encoding, и text/event-stream не трогаются.
+
+Настройки (переменные окружения):
+- COMPRESSION        — допустимые кодировки в порядке предпочтения (по умолчанию "br,gzip"; "off" — выключить);
+- COMPRESS_MIN_BYTES — ответы меньше этого размера отдаются без сжатия;
+- COMPRESS_LEVEL     — уровень gzip (1–9);
+- BROTLI_QUALITY     — качество brotli (0–11; для динамических ответов разумно 4–5).
+"""
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # необязательная зависимость — без неё только gzip
+    brotli = None
+
+COMPRESSION = os.getenv("COMPRESSION", "br,gzip")
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+ENCODERS = {"gzip": GzipEncoder}
+if brotli is not None:
+    ENCODERS["br"] = BrotliEncoder
+
+
+def enabled_encodings() -> list:
+    if COMPRESSION.strip().lower() in ("", "off", "0"):
+        return []
+    return [name for name in (part.strip() for part in COMPRESSION.split(",")) if name in ENCODERS]
+
+
+def choose_encoder(accept_encoding: str, preferred: list):
+    """Первая кодировка из preferred, которую принимает клиент (q=0 — отказ)."""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        try:
+            quality = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    for name in preferred:
+        if name in accepted or "*" in accepted:
+            return ENCODERS[name]
+    return None
+
+
+def _compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "text/event-stream":
+        return False
+    return content_type.startswith("text/") or "json" in content_type
+
+
+class CompressionMiddleware:
+    """Сжимает ответ выбранным по Accept-Encoding кодировщиком."""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = enabled_encodings()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            return await self.app(scope, receive, send)
+        encoder_class = choose_encoder(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoder_class is None:
+            return await self.app(scope, receive, send)
+
+        start = None       # http.response.start придерживаем до первого куска тела
+        encoder = None     # None после решения «не сжимать»
+        decided = False
+
+        async def send_compressed(message):
+            nonlocal start, encoder, decided
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                if start is not None:
+                    await send(start)
+                    start = None
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if not decided:
+                decided = True
+                headers = MutableHeaders(raw=list(start.get("headers", [])))
+                if (
+                    start["status"] in (204, 304)
+                    or not _compressible(headers)
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = encoder_class()
+                headers["Content-Encoding"] = encoder.name
+                headers.add_vary_header("Accept-Encoding")
+                # Тело зависит от кодировки — ETag становится слабым (If-None-Match сравнивает без W/)
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = "W/" + etag
+                if more_body:
+                    del headers["Content-Length"]
+                    body = encoder.compress(body) + encoder.flush()
+                else:
+                    body = encoder.compress(body) + encoder.finish()
+                    headers["Content-Length"] = str(len(body))
+                start["headers"] = headers.raw
+                await send(start)
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                start = None
+                return
+
+            if encoder is None:
+                await send(message)
+            elif more_body:
+                await send({"type": "http.response.body", "body": encoder.compress(body) + encoder.flush(), "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": encoder.compress(body) + encoder.finish()})
+
+        await self.app(scope, receive, send_compressed)
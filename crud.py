@@ -0,0 +1,127 @@
+"""Общие операции над записями, которые используют обработчики в main.py.
+
+Запись идёт одним запросом с RETURNING: INSERT ... RETURNING возвращает созданную строку,
+UPDATE/DELETE ... WHERE id = ... RETURNING — изменённую или удалённую (нет строки — нет записи, 404).
+Повторного SELECT после commit (session.refresh) не нужно. Функции ничего не коммитят.
+"""
+from functools import lru_cache
+from typing import Annotated, Optional
+
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import delete, exists, insert, update
+from sqlmodel import Session, select
+
+from models import (
+    CarModel, Vehicle, Client, Employee, RentalOrder,
+    Maintenance, Fine, Payment, InsurancePolicy, Review, RentalOrderArchive, utcnow
+)
+from sync import record_deletes
+from feed import record
+
+# Поля, которые заполняет сервер: значения из тела запроса не применяются
+SERVER_FIELDS = {"id", "updated_at"}
+
+def validated(model, obj):
+    """Табличные модели SQLModel не валидируют тело запроса (даты остаются строками) — приводим типы явно."""
+    try:
+        return model.model_validate(obj.model_dump(warnings=False))
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+
+def apply_changes(model, db_obj, changes: dict):
+    """Переносит изменённые поля в запись из БД, приводя значения к типам модели."""
+    for key, value in changes.items():
+        setattr(db_obj, key, value)
+    checked = validated(model, db_obj)
+    for key in changes:
+        setattr(db_obj, key, getattr(checked, key))
+    return db_obj
+
+
+@lru_cache(maxsize=None)
+def _field_adapter(model, name: str) -> TypeAdapter:
+    field = model.model_fields[name]
+    return TypeAdapter(Annotated[field.annotation, field])
+
+
+def coerce_changes(model, changes: dict) -> dict:
+    """Приводит к типам модели только переданные поля — без чтения записи из БД. id и updated_at не меняются."""
+    result, errors = {}, []
+    for key, value in changes.items():
+        if key in SERVER_FIELDS or key not in model.model_fields:
+            continue
+        try:
+            result[key] = _field_adapter(model, key).validate_python(value)
+        except ValidationError as e:
+            errors += [{**error, "loc": ("body", key, *error["loc"])} for error in e.errors()]
+    if errors:
+        raise RequestValidationError(errors)
+    return result
+
+
+def _from_row(model, row):
+    return model.model_validate(dict(row._mapping)) if row is not None else None
+
+
+def insert_returning(session: Session, model, obj):
+    """INSERT ... RETURNING: новая запись одним запросом, вместе с id и значениями по умолчанию из БД."""
+    obj = validated(model, obj)
+    table = model.__table__
+    values = obj.model_dump(exclude={"id"} if obj.id is None else set())
+    values["updated_at"] = utcnow()  # не из тела запроса
+    row = session.execute(insert(table).values(**values).returning(*table.c)).one()
+    record(session, model, "insert", [row.id])
+    return _from_row(model, row)
+
+
+def update_returning(session: Session, model, item_id: int, changes: dict) -> Optional[object]:
+    """UPDATE ... WHERE id = :id RETURNING только переданных полей; None, если записи нет.
+
+    updated_at обновляется сам (onupdate в models.updated_at_field).
+    """
+    table = model.__table__
+    changes = coerce_changes(model, changes)
+    if not changes:
+        return _from_row(model, session.execute(select(*table.c).where(table.c.id == item_id)).first())
+    statement = update(table).where(table.c.id == item_id).values(**changes).returning(*table.c)
+    row = session.execute(statement).first()
+    if row is not None:
+        record(session, model, "update", [item_id])
+    return _from_row(model, row)
+
+
+def delete_returning(session: Session, model, item_id: int) -> Optional[object]:
+    """DELETE ... WHERE id = :id RETURNING; None, если записи нет. Оставляет надгробие (sync.py)."""
+    table = model.__table__
+    row = session.execute(delete(table).where(table.c.id == item_id).returning(*table.c)).first()
+    if row is not None:
+        record_deletes(session, model, [item_id])
+        record(session, model, "delete", [item_id])
+    return _from_row(model, row)
+
+
+# Дочерние таблицы, которые не дают удалить запись: модель -> FK-колонки детей (включая архив заказов)
+DEPENDENTS = {
+    CarModel: [Vehicle.model_id],
+    Vehicle: [RentalOrder.vehicle_id, RentalOrderArchive.vehicle_id, Maintenance.vehicle_id, InsurancePolicy.vehicle_id],
+    Client: [RentalOrder.client_id, RentalOrderArchive.client_id],
+    Employee: [RentalOrder.employee_id, RentalOrderArchive.employee_id],
+    RentalOrder: [Payment.order_id, Fine.order_id, Review.order_id],
+}
+
+
+def dependents_query(model, item_id: int):
+    """SELECT EXISTS(...), EXISTS(...) — по одному флагу на каждую дочернюю таблицу."""
+    columns = DEPENDENTS.get(model, [])
+    return columns, select(*[exists().where(column == item_id) for column in columns])
+
+
+def find_dependents(session: Session, model, item_id: int) -> list:
+    """Одним запросом проверяет дочерние записи; возвращает имена таблиц, в которых они есть."""
+    columns, statement = dependents_query(model, item_id)
+    if not columns:
+        return []
+    flags = session.execute(statement).one()
+    return [column.class_.__tablename__ for column, flag in zip(columns, flags) if flag]
@@ -0,0 +1,103 @@
+"""Потоковая выгрузка таблиц в NDJSON/CSV с серверным курсором.
+
+GET /{resource}/export?format=ndjson|csv принимает те же фильтры, что и списочный эндпоинт.
+Строки читаются из БД пачками (stream_results + yield_per, в PostgreSQL — именованный курсор)
+и сразу отдаются клиенту, поэтому память не растёт с размером таблицы.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from archive import needs_archive, with_archive
+from database import engine
+from fastjson import FAST_JSON, dumps
+from models import RESOURCES
+from pagination import apply_filters, filters_from_query
+
+# Сколько строк за раз забирать из курсора
+EXPORT_CHUNK_ROWS = 1000
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+export_router = APIRouter()
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def _csv_value(value):
+    # Даты в том же ISO-формате, что и в JSON
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def output_keys(model) -> list:
+    """Имена полей в выгрузке — как в JSON-ответах API ('car_class', не алиас 'class')."""
+    return list(model.__table__.columns.keys())
+
+
+def stream_rows(model, filters: dict):
+    """Генератор пачек строк (кортежей) из серверного курсора."""
+    table = model.__table__
+    statement = apply_filters(select(*table.columns), model, filters).order_by(table.c.id)
+    with engine.connect() as connection:
+        if needs_archive(connection, model, filters):
+            statement = with_archive(statement, model)
+        result = connection.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_ROWS).execute(statement)
+        for chunk in result.partitions():
+            yield chunk
+
+
+def ndjson_lines(model, filters: dict):
+    keys = output_keys(model)
+    for chunk in stream_rows(model, filters):
+        if FAST_JSON:
+            yield b"".join(dumps(dict(zip(keys, row))) + b"\n" for row in chunk)
+            continue
+        yield "".join(
+            json.dumps(dict(zip(keys, row)), default=_json_default, ensure_ascii=False) + "\n"
+            for row in chunk
+        )
+
+
+def csv_lines(model, filters: dict):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(output_keys(model))
+    for chunk in stream_rows(model, filters):
+        writer.writerows([_csv_value(v) for v in row] for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Заголовок пустой выгрузки
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _add_route(resource: str, model):
+    @export_router.get(f"/{resource}/export", tags=[f"export: {resource}"], name=f"export_{resource}", summary="Выгрузка NDJSON/CSV")
+    def export(request: Request, format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+        # Фильтры проверяем до начала ответа, чтобы ошибка пришла статусом 400, а не обрывом потока
+        filters = filters_from_query(model, request.query_params)
+        lines = ndjson_lines(model, filters) if format == "ndjson" else csv_lines(model, filters)
+        return StreamingResponse(
+            lines,
+            media_type=MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="{resource}.{format}"'},
+        )
+
+
+for _resource, _model in RESOURCES.items():
+    _add_route(_resource, _model)
@@ -0,0 +1,326 @@
+"""Лента изменений: GET /feed/?resources=vehicles,orders — Server-Sent Events о вставках,
+изменениях и удалениях записей, вместо постоянного опроса списков.
+
+Событие change: {"resource": "vehicles", "op": "insert|update|delete", "ids": [...]}; если строк
+в одной операции много — вместо ids приходит "count". Данные записей в событии не передаются:
+клиент подтягивает их по ?updated_since= (sync.py). Событие resync означает, что часть событий
+потеряна (клиент не успевал читать, переподключение к БД) — нужна синхронизация по токену.
+
+Источник событий (FEED_SOURCE):
+- notify — триггеры из migrations/005_change_feed.sql делают pg_notify после каждой команды,
+  процесс держит одно соединение с LISTEN и раздаёт события всем своим подписчикам.
+  Видны изменения всех процессов и даже сделанные в обход API;
+- local  — приложение само публикует свои записи после commit (SQLite, тесты, БД без миграции).
+  Видны изменения только этого процесса;
+- auto   — (по умолчанию) notify, если это PostgreSQL с psycopg2 и миграция применена, иначе local.
+
+У каждого подписчика очередь на FEED_QUEUE_SIZE событий. Медленный клиент не задерживает
+остальных: при переполнении его очередь очищается и он получает одно событие resync.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from models import RESOURCES
+
+FEED_SOURCE = os.getenv("FEED_SOURCE", "auto")
+FEED_QUEUE_SIZE = int(os.getenv("FEED_QUEUE_SIZE", "1000"))
+FEED_HEARTBEAT_SECONDS = float(os.getenv("FEED_HEARTBEAT_SECONDS", "15"))
+FEED_RECONNECT_SECONDS = float(os.getenv("FEED_RECONNECT_SECONDS", "5"))
+
+# Канал pg_notify (совпадает с migrations/005_change_feed.sql)
+FEED_CHANNEL = "table_changes"
+
+# Сколько событий из очереди отправлять одной записью в поток
+FEED_BATCH = 100
+
+logger = logging.getLogger("car_rental.feed")
+
+# Имя таблицы -> сегмент URL ресурса
+TABLE_RESOURCES = {model.__tablename__: resource for resource, model in RESOURCES.items()}
+
+feed_router = APIRouter()
+
+
+class Subscriber:
+    """Очередь событий одного клиента; resources пустое — все ресурсы."""
+
+    def __init__(self, resources: frozenset, max_queue: int = FEED_QUEUE_SIZE):
+        self.resources = resources
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def wants(self, item: dict) -> bool:
+        return not self.resources or item.get("resource") in self.resources
+
+    def put(self, item: dict) -> bool:
+        """Кладёт событие в очередь; False — очередь переполнена и заменена одним resync."""
+        if self.overflowed:
+            return True  # resync уже в очереди, до его чтения события не копим
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"op": "resync"})
+            self.overflowed = True
+            return False
+
+
+class Broker:
+    """Раздаёт события подписчикам процесса. publish можно вызывать из любого потока."""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.loop = None
+        self.published = 0
+        self.overflows = 0
+
+    def subscribe(self, resources: frozenset) -> Subscriber:
+        subscriber = Subscriber(resources)
+        with self._lock:
+            self.loop = asyncio.get_running_loop()
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, item: dict):
+        if self.loop is None or not self._subscribers:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._deliver, item)
+        except RuntimeError:  # цикл событий уже закрыт (остановка приложения)
+            pass
+
+    def _deliver(self, item: dict):
+        # Выполняется в цикле событий: очереди asyncio не потокобезопасны
+        self.published += 1
+        for subscriber in list(self._subscribers):
+            if (item.get("op") == "resync" or subscriber.wants(item)) and not subscriber.put(item):
+                self.overflows += 1
+
+
+broker = Broker()
+
+
+def _event(table: str, op: str, ids=None, count: Optional[int] = None) -> Optional[dict]:
+    resource = TABLE_RESOURCES.get(table)
+    if resource is None:
+        return None
+    item = {"resource": resource, "op": op}
+    if ids is not None:
+        item["ids"] = sorted(ids)
+    else:
+        item["count"] = count
+    return item
+
+
+# ---------- Источник local: записи приложения после commit ----------
+
+_source = "local"
+
+
+def publishes_locally() -> bool:
+    return _source == "local"
+
+
+def record(session: Session, model, op: str, ids=None, count: Optional[int] = None):
+    """Запоминает изменение в сессии; событие уйдёт после commit (после rollback — нет).
+
+    В режиме notify ничего не делает: события шлют триггеры PostgreSQL.
+    """
+    if not publishes_locally() or not (ids or count):
+        return
+    item = _event(model.__tablename__, op, ids, count)
+    if item is not None:
+        session.info.setdefault("feed_events", []).append(item)
+
+
+def publish(model, op: str, ids=None, count: Optional[int] = None):
+    """Публикует сразу — для записей, уже зафиксированных без Session (импорт через COPY)."""
+    if publishes_locally() and (ids or count):
+        item = _event(model.__tablename__, op, ids, count)
+        if item is not None:
+            broker.publish(item)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    for item in session.info.pop("feed_events", ()):
+        broker.publish(item)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("feed_events", None)
+
+
+# ---------- Источник notify: LISTEN в PostgreSQL ----------
+
+class PgListener:
+    """Одно соединение с LISTEN на процесс; уведомления читаются в цикле событий через add_reader."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.connection = None
+        self.loop = None
+
+    def start(self):
+        if self.loop is not None:
+            return  # уже запущен; переподключается сам
+        self.loop = asyncio.get_running_loop()
+        self._connect()
+
+    def _connect(self):
+        try:
+            raw = self.engine.raw_connection()
+            raw.detach()  # соединение живёт всё время работы процесса — не занимаем им пул
+            connection = raw.driver_connection
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {FEED_CHANNEL}")
+        except Exception as e:
+            logger.warning("Лента изменений: нет соединения с БД (%s), повтор через %s с", e, FEED_RECONNECT_SECONDS)
+            self.loop.call_later(FEED_RECONNECT_SECONDS, self._connect)
+            return
+        self.connection = connection
+        self.loop.add_reader(connection.fileno(), self._on_readable)
+        # Пока соединения не было, события могли потеряться
+        broker.publish({"op": "resync"})
+
+    def _on_readable(self):
+        try:
+            self.connection.poll()
+        except Exception as e:
+            logger.warning("Лента изменений: соединение LISTEN потеряно (%s)", e)
+            self._disconnect()
+            self.loop.call_later(FEED_RECONNECT_SECONDS, self._connect)
+            return
+        notifies = self.connection.notifies
+        while notifies:
+            try:
+                data = json.loads(notifies.pop(0).payload)
+            except ValueError:
+                continue
+            item = _event(data.get("table"), data.get("op"), data.get("ids"), data.get("count"))
+            if item is not None:
+                broker.publish(item)
+
+    def _disconnect(self):
+        if self.connection is None:
+            return
+        try:
+            self.loop.remove_reader(self.connection.fileno())
+        except Exception:
+            pass
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+        self.connection = None
+
+    def stop(self):
+        if self.loop is not None:
+            self._disconnect()
+
+
+_listener: Optional[PgListener] = None
+
+
+def configure_feed(engine):
+    """Выбирает источник событий при старте приложения (FEED_SOURCE)."""
+    global _source, _listener
+    source = FEED_SOURCE
+    if source == "auto":
+        source = "notify" if _has_notify_triggers(engine) else "local"
+    _source = source
+    _listener = PgListener(engine) if source == "notify" else None
+    logger.info("Лента изменений: источник %s", source)
+
+
+def _has_notify_triggers(engine) -> bool:
+    if engine.dialect.name != "postgresql" or engine.dialect.driver != "psycopg2":
+        return False
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT to_regprocedure('feed_notify()')")).scalar() is not None
+
+
+def stop_feed():
+    if _listener is not None:
+        _listener.stop()
+
+
+def feed_status() -> dict:
+    return {
+        "source": _source,
+        "listening": _listener is not None and _listener.connection is not None,
+        "subscribers": broker.subscribers,
+        "published": broker.published,
+        "overflows": broker.overflows,
+    }
+
+
+# ---------- SSE ----------
+
+def _format(item: dict) -> str:
+    name = "resync" if item.get("op") == "resync" else "change"
+    return f"event: {name}\ndata: {json.dumps(item, separators=(',', ':'))}\n\n"
+
+
+async def _stream(request: Request, subscriber: Subscriber):
+    try:
+        yield f"retry: {int(FEED_RECONNECT_SECONDS * 1000)}\n\n"
+        while True:
+            try:
+                item = await asyncio.wait_for(subscriber.queue.get(), FEED_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": ping\n\n"  # держит соединение через прокси
+                continue
+            # Всё, что накопилось, — одной записью
+            items = [item]
+            while len(items) < FEED_BATCH and not subscriber.queue.empty():
+                items.append(subscriber.queue.get_nowait())
+            if any(i.get("op") == "resync" for i in items):
+                subscriber.overflowed = False
+            yield "".join(_format(i) for i in items)
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+@feed_router.get("/feed/", tags=["Лента изменений"], summary="Лента изменений (Server-Sent Events)")
+async def change_feed(
+    request: Request,
+    resources: Optional[str] = Query(None, description="Ресурсы через запятую, например vehicles,orders; без параметра — все"),
+):
+    """Поток событий change/resync. После resync и переподключения — синхронизация по ?updated_since=."""
+    wanted = frozenset(r.strip() for r in resources.split(",") if r.strip()) if resources else frozenset()
+    unknown = wanted - RESOURCES.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные ресурсы: {', '.join(sorted(unknown))}")
+    if _listener is not None:
+        _listener.start()
+    subscriber = broker.subscribe(wanted)
+    return StreamingResponse(
+        _stream(request, subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,404 @@
+# generate_data.py
+"""Генератор синтетических данных для нагрузочного тестирования.
+
+Заполняет все десять таблиц согласованными данными заданного объёма: заказы одной машины
+не пересекаются по времени, статусы машин и заказов соответствуют текущему моменту,
+платежи, штрафы и отзывы привязаны к завершённым заказам. Результат детерминирован
+(одинаковые параметры и --seed дают одинаковые данные).
+
+Строки пишутся пачками: в PostgreSQL через COPY, в остальных СУБД — executemany.
+Новые id продолжают уже существующие в таблицах.
+
+Пример:
+    python generate_data.py --vehicles 50000 --clients 200000 --orders 10000000
+    DATABASE_URL=sqlite:///load.db python generate_data.py --create-tables --orders 100000
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, insert, select
+
+from database import engine
+from models import (
+    CarModel, Vehicle, Client, Employee, RentalOrder,
+    Maintenance, Fine, Payment, InsurancePolicy, Review, utcnow,
+)
+from importer import copy_rows
+
+DEFAULT_BATCH_ROWS = 50000
+
+BRANDS = {
+    "Toyota": ["Camry", "Corolla", "RAV4", "Land Cruiser"],
+    "Kia": ["Rio", "Ceed", "Sportage", "K5"],
+    "Hyundai": ["Solaris", "Creta", "Tucson", "Sonata"],
+    "Volkswagen": ["Polo", "Tiguan", "Passat"],
+    "Skoda": ["Rapid", "Octavia", "Kodiaq"],
+    "Lada": ["Granta", "Vesta", "Niva"],
+    "BMW": ["3 Series", "5 Series", "X5"],
+    "Mercedes-Benz": ["C-Class", "E-Class", "GLE"],
+}
+# Класс: (минимальная и максимальная суточная ставка, залог)
+CAR_CLASSES = {
+    "Economy": (1500, 2500, 5000),
+    "Comfort": (2500, 4000, 10000),
+    "Business": (3500, 7000, 15000),
+    "Premium": (7000, 15000, 40000),
+    "SUV": (4000, 9000, 25000),
+}
+COLORS = ["White", "Black", "Silver", "Gray", "Blue", "Red", "Brown", "Green"]
+PLATE_LETTERS = "ABEKMHOPCTYX"
+LAST_NAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков", "Федоров", "Морозов", "Волков"]
+FIRST_NAMES = ["Иван", "Алексей", "Дмитрий", "Сергей", "Андрей", "Михаил", "Никита", "Артём", "Павел", "Олег"]
+MIDDLE_NAMES = ["Иванович", "Петрович", "Сергеевич", "Андреевич", "Дмитриевич", "Алексеевич", "Олегович"]
+POSITIONS = {"Менеджер": 0.6, "Старший менеджер": 0.15, "Механик": 0.15, "Администратор": 0.1}
+SERVICE_TYPES = ["ТО", "Замена шин", "Кузовной ремонт", "Замена масла", "Диагностика", "Ремонт подвески"]
+VIOLATIONS = {"Speeding": (500, 1500), "Parking": (1500, 3000), "Red light": (1000, 5000), "Damage": (5000, 50000)}
+PAYMENT_METHODS = ["Card", "Cash", "Transfer"]
+INSURERS = ["Ингосстрах", "РЕСО-Гарантия", "АльфаСтрахование", "СОГАЗ", "Росгосстрах"]
+COMMENTS = ["Всё отлично", "Машина чистая, спасибо", "Долго оформляли", "Рекомендую", None, None]
+
+# Распределения статусов по умолчанию (переопределяются аргументами вида "Paid=0.9,Partial=0.1")
+VEHICLE_STATUSES = "Available=0.92,Maintenance=0.08"  # для машин без текущей аренды
+EMPLOYEE_STATUSES = "Active=0.85,Vacation=0.06,Sick=0.04,Fired=0.04,Maternity=0.01"
+ORDER_STATUSES = "Closed=0.95,Cancelled=0.05"         # для заказов, закончившихся до текущего момента
+PAYMENT_STATUSES = "Paid=0.9,Partial=0.07,Unpaid=0.03"  # для закрытых заказов
+
+
+def parse_weights(text: str) -> dict:
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight)
+    if not weights or sum(weights.values()) <= 0:
+        raise argparse.ArgumentTypeError(f"Некорректное распределение: {text}")
+    return weights
+
+
+def _pick(rng: random.Random, weights: dict) -> str:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _count(rng: random.Random, mean: float) -> int:
+    """Целое количество со средним mean."""
+    whole = int(mean)
+    return whole + (rng.random() < mean - whole)
+
+
+def _money(value) -> Decimal:
+    return Decimal(value).quantize(Decimal("0.01"))
+
+
+class TableWriter:
+    """Буфер строк одной таблицы. Перед записью сбрасывает буферы родительских таблиц (FK)."""
+
+    def __init__(self, connection, model, batch_size: int, parents=()):
+        self.connection = connection
+        self.table = model.__table__
+        self.columns = self.table.columns.keys()
+        self.batch_size = batch_size
+        self.parents = parents
+        self.rows = []
+        self.written = 0
+        self.first_id = (connection.execute(select(func.max(self.table.c.id))).scalar() or 0) + 1
+        self.next_id = self.first_id
+        self.updated_at = utcnow()  # время изменения для ?updated_since= — момент генерации
+
+    def add(self, **values) -> int:
+        values["id"] = row_id = self.next_id
+        values["updated_at"] = self.updated_at
+        self.next_id += 1
+        self.rows.append(tuple(values.get(c) for c in self.columns))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+        return row_id
+
+    def flush(self):
+        for parent in self.parents:
+            parent.flush()
+        if not self.rows:
+            return
+        if self.connection.dialect.name == "postgresql":
+            copy_rows(self.connection, self.table.name, self.columns, self.rows)
+        else:
+            self.connection.execute(insert(self.table), [dict(zip(self.columns, row)) for row in self.rows])
+        self.connection.commit()
+        self.written += len(self.rows)
+        self.rows = []
+
+    def sync_sequence(self):
+        # id задавались явно — последовательность PostgreSQL нужно догнать
+        if self.connection.dialect.name == "postgresql" and self.written:
+            self.connection.exec_driver_sql(
+                f"SELECT setval(pg_get_serial_sequence('{self.table.name}', 'id'), {self.next_id - 1})"
+            )
+            self.connection.commit()
+
+
+class DataGenerator:
+    def __init__(self, connection, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.now = args.now
+        self.span_start = args.now - timedelta(days=args.days)
+        self.span_end = args.now + timedelta(days=args.future_days)
+
+        batch = args.batch_size
+        self.models = TableWriter(connection, CarModel, batch)
+        self.vehicles = TableWriter(connection, Vehicle, batch, [self.models])
+        self.clients = TableWriter(connection, Client, batch)
+        self.employees = TableWriter(connection, Employee, batch)
+        self.orders = TableWriter(connection, RentalOrder, batch, [self.vehicles, self.clients, self.employees])
+        self.maintenance = TableWriter(connection, Maintenance, batch, [self.vehicles])
+        self.insurance = TableWriter(connection, InsurancePolicy, batch, [self.vehicles])
+        self.payments = TableWriter(connection, Payment, batch, [self.orders])
+        self.fines = TableWriter(connection, Fine, batch, [self.orders])
+        self.reviews = TableWriter(connection, Review, batch, [self.orders])
+        self.writers = [
+            self.models, self.vehicles, self.clients, self.employees, self.orders,
+            self.maintenance, self.insurance, self.payments, self.fines, self.reviews,
+        ]
+        self.rates = {}  # id модели -> суточная ставка
+
+    def run(self, on_progress=None):
+        args = self.args
+        self.generate_models()
+        self.generate_clients()
+        self.generate_employees()
+        base, extra = divmod(args.orders, args.vehicles) if args.vehicles else (0, 0)
+        for index in range(args.vehicles):
+            self.generate_vehicle(index, base + (index < extra))
+            if on_progress and index % 1000 == 999:
+                on_progress(self)
+        for writer in self.writers:
+            writer.flush()
+            writer.sync_sequence()
+        if on_progress:
+            on_progress(self)
+
+    def generate_models(self):
+        rng = self.rng
+        for _ in range(self.args.models):
+            brand = rng.choice(list(BRANDS))
+            car_class = rng.choice(list(CAR_CLASSES))
+            low, high, deposit = CAR_CLASSES[car_class]
+            rate = _money(rng.randrange(low, high + 1, 100))
+            model_id = self.models.add(
+                brand=brand, model_name=rng.choice(BRANDS[brand]), car_class=car_class,
+                daily_rate=rate, deposit_amount=_money(deposit),
+            )
+            self.rates[model_id] = rate
+        self.model_ids = list(self.rates)
+
+    def generate_clients(self):
+        rng = self.rng
+        for _ in range(self.args.clients):
+            self.clients.add(
+                full_name=f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)} {rng.choice(MIDDLE_NAMES)}",
+                driver_license_num=f"{rng.randint(1000, 9999)} {rng.randint(100000, 999999)}",
+                passport_data=f"{rng.randint(1000, 9999)} {rng.randint(100000, 999999)}",
+                phone=f"+79{rng.randint(0, 999999999):09d}",
+                birth_date=date(1950, 1, 1) + timedelta(days=rng.randint(0, 54 * 365)),
+                rating=_money(rng.uniform(3, 5)),
+                is_blacklisted=rng.random() < 0.01,
+            )
+
+    def generate_employees(self):
+        rng = self.rng
+        for _ in range(self.args.employees):
+            self.employees.add(
+                full_name=f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}",
+                position=_pick(rng, POSITIONS),
+                status=_pick(rng, self.args.employee_statuses),
+            )
+
+    def schedule(self, rng: random.Random, count: int) -> list:
+        """Непересекающиеся интервалы заказов машины: [(start, end_planned, end_actual, status)]."""
+        slot = (self.span_end - self.span_start) / max(count, 1)
+        intervals = []
+        for i in range(count):
+            start = self.span_start + slot * i + slot * rng.uniform(0, 0.3)
+            end_planned = start + max(slot * rng.uniform(0.2, 0.6), timedelta(hours=1))
+            if end_planned <= self.now:
+                status = _pick(rng, self.args.order_statuses)
+                # Возврат на несколько часов раньше или позже плана, но до следующего слота
+                end_actual = end_planned + slot * rng.uniform(-0.1, 0.1) if status == "Closed" else None
+                if end_actual is not None and not start < end_actual <= self.now:
+                    end_actual = end_planned
+            else:
+                status, end_actual = "Open", None
+            intervals.append((start.replace(microsecond=0), end_planned.replace(microsecond=0),
+                              end_actual and end_actual.replace(microsecond=0), status))
+        return intervals
+
+    def generate_vehicle(self, index: int, order_count: int):
+        # Свой генератор на каждую машину: данные машины не зависят от объёма остальных таблиц
+        rng = random.Random(f"{self.args.seed}:{index}")
+        args = self.args
+        intervals = self.schedule(rng, order_count)
+        rented = any(start <= self.now < end and status == "Open" for start, end, _, status in intervals)
+        status = "Rented" if rented else _pick(rng, args.vehicle_statuses)
+
+        model_id = rng.choice(self.model_ids)
+        vehicle_id = self.vehicles.add(
+            model_id=model_id,
+            license_plate=f"{rng.choice(PLATE_LETTERS)}{index % 1000:03d}{rng.choice(PLATE_LETTERS)}{rng.choice(PLATE_LETTERS)}{rng.choice([77, 97, 99, 177, 197, 777])}",
+            vin_code=f"XTA{args.seed % 1000:03d}{index:011d}",
+            color=rng.choice(COLORS),
+            current_mileage=rng.randint(1000, 200000),
+            status=status,
+        )
+        for start, end_planned, end_actual, order_status in intervals:
+            self.generate_order(rng, vehicle_id, self.rates[model_id], start, end_planned, end_actual, order_status)
+        self.generate_service(rng, vehicle_id, index, status)
+
+    def generate_order(self, rng, vehicle_id, rate, start, end_planned, end_actual, status):
+        args = self.args
+        days = max(1, math.ceil((end_planned - start).total_seconds() / 86400))
+        total = _money(rate * days)
+        if status == "Closed":
+            payment_status = _pick(rng, args.payment_statuses)
+        elif status == "Open" and start <= self.now:
+            payment_status = "Partial" if rng.random() < 0.7 else "Unpaid"
+        else:
+            payment_status = "Unpaid"
+        order_id = self.orders.add(
+            client_id=self.clients.first_id + rng.randrange(args.clients),
+            vehicle_id=vehicle_id,
+            employee_id=self.employees.first_id + rng.randrange(args.employees),
+            start_date=start,
+            end_date_planned=end_planned,
+            end_date_actual=end_actual,
+            total_cost=total,
+            payment_status=payment_status,
+            deposit_returned=status == "Closed",
+            order_status=status,
+        )
+
+        # Платежи: при Paid покрывают стоимость полностью, при Partial — частично
+        if payment_status == "Paid":
+            parts = max(1, _count(rng, args.payments_per_order))
+        elif payment_status == "Partial":
+            parts = 1
+        else:
+            parts = 0
+        paid = total if payment_status == "Paid" else _money(total * Decimal(rng.uniform(0.2, 0.8)))
+        for part in range(parts):
+            amount = _money(paid / parts) if part < parts - 1 else paid - _money(paid / parts) * (parts - 1)
+            self.payments.add(
+                order_id=order_id, amount=amount,
+                payment_date=start + (end_planned - start) * (part / parts),
+                payment_type="Income", method=rng.choice(PAYMENT_METHODS),
+            )
+
+        if status != "Closed":
+            return
+        for _ in range(_count(rng, args.fines_per_order)):
+            violation = rng.choice(list(VIOLATIONS))
+            self.fines.add(
+                order_id=order_id, violation_type=violation,
+                amount=_money(rng.randrange(*VIOLATIONS[violation], 100)),
+                is_paid=rng.random() < 0.7,
+                issue_date=(start + (end_actual - start) * rng.random()).date(),
+            )
+        if rng.random() < args.review_ratio:
+            self.reviews.add(
+                order_id=order_id,
+                car_rating=rng.choices([1, 2, 3, 4, 5], weights=[1, 2, 5, 15, 30])[0],
+                client_rating=rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 3, 10, 35])[0],
+                comment=rng.choice(COMMENTS),
+            )
+
+    def generate_service(self, rng, vehicle_id, index, status):
+        span_days = (self.now - self.span_start).days
+        for _ in range(_count(rng, self.args.maintenance_per_vehicle)):
+            start = self.span_start.date() + timedelta(days=rng.randint(0, max(span_days - 1, 0)))
+            self.maintenance.add(
+                vehicle_id=vehicle_id, start_date=start, end_date=start + timedelta(days=rng.randint(0, 4)),
+                service_type=rng.choice(SERVICE_TYPES), cost=_money(rng.randrange(2000, 60000, 500)),
+            )
+        if status == "Maintenance":
+            # Машина сейчас в ремонте — открытая запись без даты окончания
+            self.maintenance.add(
+                vehicle_id=vehicle_id, start_date=self.now.date() - timedelta(days=rng.randint(0, 5)), end_date=None,
+                service_type=rng.choice(SERVICE_TYPES), cost=_money(rng.randrange(2000, 60000, 500)),
+                description="В работе",
+            )
+
+        # Годовые полисы подряд, последний действует на текущую дату
+        policy_start = self.span_start.date() - timedelta(days=rng.randint(0, 364))
+        number = 0
+        while policy_start <= self.now.date():
+            number += 1
+            self.insurance.add(
+                vehicle_id=vehicle_id,
+                policy_number=f"XXX{index:08d}{number:02d}",
+                insurance_company=rng.choice(INSURERS),
+                start_date=policy_start,
+                end_date=policy_start + timedelta(days=364),
+                cost=_money(rng.randrange(15000, 60000, 100)),
+            )
+            policy_start += timedelta(days=365)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Синтетические данные для нагрузочного тестирования")
+    parser.add_argument("--models", type=int, default=50)
+    parser.add_argument("--vehicles", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--employees", type=int, default=50)
+    parser.add_argument("--orders", type=int, default=20000, help="всего заказов, поровну на машины")
+    parser.add_argument("--days", type=int, default=730, help="глубина истории, дней до --now")
+    parser.add_argument("--future-days", type=int, default=30, help="бронирования на N дней вперёд")
+    parser.add_argument("--now", type=datetime.fromisoformat, default=datetime.now().replace(hour=12, minute=0, second=0, microsecond=0),
+                        help="текущий момент для статусов (по умолчанию сегодня 12:00)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--vehicle-statuses", type=parse_weights, default=parse_weights(VEHICLE_STATUSES))
+    parser.add_argument("--employee-statuses", type=parse_weights, default=parse_weights(EMPLOYEE_STATUSES))
+    parser.add_argument("--order-statuses", type=parse_weights, default=parse_weights(ORDER_STATUSES))
+    parser.add_argument("--payment-statuses", type=parse_weights, default=parse_weights(PAYMENT_STATUSES))
+    parser.add_argument("--payments-per-order", type=float, default=1.2, help="среднее число платежей оплаченного заказа")
+    parser.add_argument("--fines-per-order", type=float, default=0.1, help="среднее число штрафов закрытого заказа")
+    parser.add_argument("--review-ratio", type=float, default=0.3, help="доля закрытых заказов с отзывом")
+    parser.add_argument("--maintenance-per-vehicle", type=float, default=1.5)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_ROWS)
+    parser.add_argument("--create-tables", action="store_true", help="создать схему БД (migrate.py) перед генерацией")
+    return parser
+
+
+def generate(args, on_progress=None) -> DataGenerator:
+    with engine.connect() as connection:
+        generator = DataGenerator(connection, args)
+        generator.run(on_progress)
+    return generator
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.vehicles and not (args.models and args.clients and args.employees):
+        parser.error("для машин и заказов нужны --models, --clients и --employees больше нуля")
+
+    if args.create_tables:
+        from migrate import migrate
+        migrate(engine)
+
+    started = time.perf_counter()
+
+    def progress(generator):
+        rows = sum(w.written + len(w.rows) for w in generator.writers)
+        elapsed = time.perf_counter() - started
+        print(f"\rстрок: {rows} ({rows / elapsed:.0f} строк/с)", end="", file=sys.stderr, flush=True)
+
+    generator = generate(args, progress)
+    print(file=sys.stderr)
+    for writer in generator.writers:
+        print(f"{writer.table.name}: {writer.written}")
+
+
+if __name__ == "__main__":
+    main()
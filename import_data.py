@@ -0,0 +1,57 @@
+# import_data.py
+"""Загрузка CSV/NDJSON в таблицу из командной строки.
+
+Пример:
+    python import_data.py payments payments.csv
+    python import_data.py vehicles vehicles.ndjson --rejects vehicles.rejected.ndjson
+"""
+import argparse
+import json
+import sys
+import time
+
+from models import RESOURCES
+from importer import import_rows, IMPORT_BATCH_ROWS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовая загрузка данных (COPY в PostgreSQL)")
+    parser.add_argument("resource", choices=sorted(RESOURCES), help="таблица, как в URL API")
+    parser.add_argument("path", help="файл CSV или NDJSON ('-' — stdin)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="по умолчанию — по расширению файла")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_ROWS, help="строк в одной транзакции")
+    parser.add_argument("--rejects", help="куда записать отклонённые строки (NDJSON)")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    started = time.perf_counter()
+
+    def progress(report):
+        elapsed = time.perf_counter() - started
+        print(
+            f"\rпрочитано {report.total}, вставлено {report.inserted}, обновлено {report.updated}, "
+            f"отклонено {report.rejected} ({report.total / elapsed:.0f} строк/с)",
+            end="", file=sys.stderr, flush=True,
+        )
+
+    stream = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8-sig", newline="")
+    with stream:
+        report = import_rows(RESOURCES[args.resource], stream, fmt, args.batch_size, progress)
+    print(file=sys.stderr)
+
+    if args.rejects:
+        with open(args.rejects, "w", encoding="utf-8") as f:
+            for reject in report.rejects:
+                f.write(json.dumps(reject, ensure_ascii=False, default=str) + "\n")
+    else:
+        for reject in report.rejects:
+            print(f"строка {reject['line']}: {reject['error']}", file=sys.stderr)
+    if report.rejected > len(report.rejects):
+        print(f"... и ещё {report.rejected - len(report.rejects)} отклонённых строк", file=sys.stderr)
+
+    print(json.dumps({k: v for k, v in report.as_dict().items() if k != "rejects"}, ensure_ascii=False))
+    sys.exit(1 if report.rejected else 0)
+
+
+if __name__ == "__main__":
+    main()
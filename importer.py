@@ -0,0 +1,309 @@
+"""Массовая загрузка CSV/NDJSON в любую таблицу из models.py.
+
+PostgreSQL: строки пачками проходят валидацию в Python и через COPY FROM STDIN попадают
+во временную staging-таблицу; внешние ключи проверяются одним запросом на пачку,
+после чего данные сливаются в целевую таблицу (INSERT ... ON CONFLICT (id) DO UPDATE).
+Строки без id получают новый id, строки с id вставляются или обновляют существующие.
+
+Другие СУБД (SQLite для тестов и т.п.): та же валидация, запись через executemany без
+диалектных конструкций — строки с известным id обновляются, остальные вставляются.
+
+Каждая пачка — отдельная транзакция; отклонённые строки (ошибка типа, нет родителя,
+ошибка БД для всей пачки) попадают в отчёт с номером строки исходного файла.
+"""
+import csv
+import io
+import json
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from fastapi import APIRouter, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import Session
+
+from database import engine
+from models import RESOURCES
+from bulk import check_foreign_keys
+from cache import invalidate
+from feed import publish, record
+
+IMPORT_BATCH_ROWS = 50000
+
+# Сколько отклонённых строк хранить в отчёте подробно (счётчик ведётся всегда)
+MAX_REPORTED_REJECTS = 1000
+
+# Маркер NULL в CSV для COPY: пустая строка без кавычек — это пустая строка, а не NULL
+COPY_NULL = "\\N"
+
+# Тело запроса больше этого размера буферизуется на диске, а не в памяти
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+
+import_router = APIRouter()
+
+
+class ImportReport:
+    """Прогресс и итог загрузки."""
+
+    def __init__(self, max_rejects: int = MAX_REPORTED_REJECTS):
+        self.total = 0
+        self.inserted = 0
+        self.updated = 0
+        self.rejected = 0
+        self.rejects = []
+        self.max_rejects = max_rejects
+
+    def error(self, line: int, error):
+        self.rejected += 1
+        if len(self.rejects) < self.max_rejects:
+            self.rejects.append({"line": line, "error": error})
+
+    def as_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "rejected": self.rejected,
+            "rejects": sorted(self.rejects, key=lambda r: r["line"]),
+        }
+
+
+def read_rows(stream: Iterable[str], fmt: str) -> Iterator[Tuple[int, dict]]:
+    """(номер строки файла, словарь значений) из текстового потока CSV или NDJSON."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # В CSV нет NULL: пустое поле считаем отсутствующим значением
+            yield reader.line_num, {k: (v if v != "" else None) for k, v in row.items()}
+    elif fmt == "ndjson":
+        for line_no, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, e
+    else:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+
+def _field_names(model) -> dict:
+    """Алиас -> имя поля: в файлах принимается и имя поля ('car_class'), и алиас ('class')."""
+    return {field.alias: name for name, field in model.model_fields.items() if field.alias}
+
+
+def validated_batches(model, rows: Iterable[Tuple[int, dict]], report: ImportReport, batch_size: int):
+    """Пачки {номер строки: провалидированный объект}; ошибочные строки уходят в отчёт."""
+    aliases = _field_names(model)
+    batch = {}
+    for line, raw in rows:
+        report.total += 1
+        if not isinstance(raw, dict):
+            report.error(line, f"Некорректная строка: {raw}")
+            continue
+        # updated_at из файла (например, из /export) не переносится — время изменения ставит сервер
+        data = {aliases.get(k, k): v for k, v in raw.items() if k != "updated_at"}
+        try:
+            batch[line] = model.model_validate(data)
+        except ValidationError as e:
+            report.error(line, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            continue
+        if len(batch) >= batch_size:
+            yield batch
+            batch = {}
+    if batch:
+        yield batch
+
+
+# ---------- PostgreSQL: COPY в staging-таблицу ----------
+
+def _copy_value(value):
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _copy_into(dbapi_connection, sql: str, data: str):
+    cursor = dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            cursor.copy_expert(sql, io.StringIO(data))
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(data)
+    finally:
+        cursor.close()
+
+
+def copy_rows(connection, table_name: str, columns: list, rows: Iterable[tuple]):
+    """COPY FROM STDIN кортежей значений в таблицу PostgreSQL (соединение SQLAlchemy)."""
+    q = connection.dialect.identifier_preparer.quote
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_copy_value(v) for v in row] for row in rows)
+    _copy_into(
+        connection.connection.dbapi_connection,
+        f"COPY {q(table_name)} ({', '.join(q(c) for c in columns)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+        buffer.getvalue(),
+    )
+
+
+def _pg_import_batch(connection, model, batch: dict, report: ImportReport, staging_name: str):
+    table = model.__table__
+    q = connection.dialect.identifier_preparer.quote
+    columns = table.columns.keys()
+    data_columns = [c for c in columns if c != "id"]
+    target, staging = q(table.name), q(staging_name)
+
+    connection.exec_driver_sql(f"TRUNCATE {staging}")
+    copy_rows(
+        connection, staging_name, ["_line"] + columns,
+        ([line] + [getattr(obj, name) for name in columns] for line, obj in batch.items()),
+    )
+    column_list = ", ".join(q(c) for c in columns)
+
+    # Внешние ключи: строки без родителя удаляются из staging одним запросом на каждую связь
+    for fk in table.foreign_keys:
+        column, parent = q(fk.parent.name), fk.column
+        rejected = connection.exec_driver_sql(
+            f"DELETE FROM {staging} s WHERE s.{column} IS NOT NULL AND NOT EXISTS "
+            f"(SELECT 1 FROM {q(parent.table.name)} p WHERE p.{q(parent.name)} = s.{column}) "
+            f"RETURNING s._line, s.{column}"
+        ).all()
+        for line, value in rejected:
+            report.error(line, f"{fk.parent.name}={value}: запись {parent.table.name} не найдена")
+
+    # Новые строки (без id) — id выдаёт последовательность целевой таблицы
+    data_list = ", ".join(q(c) for c in data_columns)
+    result = connection.exec_driver_sql(
+        f"INSERT INTO {target} ({data_list}) SELECT {data_list} FROM {staging} WHERE id IS NULL ORDER BY _line"
+    )
+    report.inserted += result.rowcount
+
+    # Строки с id: вставка или обновление; при повторах id в пачке побеждает последняя строка
+    updates = ", ".join(f"{q(c)} = EXCLUDED.{q(c)}" for c in data_columns)
+    flags = connection.exec_driver_sql(
+        f"INSERT INTO {target} ({column_list}) "
+        f"SELECT DISTINCT ON (id) {column_list} FROM {staging} WHERE id IS NOT NULL ORDER BY id, _line DESC "
+        f"ON CONFLICT (id) DO UPDATE SET {updates} RETURNING (xmax = 0)"
+    ).scalars().all()
+    if flags:
+        report.inserted += sum(1 for f in flags if f)
+        report.updated += sum(1 for f in flags if not f)
+        # Явные id могли обогнать последовательность
+        connection.exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"GREATEST((SELECT max(id) FROM {target}), 1))"
+        )
+
+
+def _pg_import(model, batches, report: ImportReport, on_progress):
+    table = model.__table__
+    q = engine.dialect.identifier_preparer.quote
+    staging_name = f"stg_import_{table.name}"
+    staging = q(staging_name)
+    with engine.connect() as connection:
+        # Копия структуры целевой таблицы без ограничений, кроме NOT NULL, + номер строки файла
+        with connection.begin():
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {staging}")
+            connection.exec_driver_sql(f"CREATE TEMP TABLE {staging} (LIKE {q(table.name)})")
+            connection.exec_driver_sql(f"ALTER TABLE {staging} ALTER COLUMN id DROP NOT NULL, ADD COLUMN _line integer")
+        try:
+            for batch in batches:
+                written = report.inserted + report.updated
+                try:
+                    with connection.begin():
+                        _pg_import_batch(connection, model, batch, report, staging_name)
+                    # Без триггеров ленты (migrations/005) событие публикует сам процесс
+                    publish(model, "update", count=report.inserted + report.updated - written)
+                except DBAPIError as e:
+                    for line in batch:
+                        report.error(line, f"Пачка отклонена базой данных: {e.orig}")
+                if on_progress:
+                    on_progress(report)
+        finally:
+            with connection.begin():
+                connection.exec_driver_sql(f"DROP TABLE IF EXISTS {staging}")
+
+
+# ---------- Остальные СУБД: executemany ----------
+
+def _generic_import(model, batches, report: ImportReport, on_progress):
+    table = model.__table__
+    for batch in batches:
+        with Session(engine) as session:
+            check_foreign_keys(session, model, batch, report)
+            new_rows = [obj.model_dump(exclude={"id"}) for obj in batch.values() if obj.id is None]
+            # При повторах id в пачке побеждает последняя строка
+            known_rows = {obj.id: obj.model_dump() for obj in batch.values() if obj.id is not None}
+            try:
+                if new_rows:
+                    session.execute(insert(table), new_rows)
+                    report.inserted += len(new_rows)
+                    record(session, model, "insert", count=len(new_rows))
+                if known_rows:
+                    existing = set(session.execute(
+                        select(table.c.id).where(table.c.id.in_(known_rows))
+                    ).scalars().all())
+                    inserted = [row for item_id, row in known_rows.items() if item_id not in existing]
+                    updated = [row for item_id, row in known_rows.items() if item_id in existing]
+                    if inserted:
+                        session.execute(insert(table), inserted)
+                        report.inserted += len(inserted)
+                        record(session, model, "insert", [row["id"] for row in inserted])
+                    if updated:
+                        # UPDATE ... WHERE id = :id через executemany, как в bulk.py
+                        session.execute(update(model), updated)
+                        report.updated += len(updated)
+                        record(session, model, "update", existing)
+                session.commit()
+            except DBAPIError as e:
+                session.rollback()
+                for line in batch:
+                    report.error(line, f"Пачка отклонена базой данных: {e.orig}")
+        if on_progress:
+            on_progress(report)
+
+
+def import_rows(
+    model,
+    stream: Iterable[str],
+    fmt: str,
+    batch_size: int = IMPORT_BATCH_ROWS,
+    on_progress: Optional[Callable[[ImportReport], None]] = None,
+) -> ImportReport:
+    """Загружает строки CSV/NDJSON в таблицу модели и возвращает отчёт."""
+    report = ImportReport()
+    batches = validated_batches(model, read_rows(stream, fmt), report, batch_size)
+    try:
+        if engine.dialect.name == "postgresql":
+            _pg_import(model, batches, report, on_progress)
+        else:
+            _generic_import(model, batches, report, on_progress)
+    finally:
+        invalidate(model)
+    return report
+
+
+def _add_route(resource: str, model):
+    @import_router.post(f"/{resource}/import", tags=[f"import: {resource}"], name=f"import_{resource}", summary="Загрузка CSV/NDJSON")
+    async def import_file(request: Request, format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+        # Тело читаем потоком во временный файл, загрузку выполняем в пуле потоков
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+            async for chunk in request.stream():
+                spool.write(chunk)
+            spool.seek(0)
+            stream = io.TextIOWrapper(spool, encoding="utf-8-sig", newline="")
+            report = await run_in_threadpool(import_rows, model, stream, format)
+            stream.detach()
+        return report.as_dict()
+
+
+for _resource, _model in RESOURCES.items():
+    _add_route(_resource, _model)
@@ -0,0 +1,197 @@
+"""Финансовая ведомость по заказам и клиентам, посчитанная агрегатными запросами.
+
+Вместо обхода order.payments / order.fines для каждого заказа (N+1, как в requests.run_queries)
+суммы платежей и штрафов группируются в SQL подзапросами, ограниченными выбранными заказами,
+и приходят одним запросом.
+
+Долг по заказу = стоимость заказа − оплачено (с учётом направления платежа) + неоплаченные штрафы.
+"""
+from decimal import Decimal
+
+from fastapi import HTTPException, Response
+from sqlalchemy import Numeric, case, false, func, type_coerce
+from sqlmodel import Session, select
+
+from archive import needs_archive, with_archive
+from models import RentalOrder, Payment, Fine
+from pagination import (
+    PageParams, apply_filters, build_page_query, decode_cursor, encode_cursor,
+    _sort_column, is_nullable, order_keys, NEXT_CURSOR_HEADER,
+)
+
+# Как тип платежа влияет на долг: 1 — оплата клиента, -1 — возврат клиенту, прочие типы не учитываются
+PAYMENT_DIRECTION = {"Income": 1, "Refund": -1}
+
+MONEY = Numeric(14, 2)
+ZERO = Decimal("0.00")
+
+
+def _money(value) -> str:
+    return str(Decimal(value or 0).quantize(Decimal("0.01")))
+
+
+def _payment_sign():
+    return case(PAYMENT_DIRECTION, value=Payment.payment_type, else_=0)
+
+
+def _unpaid_fines():
+    return type_coerce(func.sum(case((Fine.is_paid == false(), Fine.amount), else_=0)), MONEY)
+
+
+def _archived(session: Session, statement, filters: dict):
+    # Платежи и штрафы архивных заказов лежат в архиве вместе с ними
+    if needs_archive(session, RentalOrder, filters):
+        return with_archive(statement, RentalOrder, Payment, Fine)
+    return statement
+
+
+def order_ledger(session: Session, page: PageParams, filters: dict, response: Response) -> list:
+    """Страница заказов с суммами платежей по типам, неоплаченными штрафами и долгом."""
+    if page.fields:
+        raise HTTPException(status_code=400, detail="Выбор полей (fields) для ведомости не поддерживается")
+    if page.updated_since is not None:
+        raise HTTPException(status_code=400, detail="Синхронизация (updated_since) для ведомости не поддерживается")
+    orders = build_page_query(RentalOrder, page, filters).subquery("o")
+    order_ids = select(orders.c.id)
+
+    payments = (
+        select(Payment.order_id, Payment.payment_type, func.sum(Payment.amount).label("amount"))
+        .where(Payment.order_id.in_(order_ids))
+        .group_by(Payment.order_id, Payment.payment_type)
+        .subquery("p")
+    )
+    fines = (
+        select(Fine.order_id, _unpaid_fines().label("unpaid_fines"))
+        .where(Fine.order_id.in_(order_ids))
+        .group_by(Fine.order_id)
+        .subquery("f")
+    )
+    statement = (
+        select(orders, payments.c.payment_type, payments.c.amount, fines.c.unpaid_fines)
+        .select_from(
+            orders
+            .outerjoin(payments, payments.c.order_id == orders.c.id)
+            .outerjoin(fines, fines.c.order_id == orders.c.id)
+        )
+    )
+    # Порядок страницы — тот же, что в build_page_query
+    column, descending = _sort_column(RentalOrder, page.order_by)
+    statement = statement.order_by(*order_keys(
+        orders.c[column.key] if column is not None else None, orders.c.id, descending,
+        is_nullable(RentalOrder, column),
+    ))
+
+    # Строка на (заказ, тип платежа) — собираем по заказам, сохраняя порядок
+    ledger = {}
+    for row in session.execute(_archived(session, statement, filters)):
+        entry = ledger.get(row.id)
+        if entry is None:
+            entry = ledger[row.id] = {"row": row, "payments": {}, "unpaid_fines": row.unpaid_fines or ZERO}
+        if row.payment_type is not None:
+            entry["payments"][row.payment_type] = row.amount
+
+    rows, next_cursor = _finish(page, [entry["row"] for entry in ledger.values()])
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    items = []
+    for row in rows:
+        entry = ledger[row.id]
+        paid = sum((amount * PAYMENT_DIRECTION.get(kind, 0) for kind, amount in entry["payments"].items()), ZERO)
+        total = row.total_cost or ZERO
+        items.append({
+            "order_id": row.id,
+            "client_id": row.client_id,
+            "vehicle_id": row.vehicle_id,
+            "start_date": row.start_date,
+            "order_status": row.order_status,
+            "payment_status": row.payment_status,
+            "total_cost": _money(total),
+            "payments": {kind: _money(amount) for kind, amount in sorted(entry["payments"].items())},
+            "paid": _money(paid),
+            "unpaid_fines": _money(entry["unpaid_fines"]),
+            "balance": _money(total - paid + entry["unpaid_fines"]),
+        })
+    return items
+
+
+def _finish(page: PageParams, rows: list):
+    # Как pagination.finish_page, но для строк подзапроса
+    if len(rows) <= page.limit:
+        return rows, None
+    rows = rows[:page.limit]
+    column, _ = _sort_column(RentalOrder, page.order_by)
+    last = rows[-1]
+    value = getattr(last, column.key) if column is not None else None
+    return rows, encode_cursor(page.order_by, value, last.id)
+
+
+def client_ledger(session: Session, page: PageParams, filters: dict, response: Response) -> list:
+    """Сводка по клиентам за выбранные заказы: число заказов, стоимость, оплачено, штрафы, долг."""
+    if page.order_by:
+        raise HTTPException(status_code=400, detail="Сводка по клиентам сортируется только по client_id")
+    if page.fields:
+        raise HTTPException(status_code=400, detail="Выбор полей (fields) для ведомости не поддерживается")
+    if page.updated_since is not None:
+        raise HTTPException(status_code=400, detail="Синхронизация (updated_since) для ведомости не поддерживается")
+
+    orders = apply_filters(
+        select(RentalOrder.id, RentalOrder.client_id, RentalOrder.total_cost), RentalOrder, filters
+    )
+    if page.after:
+        try:
+            orders = orders.where(RentalOrder.client_id > int(decode_cursor(page.after)["id"]))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Некорректный курсор пагинации")
+    orders = orders.subquery("o")
+    order_ids = select(orders.c.id)
+
+    payments = (
+        select(Payment.order_id, type_coerce(func.sum(Payment.amount * _payment_sign()), MONEY).label("paid"))
+        .where(Payment.order_id.in_(order_ids))
+        .group_by(Payment.order_id)
+        .subquery("p")
+    )
+    fines = (
+        select(Fine.order_id, _unpaid_fines().label("unpaid_fines"))
+        .where(Fine.order_id.in_(order_ids))
+        .group_by(Fine.order_id)
+        .subquery("f")
+    )
+    total_cost = func.coalesce(func.sum(orders.c.total_cost), 0)
+    paid = func.coalesce(func.sum(payments.c.paid), 0)
+    unpaid_fines = func.coalesce(func.sum(fines.c.unpaid_fines), 0)
+    statement = (
+        select(
+            orders.c.client_id,
+            func.count().label("orders"),
+            type_coerce(total_cost, MONEY).label("total_cost"),
+            type_coerce(paid, MONEY).label("paid"),
+            type_coerce(unpaid_fines, MONEY).label("unpaid_fines"),
+            type_coerce(total_cost - paid + unpaid_fines, MONEY).label("balance"),
+        )
+        .select_from(
+            orders
+            .outerjoin(payments, payments.c.order_id == orders.c.id)
+            .outerjoin(fines, fines.c.order_id == orders.c.id)
+        )
+        .group_by(orders.c.client_id)
+        .order_by(orders.c.client_id)
+        .limit(page.limit + 1)
+    )
+    rows = session.execute(_archived(session, statement, filters)).all()
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(None, None, rows[-1].client_id)
+
+    return [
+        {
+            "client_id": row.client_id,
+            "orders": row.orders,
+            "total_cost": _money(row.total_cost),
+            "paid": _money(row.paid),
+            "unpaid_fines": _money(row.unpaid_fines),
+            "balance": _money(row.balance),
+        }
+        for row in rows
+    ]
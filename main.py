@@ -1,13 +1,39 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlmodel import Session, select
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
 from typing import List, Optional
+from datetime import date, datetime
 
 # Импортируем настройки БД и Модели
-from database import create_db_and_tables, get_session
+from database import get_session, engine, async_engine
+from pool import pool_status
 from models import (
     CarModel, Vehicle, Client, Employee, RentalOrder, 
-    Maintenance, Fine, Payment, InsurancePolicy, Review
+    Maintenance, Fine, Payment, InsurancePolicy, Review, RESOURCES
 )
+from relations import load_related
+from crud import find_dependents, insert_returning, update_returning, delete_returning
+from availability import find_available
+from orders import insert_order, patch_order, release_vehicle, integrity_error
+from async_api import async_router, ASYNC_API
+from bulk import bulk_router
+from export import export_router
+from importer import import_router
+from cache import cached_list, invalidate, response_cache
+from stats import get_stats, check_stats
+from ledger import order_ledger, client_ledger
+from compression import CompressionMiddleware
+from metrics import MetricsMiddleware, registry, gauge_lines, render_metrics
+from pagination import PageParams, page_model, paginate, NEXT_CURSOR_HEADER
+from sync import SYNC_TOKEN_HEADER
+from feed import feed_router, configure_feed, stop_feed, feed_status
+from search import search, configure_search, search_status, SEARCH_MAX_LIMIT
+from archive import archive_status, archived_error
+from overdue import overdue_status
+from scheduler import configure_scheduler, start_scheduler, stop_scheduler, scheduler_status, scheduler
+from migrate import check_schema, schema_status
+from pricing import QuoteRequest, quote_batch, pricing_status
 
 app = FastAPI(
     title="Car Rental System API",
@@ -17,7 +43,17 @@ app = FastAPI(
 
 @app.on_event("startup")
 def on_startup():
-    create_db_and_tables()
+    # Схему создаёт и обновляет python migrate.py; здесь — только сверка версии одним запросом
+    check_schema(engine)
+    configure_feed(engine)  # источник ленты изменений: LISTEN/NOTIFY или публикация из процесса
+    configure_search(engine)  # индекс поиска: pg_trgm или триграммы в памяти
+    configure_scheduler(engine)  # фоновые задачи: архив заказов, штрафы за просрочку
+    start_scheduler()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_feed()
+    stop_scheduler()
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -27,55 +63,75 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, SYNC_TOKEN_HEADER, "Server-Timing"],  # Чтобы фронтенд мог прочитать курсор и токен синхронизации
 )
 
+# Число и время SQL-запросов каждого HTTP-запроса: заголовок Server-Timing и /metrics
+app.add_middleware(MetricsMiddleware)
+
+# gzip/brotli для ответов от COMPRESS_MIN_BYTES (compression.py)
+app.add_middleware(CompressionMiddleware)
+
+# Пакетные эндпоинты /{resource}/bulk, экспорт и импорт — раньше всех CRUD-роутов, и асинхронных,
+# и синхронных: иначе PUT/DELETE /vehicles/bulk совпадёт с /vehicles/{item_id}
+app.include_router(bulk_router)
+app.include_router(export_router)
+app.include_router(import_router)
+app.include_router(feed_router)
+
+# Асинхронные CRUD-эндпоинты подключаются раньше синхронных: в режиме primary
+# они перехватывают те же пути, в режиме prefix доступны по /async/...
+if ASYNC_API != "off" and async_engine is not None:
+    app.include_router(async_router, prefix="" if ASYNC_API == "primary" else "/async")
+
 # ==========================================
 # 1. СПРАВОЧНИК МОДЕЛЕЙ (CarModel)
 # ==========================================
 TAG_MODELS = "1. Справочник моделей"
 
-@app.get("/models/", response_model=List[CarModel], tags=[TAG_MODELS], summary="Список всех моделей")
-def get_car_models(session: Session = Depends(get_session)):
-    """Получить список всех марок и моделей автомобилей с ценами."""
-    return session.exec(select(CarModel)).all()
+@app.get("/models/", response_model=page_model(CarModel), tags=[TAG_MODELS], summary="Список моделей")
+def get_car_models(
+    request: Request,
+    page: PageParams = Depends(),
+    brand: Optional[str] = None,
+    car_class: Optional[str] = None,
+    session: Session = Depends(get_session),
+):
+    """Получить список марок и моделей автомобилей с ценами (постранично, с кэшем и ETag)."""
+    return cached_list(
+        request, CarModel,
+        lambda response: paginate(session, CarModel, page, response, brand=brand, car_class=car_class),
+    )
 
 @app.post("/models/", response_model=CarModel, tags=[TAG_MODELS], summary="Добавить новую модель")
 def create_car_model(model: CarModel, session: Session = Depends(get_session)):
     """Создать новую модель в справочнике (например, Kia Rio)."""
-    session.add(model)
+    model = insert_returning(session, CarModel, model)
     session.commit()
-    session.refresh(model)
+    invalidate(CarModel)
     return model
 
 @app.delete("/models/{model_id}", tags=[TAG_MODELS], summary="Удалить модель")
 def delete_car_model(model_id: int, session: Session = Depends(get_session)):
-    model = session.get(CarModel, model_id)
-    if not model:
-        raise HTTPException(status_code=404, detail="Модель не найдена")
-    
-    # Проверка зависимостей
-    if session.exec(select(Vehicle).where(Vehicle.model_id == model_id)).first():
+    # Проверка зависимостей (у несуществующей модели их нет — тогда 404 ниже)
+    if find_dependents(session, CarModel, model_id):
         raise HTTPException(status_code=400, detail="Нельзя удалить модель: в базе есть автомобили этой модели.")
 
-    session.delete(model)
+    if not delete_returning(session, CarModel, model_id):
+        raise HTTPException(status_code=404, detail="Модель не найдена")
     session.commit()
+    invalidate(CarModel)
     return {"ok": True, "message": "Модель удалена"}
 
 
 @app.put("/models/{model_id}", response_model=CarModel, tags=[TAG_MODELS], summary="Изменить модель")
 def update_car_model(model_id: int, model_data: CarModel, session: Session = Depends(get_session)):
-    db_model = session.get(CarModel, model_id)
+    # Только переданные поля — одним UPDATE ... RETURNING
+    db_model = update_returning(session, CarModel, model_id, model_data.dict(exclude_unset=True))
     if not db_model:
         raise HTTPException(status_code=404, detail="Модель не найдена")
-    
-    # Обновляем только переданные поля
-    model_dict = model_data.dict(exclude_unset=True)
-    for key, value in model_dict.items():
-        setattr(db_model, key, value)
-        
-    session.add(db_model)
     session.commit()
-    session.refresh(db_model)
+    invalidate(CarModel)
     return db_model
 
 
@@ -84,53 +140,44 @@ def update_car_model(model_id: int, model_data: CarModel, session: Session = Dep
 # ==========================================
 TAG_VEHICLES = "2. Автомобили"
 
-@app.get("/vehicles/", response_model=List[Vehicle], tags=[TAG_VEHICLES], summary="Список автомобилей")
-def get_vehicles(status: Optional[str] = None, session: Session = Depends(get_session)):
-    statement = select(Vehicle)
-    if status:
-        statement = statement.where(Vehicle.status == status)
-    return session.exec(statement).all()
+@app.get("/vehicles/", response_model=page_model(Vehicle), tags=[TAG_VEHICLES], summary="Список автомобилей")
+def get_vehicles(
+    response: Response,
+    page: PageParams = Depends(),
+    id: Optional[int] = None,
+    status: Optional[str] = None,
+    model_id: Optional[int] = None,
+    session: Session = Depends(get_session),
+):
+    return paginate(session, Vehicle, page, response, id=id, status=status, model_id=model_id)
 
 @app.post("/vehicles/", response_model=Vehicle, tags=[TAG_VEHICLES], summary="Добавить автомобиль")
 def create_vehicle(vehicle: Vehicle, session: Session = Depends(get_session)):
-    session.add(vehicle)
+    vehicle = insert_returning(session, Vehicle, vehicle)
     session.commit()
-    session.refresh(vehicle)
     return vehicle
 
 @app.delete("/vehicles/{vehicle_id}", tags=[TAG_VEHICLES], summary="Удалить автомобиль")
 def delete_vehicle(vehicle_id: int, session: Session = Depends(get_session)):
-    vehicle = session.get(Vehicle, vehicle_id)
-    if not vehicle:
-        raise HTTPException(status_code=404, detail="Автомобиль не найден")
-    
-    has_orders = session.exec(select(RentalOrder).where(RentalOrder.vehicle_id == vehicle_id)).first()
-    has_maintenance = session.exec(select(Maintenance).where(Maintenance.vehicle_id == vehicle_id)).first()
-    has_insurance = session.exec(select(InsurancePolicy).where(InsurancePolicy.vehicle_id == vehicle_id)).first()
-
-    if has_orders or has_maintenance or has_insurance:
+    # Заказы, ремонты и страховки проверяются одним запросом с EXISTS
+    if find_dependents(session, Vehicle, vehicle_id):
         raise HTTPException(
             status_code=400, 
             detail="Нельзя удалить авто: существуют связанные заказы, записи о ремонте или страховки."
         )
 
-    session.delete(vehicle)
+    if not delete_returning(session, Vehicle, vehicle_id):
+        raise HTTPException(status_code=404, detail="Автомобиль не найден")
     session.commit()
     return {"ok": True}
 
 @app.put("/vehicles/{vehicle_id}", response_model=Vehicle, tags=[TAG_VEHICLES], summary="Изменить данные авто")
 def update_vehicle(vehicle_id: int, vehicle_data: Vehicle, session: Session = Depends(get_session)):
-    db_vehicle = session.get(Vehicle, vehicle_id)
+    # Только переданные поля — одним UPDATE ... RETURNING
+    db_vehicle = update_returning(session, Vehicle, vehicle_id, vehicle_data.dict(exclude_unset=True))
     if not db_vehicle:
         raise HTTPException(status_code=404, detail="Авто не найдено")
-        
-    vehicle_dict = vehicle_data.dict(exclude_unset=True)
-    for key, value in vehicle_dict.items():
-        setattr(db_vehicle, key, value)
-        
-    session.add(db_vehicle)
     session.commit()
-    session.refresh(db_vehicle)
     return db_vehicle
 
 
@@ -139,44 +186,40 @@ def update_vehicle(vehicle_id: int, vehicle_data: Vehicle, session: Session = De
 # ==========================================
 TAG_CLIENTS = "3. Клиенты"
 
-@app.get("/clients/", response_model=List[Client], tags=[TAG_CLIENTS], summary="Список клиентов")
-def get_clients(session: Session = Depends(get_session)):
-    return session.exec(select(Client)).all()
+@app.get("/clients/", response_model=page_model(Client), tags=[TAG_CLIENTS], summary="Список клиентов")
+def get_clients(
+    response: Response,
+    page: PageParams = Depends(),
+    id: Optional[int] = None,
+    is_blacklisted: Optional[bool] = None,
+    session: Session = Depends(get_session),
+):
+    return paginate(session, Client, page, response, id=id, is_blacklisted=is_blacklisted)
 
 @app.post("/clients/", response_model=Client, tags=[TAG_CLIENTS], summary="Регистрация клиента")
 def create_client(client: Client, session: Session = Depends(get_session)):
-    session.add(client)
+    client = insert_returning(session, Client, client)
     session.commit()
-    session.refresh(client)
     return client
 
 @app.delete("/clients/{client_id}", tags=[TAG_CLIENTS], summary="Удалить клиента")
 def delete_client(client_id: int, session: Session = Depends(get_session)):
-    client = session.get(Client, client_id)
-    if not client:
-        raise HTTPException(status_code=404, detail="Клиент не найден")
-    
-    if session.exec(select(RentalOrder).where(RentalOrder.client_id == client_id)).first():
+    if find_dependents(session, Client, client_id):
         raise HTTPException(status_code=400, detail="Нельзя удалить клиента: у него есть история заказов.")
 
-    session.delete(client)
+    if not delete_returning(session, Client, client_id):
+        raise HTTPException(status_code=404, detail="Клиент не найден")
     session.commit()
     return {"ok": True}
 
 
 @app.put("/clients/{client_id}", response_model=Client, tags=[TAG_CLIENTS], summary="Изменить данные клиента")
 def update_client(client_id: int, client_data: Client, session: Session = Depends(get_session)):
-    db_client = session.get(Client, client_id)
+    # Только переданные поля — одним UPDATE ... RETURNING
+    db_client = update_returning(session, Client, client_id, client_data.dict(exclude_unset=True))
     if not db_client:
         raise HTTPException(status_code=404, detail="Клиент не найден")
-        
-    client_dict = client_data.dict(exclude_unset=True)
-    for key, value in client_dict.items():
-        setattr(db_client, key, value)
-        
-    session.add(db_client)
     session.commit()
-    session.refresh(db_client)
     return db_client
 
 # ==========================================
@@ -184,44 +227,42 @@ def update_client(client_id: int, client_data: Client, session: Session = Depend
 # ==========================================
 TAG_EMPLOYEES = "4. Сотрудники"
 
-@app.get("/employees/", response_model=List[Employee], tags=[TAG_EMPLOYEES], summary="Список сотрудников")
-def get_employees(session: Session = Depends(get_session)):
-    return session.exec(select(Employee)).all()
+@app.get("/employees/", response_model=page_model(Employee), tags=[TAG_EMPLOYEES], summary="Список сотрудников")
+def get_employees(
+    request: Request,
+    page: PageParams = Depends(),
+    status: Optional[str] = None,
+    session: Session = Depends(get_session),
+):
+    return cached_list(request, Employee, lambda response: paginate(session, Employee, page, response, status=status))
 
 @app.post("/employees/", response_model=Employee, tags=[TAG_EMPLOYEES], summary="Добавить сотрудника")
 def create_employee(emp: Employee, session: Session = Depends(get_session)):
-    session.add(emp)
+    emp = insert_returning(session, Employee, emp)
     session.commit()
-    session.refresh(emp)
+    invalidate(Employee)
     return emp
 
 @app.delete("/employees/{emp_id}", tags=[TAG_EMPLOYEES], summary="Уволить сотрудника")
 def delete_employee(emp_id: int, session: Session = Depends(get_session)):
-    emp = session.get(Employee, emp_id)
-    if not emp:
-        raise HTTPException(status_code=404, detail="Сотрудник не найден")
-    
-    if session.exec(select(RentalOrder).where(RentalOrder.employee_id == emp_id)).first():
+    if find_dependents(session, Employee, emp_id):
         raise HTTPException(status_code=400, detail="Нельзя удалить сотрудника: на него оформлены заказы.")
 
-    session.delete(emp)
+    if not delete_returning(session, Employee, emp_id):
+        raise HTTPException(status_code=404, detail="Сотрудник не найден")
     session.commit()
+    invalidate(Employee)
     return {"ok": True}
 
 
 @app.put("/employees/{emp_id}", response_model=Employee, tags=[TAG_EMPLOYEES], summary="Изменить данные сотрудника")
 def update_employee(emp_id: int, emp_data: Employee, session: Session = Depends(get_session)):
-    db_emp = session.get(Employee, emp_id)
+    # Только переданные поля — одним UPDATE ... RETURNING
+    db_emp = update_returning(session, Employee, emp_id, emp_data.dict(exclude_unset=True))
     if not db_emp:
         raise HTTPException(status_code=404, detail="Сотрудник не найден")
-        
-    emp_dict = emp_data.dict(exclude_unset=True)
-    for key, value in emp_dict.items():
-        setattr(db_emp, key, value)
-        
-    session.add(db_emp)
     session.commit()
-    session.refresh(db_emp)
+    invalidate(Employee)
     return db_emp
 
 # ==========================================
@@ -229,68 +270,71 @@ def update_employee(emp_id: int, emp_data: Employee, session: Session = Depends(
 # ==========================================
 TAG_ORDERS = "5. Заказы"
 
-@app.get("/orders/", response_model=List[RentalOrder], tags=[TAG_ORDERS], summary="Все заказы")
-def get_orders(session: Session = Depends(get_session)):
-    return session.exec(select(RentalOrder)).all()
+@app.get("/orders/", response_model=page_model(RentalOrder), tags=[TAG_ORDERS], summary="Все заказы")
+def get_orders(
+    response: Response,
+    page: PageParams = Depends(),
+    id: Optional[int] = None,
+    order_status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    client_id: Optional[int] = None,
+    vehicle_id: Optional[int] = None,
+    employee_id: Optional[int] = None,
+    start_from: Optional[datetime] = None,
+    start_to: Optional[datetime] = None,
+    session: Session = Depends(get_session),
+):
+    return paginate(
+        session, RentalOrder, page, response,
+        id=id, order_status=order_status, payment_status=payment_status,
+        client_id=client_id, vehicle_id=vehicle_id, employee_id=employee_id,
+        start_from=start_from, start_to=start_to,
+    )
 
 @app.post("/orders/", response_model=RentalOrder, tags=[TAG_ORDERS], summary="Создать заказ")
 def create_order(order: RentalOrder, session: Session = Depends(get_session)):
-    # Проверка доступности машины
-    vehicle = session.get(Vehicle, order.vehicle_id)
-    if not vehicle or vehicle.status != "Available":
-        raise HTTPException(status_code=400, detail="Машина не найдена или занята")
-    
-    # Меняем статус машины
-    vehicle.status = "Rented"
-    session.add(vehicle)
-    
-    session.add(order)
-    session.commit()
-    session.refresh(order)
+    try:
+        # Проверка доступности машины на весь срок заказа, смена её статуса и INSERT ... RETURNING
+        order = insert_order(session, order)
+        session.commit()
+    except IntegrityError as e:
+        # Ограничение EXCLUDE в PostgreSQL — последний рубеж против пересечения бронирований;
+        # остальные нарушения (FK, NOT NULL) — 400 с причиной
+        session.rollback()
+        raise integrity_error(e)
     return order
 
 @app.delete("/orders/{order_id}", tags=[TAG_ORDERS], summary="Удалить заказ")
 def delete_order(order_id: int, session: Session = Depends(get_session)):
-    order = session.get(RentalOrder, order_id)
-    if not order:
-        raise HTTPException(status_code=404, detail="Заказ не найден")
-    
-    # Проверяем, есть ли связанные финансовые записи
-    has_payments = session.exec(select(Payment).where(Payment.order_id == order_id)).first()
-    has_fines = session.exec(select(Fine).where(Fine.order_id == order_id)).first()
-    has_reviews = session.exec(select(Review).where(Review.order_id == order_id)).first()
-
-    if has_payments or has_fines or has_reviews:
+    # Проверяем, есть ли связанные финансовые записи (один запрос с EXISTS)
+    if find_dependents(session, RentalOrder, order_id):
         raise HTTPException(
             status_code=400, 
             detail="Нельзя удалить заказ, так как по нему есть платежи, штрафы или отзывы. Удалите их сначала."
         )
-    
-    # Если заказ активен, нужно освободить машину перед удалением (опционально)
-    if order.order_status == "Open":
-        vehicle = session.get(Vehicle, order.vehicle_id)
-        if vehicle and vehicle.status == "Rented":
-            vehicle.status = "Available"
-            session.add(vehicle)
-
-    session.delete(order)
+
+    order = delete_returning(session, RentalOrder, order_id)
+    if not order:
+        # Архивный заказ (archive.py) не удаляется — 409
+        raise archived_error(session, RentalOrder, order_id, "Заказ не найден")
+
+    # Если заказ был активен, освобождаем машину
+    release_vehicle(session, order)
     session.commit()
     return {"ok": True}
 
 
 @app.put("/orders/{order_id}", response_model=RentalOrder, tags=[TAG_ORDERS], summary="Редактировать заказ")
 def update_order(order_id: int, order_data: RentalOrder, session: Session = Depends(get_session)):
-    db_order = session.get(RentalOrder, order_id)
-    if not db_order:
-        raise HTTPException(status_code=404, detail="Заказ не найден")
-        
-    order_dict = order_data.dict(exclude_unset=True)
-    for key, value in order_dict.items():
-        setattr(db_order, key, value)
-        
-    session.add(db_order)
-    session.commit()
-    session.refresh(db_order)
+    try:
+        # Заказ читается из БД только при смене машины или сроков — для проверки пересечений
+        db_order = patch_order(session, order_id, order_data.dict(exclude_unset=True))
+        if not db_order:
+            raise archived_error(session, RentalOrder, order_id, "Заказ не найден")
+        session.commit()
+    except IntegrityError as e:
+        session.rollback()
+        raise integrity_error(e)
     return db_order
 
 # ==========================================
@@ -298,39 +342,37 @@ def update_order(order_id: int, order_data: RentalOrder, session: Session = Depe
 # ==========================================
 TAG_MAINTENANCE = "6. Обслуживание"
 
-@app.get("/maintenance/", response_model=List[Maintenance], tags=[TAG_MAINTENANCE], summary="История ремонтов")
-def get_maintenance(session: Session = Depends(get_session)):
-    return session.exec(select(Maintenance)).all()
+@app.get("/maintenance/", response_model=page_model(Maintenance), tags=[TAG_MAINTENANCE], summary="История ремонтов")
+def get_maintenance(
+    response: Response,
+    page: PageParams = Depends(),
+    vehicle_id: Optional[int] = None,
+    start_from: Optional[date] = None,
+    start_to: Optional[date] = None,
+    session: Session = Depends(get_session),
+):
+    return paginate(session, Maintenance, page, response, vehicle_id=vehicle_id, start_from=start_from, start_to=start_to)
 
 @app.post("/maintenance/", response_model=Maintenance, tags=[TAG_MAINTENANCE], summary="Запись на ремонт")
 def create_maintenance(record: Maintenance, session: Session = Depends(get_session)):
-    session.add(record)
+    record = insert_returning(session, Maintenance, record)
     session.commit()
-    session.refresh(record)
     return record
 
 @app.delete("/maintenance/{record_id}", tags=[TAG_MAINTENANCE], summary="Удалить запись о ремонте")
 def delete_maintenance(record_id: int, session: Session = Depends(get_session)):
-    rec = session.get(Maintenance, record_id)
-    if not rec:
+    if not delete_returning(session, Maintenance, record_id):
         raise HTTPException(status_code=404, detail="Запись не найдена")
-    session.delete(rec)
     session.commit()
     return {"ok": True}
 
 @app.put("/maintenance/{record_id}", response_model=Maintenance, tags=[TAG_MAINTENANCE], summary="Изменить запись ремонта")
 def update_maintenance(record_id: int, rec_data: Maintenance, session: Session = Depends(get_session)):
-    db_rec = session.get(Maintenance, record_id)
+    # Только переданные поля — одним UPDATE ... RETURNING
+    db_rec = update_returning(session, Maintenance, record_id, rec_data.dict(exclude_unset=True))
     if not db_rec:
         raise HTTPException(status_code=404, detail="Запись не найдена")
-        
-    rec_dict = rec_data.dict(exclude_unset=True)
-    for key, value in rec_dict.items():
-        setattr(db_rec, key, value)
-        
-    session.add(db_rec)
     session.commit()
-    session.refresh(db_rec)
     return db_rec
 
 # ==========================================
@@ -338,39 +380,38 @@ def update_maintenance(record_id: int, rec_data: Maintenance, session: Session =
 # ==========================================
 TAG_FINES = "7. Штрафы"
 
-@app.get("/fines/", response_model=List[Fine], tags=[TAG_FINES], summary="Список штрафов")
-def get_fines(session: Session = Depends(get_session)):
-    return session.exec(select(Fine)).all()
+@app.get("/fines/", response_model=page_model(Fine), tags=[TAG_FINES], summary="Список штрафов")
+def get_fines(
+    response: Response,
+    page: PageParams = Depends(),
+    order_id: Optional[int] = None,
+    is_paid: Optional[bool] = None,
+    issue_from: Optional[date] = None,
+    issue_to: Optional[date] = None,
+    session: Session = Depends(get_session),
+):
+    return paginate(session, Fine, page, response, order_id=order_id, is_paid=is_paid, issue_from=issue_from, issue_to=issue_to)
 
 @app.post("/fines/", response_model=Fine, tags=[TAG_FINES], summary="Выписать штраф")
 def create_fine(fine: Fine, session: Session = Depends(get_session)):
-    session.add(fine)
+    fine = insert_returning(session, Fine, fine)
     session.commit()
-    session.refresh(fine)
     return fine
 
 @app.delete("/fines/{fine_id}", tags=[TAG_FINES], summary="Удалить штраф")
 def delete_fine(fine_id: int, session: Session = Depends(get_session)):
-    fine = session.get(Fine, fine_id)
-    if not fine:
-        raise HTTPException(status_code=404, detail="Штраф не найден")
-    session.delete(fine)
+    if not delete_returning(session, Fine, fine_id):
+        raise archived_error(session, Fine, fine_id, "Штраф не найден")
     session.commit()
     return {"ok": True}
 
 @app.put("/fines/{fine_id}", response_model=Fine, tags=[TAG_FINES], summary="Изменить штраф")
 def update_fine(fine_id: int, fine_data: Fine, session: Session = Depends(get_session)):
-    db_fine = session.get(Fine, fine_id)
+    # Только переданные поля — одним UPDATE ... RETURNING
+    db_fine = update_returning(session, Fine, fine_id, fine_data.dict(exclude_unset=True))
     if not db_fine:
-        raise HTTPException(status_code=404, detail="Штраф не найден")
-        
-    fine_dict = fine_data.dict(exclude_unset=True)
-    for key, value in fine_dict.items():
-        setattr(db_fine, key, value)
-        
-    session.add(db_fine)
+        raise archived_error(session, Fine, fine_id, "Штраф не найден")
     session.commit()
-    session.refresh(db_fine)
     return db_fine
 
 # ==========================================
@@ -378,39 +419,43 @@ def update_fine(fine_id: int, fine_data: Fine, session: Session = Depends(get_se
 # ==========================================
 TAG_PAYMENTS = "8. Платежи"
 
-@app.get("/payments/", response_model=List[Payment], tags=[TAG_PAYMENTS], summary="История транзакций")
-def get_payments(session: Session = Depends(get_session)):
-    return session.exec(select(Payment)).all()
+@app.get("/payments/", response_model=page_model(Payment), tags=[TAG_PAYMENTS], summary="История транзакций")
+def get_payments(
+    response: Response,
+    page: PageParams = Depends(),
+    order_id: Optional[int] = None,
+    payment_type: Optional[str] = None,
+    method: Optional[str] = None,
+    payment_from: Optional[datetime] = None,
+    payment_to: Optional[datetime] = None,
+    session: Session = Depends(get_session),
+):
+    return paginate(
+        session, Payment, page, response,
+        order_id=order_id, payment_type=payment_type, method=method,
+        payment_from=payment_from, payment_to=payment_to,
+    )
 
 @app.post("/payments/", response_model=Payment, tags=[TAG_PAYMENTS], summary="Провести платеж")
 def create_payment(payment: Payment, session: Session = Depends(get_session)):
-    session.add(payment)
+    payment = insert_returning(session, Payment, payment)
     session.commit()
-    session.refresh(payment)
     return payment
 
 @app.delete("/payments/{payment_id}", tags=[TAG_PAYMENTS], summary="Отменить платеж")
 def delete_payment(payment_id: int, session: Session = Depends(get_session)):
-    payment = session.get(Payment, payment_id)
-    if not payment:
-        raise HTTPException(status_code=404, detail="Платеж не найден")
-    session.delete(payment)
+    if not delete_returning(session, Payment, payment_id):
+        raise archived_error(session, Payment, payment_id, "Платеж не найден")
     session.commit()
     return {"ok": True}
 
 @app.put("/payments/{payment_id}", response_model=Payment, tags=[TAG_PAYMENTS], summary="Изменить платеж")
 def update_payment(payment_id: int, payment_data: Payment, session: Session = Depends(get_session)):
-    db_payment = session.get(Payment, payment_id)
+    # Только переданные поля — одним UPDATE ... RETURNING
+    db_payment = update_returning(session, Payment, payment_id, payment_data.dict(exclude_unset=True))
     if not db_payment:
-        raise HTTPException(status_code=404, detail="Платеж не найден")
-        
-    payment_dict = payment_data.dict(exclude_unset=True)
-    for key, value in payment_dict.items():
-        setattr(db_payment, key, value)
-        
-    session.add(db_payment)
+        raise archived_error(session, Payment, payment_id, "Платеж не найден")
     session.commit()
-    session.refresh(db_payment)
     return db_payment
 
 # ==========================================
@@ -418,39 +463,35 @@ def update_payment(payment_id: int, payment_data: Payment, session: Session = De
 # ==========================================
 TAG_INSURANCE = "9. Страховка"
 
-@app.get("/insurance/", response_model=List[InsurancePolicy], tags=[TAG_INSURANCE], summary="Все полисы")
-def get_insurance(session: Session = Depends(get_session)):
-    return session.exec(select(InsurancePolicy)).all()
+@app.get("/insurance/", response_model=page_model(InsurancePolicy), tags=[TAG_INSURANCE], summary="Все полисы")
+def get_insurance(
+    response: Response,
+    page: PageParams = Depends(),
+    vehicle_id: Optional[int] = None,
+    session: Session = Depends(get_session),
+):
+    return paginate(session, InsurancePolicy, page, response, vehicle_id=vehicle_id)
 
 @app.post("/insurance/", response_model=InsurancePolicy, tags=[TAG_INSURANCE], summary="Добавить страховку")
 def create_insurance(policy: InsurancePolicy, session: Session = Depends(get_session)):
-    session.add(policy)
+    policy = insert_returning(session, InsurancePolicy, policy)
     session.commit()
-    session.refresh(policy)
     return policy
 
 @app.delete("/insurance/{policy_id}", tags=[TAG_INSURANCE], summary="Удалить полис")
 def delete_insurance(policy_id: int, session: Session = Depends(get_session)):
-    policy = session.get(InsurancePolicy, policy_id)
-    if not policy:
+    if not delete_returning(session, InsurancePolicy, policy_id):
         raise HTTPException(status_code=404, detail="Полис не найден")
-    session.delete(policy)
     session.commit()
     return {"ok": True}
 
 @app.put("/insurance/{policy_id}", response_model=InsurancePolicy, tags=[TAG_INSURANCE], summary="Изменить полис")
 def update_insurance(policy_id: int, policy_data: InsurancePolicy, session: Session = Depends(get_session)):
-    db_policy = session.get(InsurancePolicy, policy_id)
+    # Только переданные поля — одним UPDATE ... RETURNING
+    db_policy = update_returning(session, InsurancePolicy, policy_id, policy_data.dict(exclude_unset=True))
     if not db_policy:
         raise HTTPException(status_code=404, detail="Полис не найден")
-        
-    policy_dict = policy_data.dict(exclude_unset=True)
-    for key, value in policy_dict.items():
-        setattr(db_policy, key, value)
-        
-    session.add(db_policy)
     session.commit()
-    session.refresh(db_policy)
     return db_policy
 
 # ==========================================
@@ -458,37 +499,270 @@ def update_insurance(policy_id: int, policy_data: InsurancePolicy, session: Sess
 # ==========================================
 TAG_REVIEWS = "10. Отзывы"
 
-@app.get("/reviews/", response_model=List[Review], tags=[TAG_REVIEWS], summary="Все отзывы")
-def get_reviews(session: Session = Depends(get_session)):
-    return session.exec(select(Review)).all()
+@app.get("/reviews/", response_model=page_model(Review), tags=[TAG_REVIEWS], summary="Все отзывы")
+def get_reviews(
+    response: Response,
+    page: PageParams = Depends(),
+    order_id: Optional[int] = None,
+    session: Session = Depends(get_session),
+):
+    return paginate(session, Review, page, response, order_id=order_id)
 
 @app.post("/reviews/", response_model=Review, tags=[TAG_REVIEWS], summary="Оставить отзыв")
 def create_review(review: Review, session: Session = Depends(get_session)):
-    session.add(review)
+    review = insert_returning(session, Review, review)
     session.commit()
-    session.refresh(review)
     return review
 
 @app.delete("/reviews/{review_id}", tags=[TAG_REVIEWS], summary="Удалить отзыв")
 def delete_review(review_id: int, session: Session = Depends(get_session)):
-    review = session.get(Review, review_id)
-    if not review:
-        raise HTTPException(status_code=404, detail="Отзыв не найден")
-    session.delete(review)
+    if not delete_returning(session, Review, review_id):
+        raise archived_error(session, Review, review_id, "Отзыв не найден")
     session.commit()
     return {"ok": True}
 
 @app.put("/reviews/{review_id}", response_model=Review, tags=[TAG_REVIEWS], summary="Изменить отзыв")
 def update_review(review_id: int, review_data: Review, session: Session = Depends(get_session)):
-    db_review = session.get(Review, review_id)
+    # Только переданные поля — одним UPDATE ... RETURNING
+    db_review = update_returning(session, Review, review_id, review_data.dict(exclude_unset=True))
     if not db_review:
-        raise HTTPException(status_code=404, detail="Отзыв не найден")
-        
-    review_dict = review_data.dict(exclude_unset=True)
-    for key, value in review_dict.items():
-        setattr(db_review, key, value)
-        
-    session.add(db_review)
+        raise archived_error(session, Review, review_id, "Отзыв не найден")
     session.commit()
-    session.refresh(db_review)
     return db_review
+
+# ==========================================
+# 11. СВЯЗАННЫЕ ЗАПИСИ
+# ==========================================
+TAG_RELATED = "11. Связанные записи"
+
+@app.get("/{resource}/{item_id}/related", tags=[TAG_RELATED], summary="Запись и связанные с ней данные")
+def get_related(resource: str, item_id: int, session: Session = Depends(get_session)):
+    """Возвращает запись и её родителей/детей (например, платежи, штрафы, авто и клиента заказа) за 1-2 запроса."""
+    model = RESOURCES.get(resource)
+    if model is None:
+        raise HTTPException(status_code=404, detail="Ресурс не найден")
+
+    result = load_related(session, model, item_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Запись не найдена")
+    return result
+
+# ==========================================
+# 12. ДОСТУПНОСТЬ АВТОМОБИЛЕЙ
+# ==========================================
+TAG_AVAILABILITY = "12. Доступность"
+
+@app.get("/availability/", response_model=List[Vehicle], tags=[TAG_AVAILABILITY], summary="Свободные автомобили на период")
+def get_availability(
+    start: datetime,
+    end: datetime,
+    car_class: Optional[str] = None,
+    model_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=500),
+    session: Session = Depends(get_session),
+):
+    """Автомобили, у которых на интервале [start, end) нет заказов и ремонтов (например, Business с пятницы по понедельник)."""
+    if end <= start:
+        raise HTTPException(status_code=400, detail="Дата окончания должна быть позже даты начала")
+    return find_available(session, start, end, car_class=car_class, model_id=model_id, limit=limit)
+
+# ==========================================
+# 13. СЛУЖЕБНЫЕ ЭНДПОИНТЫ
+# ==========================================
+TAG_SERVICE = "13. Служебные"
+
+@app.get("/health/ready", tags=[TAG_SERVICE], summary="Готовность к приёму запросов")
+def get_ready(response: Response):
+    """200, если версия схемы БД не ниже последней миграции; иначе 503 — нужно выполнить python migrate.py."""
+    status = check_schema(engine) if not schema_status()["ready"] else schema_status()
+    if not status["ready"]:
+        response.status_code = 503
+    return status
+
+@app.get("/health/pool", tags=[TAG_SERVICE], summary="Состояние пула соединений")
+def get_pool_status():
+    """Занятые/свободные соединения, overflow, число и время ожиданий свободного соединения."""
+    result = {"sync": pool_status(engine)}
+    if async_engine is not None:
+        result["async"] = pool_status(async_engine.sync_engine)
+    return result
+
+@app.get("/metrics", tags=[TAG_SERVICE], summary="Метрики в формате Prometheus")
+def get_metrics():
+    """Задержки по маршрутам, число и время SQL-запросов, медленные запросы, N+1, пулы соединений, кэш."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _collect_pools():
+    engines = {"sync": engine}
+    if async_engine is not None:
+        engines["async"] = async_engine.sync_engine
+    lines = []
+    for name, help_text in (("checked_out", "Выданные соединения"), ("waits", "Ожидания свободного соединения"),
+                            ("timeouts", "Таймауты ожидания соединения")):
+        values = {label: pool_status(e).get(name) for label, e in engines.items()}
+        lines += gauge_lines(f"db_pool_{name}", help_text, {k: v for k, v in values.items() if v is not None}, "engine")
+    return lines
+
+def _collect_cache():
+    stats = response_cache.stats()
+    return (gauge_lines("app_cache_hits", "Попадания в кэш справочников", {None: stats["hits"]})
+            + gauge_lines("app_cache_misses", "Промахи кэша справочников", {None: stats["misses"]})
+            + gauge_lines("app_cache_entries", "Ответов в кэше справочников", {None: stats["entries"]}))
+
+def _collect_feed():
+    status = feed_status()
+    return (gauge_lines("app_feed_subscribers", "Подписчики ленты изменений", {None: status["subscribers"]})
+            + gauge_lines("app_feed_events", "События ленты изменений", {None: status["published"]})
+            + gauge_lines("app_feed_overflows", "Переполнения очередей медленных подписчиков", {None: status["overflows"]}))
+
+def _collect_jobs():
+    status = scheduler_status()
+    jobs = status["jobs"]
+    lines = []
+    for name, help_text in (("runs", "Запуски фоновой задачи"), ("failures", "Запуски фоновой задачи с ошибкой"),
+                            ("skipped", "Пропущенные запуски: задача в очереди или очередь заполнена"),
+                            ("last_seconds", "Длительность последнего запуска, с")):
+        values = {job: s[name] for job, s in jobs.items() if s[name] is not None}
+        lines += gauge_lines(f"app_job_{name}", help_text, values, "job")
+    overdue = overdue_status()
+    return (lines
+            + gauge_lines("app_job_queue", "Задач в очереди планировщика", {None: status["queued"]})
+            + gauge_lines("app_overdue_orders", "Просроченные заказы при последнем запуске", {None: overdue["overdue"]})
+            + gauge_lines("app_overdue_fines_created", "Созданные штрафы за просрочку", {None: overdue["created"]}))
+
+registry.collectors += [_collect_pools, _collect_cache, _collect_feed, _collect_jobs]
+
+@app.get("/health/cache", tags=[TAG_SERVICE], summary="Состояние кэша справочников")
+def get_cache_status():
+    """Число записей, попадания и промахи, вытеснения по размеру и TTL, сбросы после изменений."""
+    return response_cache.stats()
+
+@app.get("/health/feed", tags=[TAG_SERVICE], summary="Состояние ленты изменений")
+def get_feed_status():
+    """Источник событий (notify/local), соединение LISTEN, число подписчиков, события и переполнения."""
+    return feed_status()
+
+@app.get("/health/search", tags=[TAG_SERVICE], summary="Состояние индекса поиска")
+def get_search_status():
+    """Индекс поиска (trgm/ngram); для индекса в памяти — число записей, триграмм и время синхронизации."""
+    return search_status()
+
+@app.get("/health/pricing", tags=[TAG_SERVICE], summary="Состояние таблицы тарифов")
+def get_pricing_status():
+    """Расчёт через NumPy или Python, надбавка и скидки, число моделей и машин в памяти, время загрузки."""
+    return pricing_status()
+
+@app.get("/health/archive", tags=[TAG_SERVICE], summary="Состояние архивации заказов")
+def get_archive_status():
+    """Интервал фонового переноса, число запусков и перенесённых заказов, время последнего запуска."""
+    return archive_status()
+
+@app.get("/health/overdue", tags=[TAG_SERVICE], summary="Просроченные заказы и штрафы за просрочку")
+def get_overdue_status():
+    """Просроченных заказов при последнем запуске; созданные и увеличенные штрафы, заказы, отмеченные Partial."""
+    return overdue_status()
+
+@app.get("/health/jobs", tags=[TAG_SERVICE], summary="Состояние фоновых задач")
+def get_jobs_status():
+    """Режим планировщика, очередь; по каждой задаче — интервал, запуски, ошибки, пропуски и длительность последнего."""
+    return scheduler_status()
+
+@app.post("/jobs/{name}/run", status_code=202, tags=[TAG_SERVICE], summary="Запустить фоновую задачу")
+def run_job(name: str):
+    """Ставит задачу в очередь планировщика вне расписания."""
+    if name not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    if not scheduler.started:
+        raise HTTPException(status_code=409, detail="Планировщик в этом процессе не запущен (SCHEDULER=off)")
+    if not scheduler.submit(name):
+        raise HTTPException(status_code=409, detail="Задача уже в очереди или выполняется")
+    return {"queued": name}
+
+
+# ==========================================
+# 14. СТАТИСТИКА АВТОПАРКА
+# ==========================================
+TAG_STATS = "14. Статистика"
+
+@app.get("/stats/", tags=[TAG_STATS], summary="Сводка для панели автопарка")
+def get_fleet_stats(day: Optional[date] = None, session: Session = Depends(get_session)):
+    """Машины и заказы по статусам, неоплаченные штрафы, выручка за день (по умолчанию — сегодня)."""
+    return get_stats(session, day or date.today())
+
+@app.get("/stats/check", tags=[TAG_STATS], summary="Сверка счётчиков с данными")
+def check_fleet_stats(fix: bool = False, session: Session = Depends(get_session)):
+    """Полный пересчёт по таблицам и сравнение со счётчиками; fix=true перестраивает счётчики."""
+    return check_stats(session, fix)
+
+
+# ==========================================
+# 15. ФИНАНСОВАЯ ВЕДОМОСТЬ
+# ==========================================
+TAG_LEDGER = "15. Финансы"
+
+class LedgerFilters:
+    """Фильтры заказов для ведомости — те же, что у списка заказов."""
+
+    def __init__(
+        self,
+        id: Optional[int] = None,
+        order_status: Optional[str] = None,
+        payment_status: Optional[str] = None,
+        client_id: Optional[int] = None,
+        vehicle_id: Optional[int] = None,
+        employee_id: Optional[int] = None,
+        start_from: Optional[datetime] = None,
+        start_to: Optional[datetime] = None,
+    ):
+        self.values = dict(
+            id=id, order_status=order_status, payment_status=payment_status,
+            client_id=client_id, vehicle_id=vehicle_id, employee_id=employee_id,
+            start_from=start_from, start_to=start_to,
+        )
+
+@app.get("/ledger/orders", tags=[TAG_LEDGER], summary="Ведомость по заказам")
+def get_order_ledger(
+    response: Response,
+    page: PageParams = Depends(),
+    filters: LedgerFilters = Depends(),
+    session: Session = Depends(get_session),
+):
+    """Стоимость, платежи по типам, неоплаченные штрафы и долг по каждому заказу (постранично)."""
+    return order_ledger(session, page, filters.values, response)
+
+@app.get("/ledger/clients", tags=[TAG_LEDGER], summary="Ведомость по клиентам")
+def get_client_ledger(
+    response: Response,
+    page: PageParams = Depends(),
+    filters: LedgerFilters = Depends(),
+    session: Session = Depends(get_session),
+):
+    """Итоги по клиентам за выбранные заказы: число заказов, стоимость, оплачено, штрафы, долг."""
+    return client_ledger(session, page, filters.values, response)
+
+
+# ==========================================
+# 16. ПОИСК
+# ==========================================
+TAG_SEARCH = "16. Поиск"
+
+@app.get("/search/", tags=[TAG_SEARCH], summary="Поиск клиентов и автомобилей")
+def search_records(
+    q: str = Query(..., description="Фрагмент ФИО, телефона, номера прав, госномера или VIN"),
+    resources: Optional[str] = Query(None, description="clients,vehicles; без параметра — оба"),
+    limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT),
+    session: Session = Depends(get_session),
+):
+    """Записи, где запрос входит в поле или похож на него с опечаткой, — лучшие первыми (score от 0 до 1)."""
+    return search(session, q, resources, limit)
+
+
+# ==========================================
+# 17. РАСЧЁТ СТОИМОСТИ
+# ==========================================
+TAG_QUOTES = "17. Расчёт стоимости"
+
+@app.post("/quotes/batch", tags=[TAG_QUOTES], summary="Стоимость аренды для многих вариантов")
+def get_quotes(items: List[QuoteRequest], session: Session = Depends(get_session)):
+    """По каждому варианту (model_id или vehicle_id, start, end) — сутки, тариф, надбавка, скидка, итог и залог."""
+    return quote_batch(session, items)
@@ -0,0 +1,262 @@
+"""Метрики запросов к API и к БД: заголовок Server-Timing, /metrics в формате Prometheus,
+журнал медленных SQL-запросов и детектор N+1.
+
+- instrument(engine) вешает на движок SQLAlchemy события до/после выполнения запроса
+  (вызывается в database.py для синхронного и асинхронного движков);
+- MetricsMiddleware заводит на каждый HTTP-запрос счётчик SQL-запросов и времени БД
+  и по окончании обновляет гистограммы и счётчики по маршруту;
+- render_metrics() отдаёт накопленные значения в текстовом формате Prometheus.
+
+Настройки (переменные окружения):
+- SLOW_QUERY_MS       — SQL-запросы дольше этого пишутся в лог car_rental.sql (0 — выключено);
+  HTTP-запрос, у которого суммарное время БД больше порога, тоже пишется в лог — с самым долгим
+  из его SQL-запросов; длительность самого долгого запроса есть и в Server-Timing (db-slowest);
+- N_PLUS_ONE_THRESHOLD — сколько одинаковых запросов за один HTTP-запрос считать признаком N+1 (0 — выключено).
+"""
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import event
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+# Границы корзин гистограммы длительности запроса, сек
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger("car_rental.sql")
+
+_current = contextvars.ContextVar("request_db_stats", default=None)
+
+
+class RequestStats:
+    """SQL-запросы одного HTTP-запроса."""
+
+    def __init__(self, scope=None):
+        self.scope = scope
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.statements = Counter()
+
+    @property
+    def route(self) -> str:
+        # Маршрут становится известен после сопоставления пути, scope["route"] дописывает роутер
+        return _route(self.scope) if self.scope is not None else "-"
+
+    def record(self, statement: str, elapsed: float):
+        self.queries += 1
+        self.db_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time, self.slowest_statement = elapsed, statement
+        if N_PLUS_ONE_THRESHOLD:
+            self.statements[_fingerprint(statement)] += 1
+
+    def repeated(self) -> list:
+        """Запросы, повторившиеся не меньше N_PLUS_ONE_THRESHOLD раз."""
+        if not N_PLUS_ONE_THRESHOLD:
+            return []
+        return [(s, n) for s, n in self.statements.most_common() if n >= N_PLUS_ONE_THRESHOLD]
+
+
+def _fingerprint(statement: str) -> str:
+    # Параметры уже вынесены в плейсхолдеры; убираем различия в пробелах и списках IN (...)
+    statement = re.sub(r"\s+", " ", statement).strip()
+    return re.sub(r"\((?:\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)\s*,?)+\)", "(...)", statement)
+
+
+def current_stats():
+    return _current.get()
+
+
+# ---------- SQLAlchemy ----------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        registry.slow_queries.inc()
+        logger.warning(
+            "Медленный SQL-запрос: %.1f мс, маршрут %s: %s",
+            elapsed * 1000, stats.route if stats else "-", " ".join(statement.split())[:1000],
+        )
+
+
+def _handle_error(exception_context):
+    # Запрос завершился ошибкой — after_cursor_execute не вызовется, снимаем отметку времени
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument(engine):
+    """Подключает сбор метрик SQL к синхронному движку (для асинхронного — к async_engine.sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    return engine
+
+
+# ---------- Метрики Prometheus ----------
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class CounterMetric:
+    def __init__(self, name: str, help_text: str, label_names=()):
+        self.name, self.help, self.label_names = name, help_text, label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class HistogramMetric:
+    def __init__(self, name: str, help_text: str, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names, self.buckets = name, help_text, label_names, buckets
+        self._values = {}  # labels -> [счётчики по корзинам..., сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            data = self._values.get(labels)
+            if data is None:
+                data = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.label_names + ("le",)
+        with self._lock:
+            for labels, data in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, data):
+                    lines.append(f"{self.name}_bucket{_labels(names, labels + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {data[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {data[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {data[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        route = ("method", "route")
+        self.requests = CounterMetric("http_requests_total", "HTTP-запросы", route + ("status",))
+        self.latency = HistogramMetric("http_request_duration_seconds", "Длительность HTTP-запроса", route)
+        self.db_queries = HistogramMetric(
+            "db_queries_per_request", "SQL-запросов на один HTTP-запрос", route,
+            buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+        )
+        self.db_time = CounterMetric("db_time_seconds_total", "Суммарное время SQL-запросов", route)
+        self.slow_queries = CounterMetric("db_slow_queries_total", f"SQL-запросы дольше {SLOW_QUERY_MS:g} мс")
+        self.n_plus_one = CounterMetric("db_n_plus_one_total", "HTTP-запросы с повторяющимися SQL-запросами (N+1)", route)
+        self.collectors = []  # функции, возвращающие дополнительные строки (пул, кэш)
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.requests, self.latency, self.db_queries, self.db_time, self.slow_queries, self.n_plus_one):
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def gauge_lines(name: str, help_text: str, values: dict, label: str = None) -> list:
+    """Строки gauge-метрики: values — {значение метки: число} или {None: число} без метки."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for key, value in values.items():
+        lines.append(f"{name}{_labels((label,), (key,)) if label else ''} {value}")
+    return lines
+
+
+def render_metrics() -> str:
+    return registry.render()
+
+
+# ---------- ASGI ----------
+
+class MetricsMiddleware:
+    """Считает SQL-запросы и время каждого HTTP-запроса, добавляет заголовок Server-Timing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)  # обработчики в пуле потоков получают копию контекста с этим объектом
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total = (time.perf_counter() - started) * 1000
+                timing = (
+                    f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries", '
+                    f"db-slowest;dur={stats.slowest_time * 1000:.2f}, "
+                    f"app;dur={max(total - stats.db_time * 1000, 0):.2f}, total;dur={total:.2f}"
+                )
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            labels = (scope["method"], stats.route)
+            registry.requests.inc(*labels, str(status))
+            registry.latency.observe(time.perf_counter() - started, *labels)
+            registry.db_queries.observe(stats.queries, *labels)
+            registry.db_time.inc(*labels, amount=stats.db_time)
+            if SLOW_QUERY_MS and stats.db_time * 1000 >= SLOW_QUERY_MS:
+                logger.warning(
+                    "Медленный HTTP-запрос: %s %s, БД %.1f мс (SQL-запросов: %d), самый долгий %.1f мс: %s",
+                    *labels, stats.db_time * 1000, stats.queries, stats.slowest_time * 1000,
+                    " ".join(stats.slowest_statement.split())[:1000],
+                )
+            repeated = stats.repeated()
+            if repeated:
+                registry.n_plus_one.inc(*labels)
+                statement, count = repeated[0]
+                logger.warning("Возможен N+1: %s %s выполнил %d одинаковых запросов: %s", *labels, count, statement[:500])
+
+
+def _route(scope) -> str:
+    # Шаблон пути (/orders/{order_id}), а не сам путь — иначе метки разрастаются по числу id
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
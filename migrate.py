@@ -0,0 +1,234 @@
+"""Версии схемы БД: миграции из каталога migrations/ применяются отдельно от запуска приложения.
+
+    python migrate.py               # применить новые миграции
+    python migrate.py --status      # текущая и ожидаемая версия
+    python migrate.py --baseline 6  # БД уже приведена к версии 6 вручную (psql) — только отметить
+
+Номер файла NNN_*.sql — версия схемы; применённые версии записываются в таблицу schema_version.
+Пустая БД получает версию 0 — таблицы и индексы по models.py (create_all), — а затем все файлы
+по порядку, поэтому миграции пишутся повторяемыми (IF NOT EXISTS, CREATE OR REPLACE).
+Файлы рассчитаны на PostgreSQL: каждая команда выполняется отдельно в autocommit (так работают
+CREATE INDEX CONCURRENTLY), поэтому файл, прерванный на середине, при следующем запуске выполняется
+заново целиком. Весь запуск — чтение версии, файлы и их отметка — идёт под advisory-блокировкой:
+параллельный запуск ждёт её и затем видит уже применённые версии. В SQLite (тесты, бенчмарки)
+схему целиком задаёт версия 0, файлы только отмечаются применёнными.
+
+Приложение при старте схему не создаёт и не меняет: check_schema одним запросом сравнивает
+версию в БД с последним файлом, а GET /health/ready отвечает 503, пока миграции не применены.
+"""
+import argparse
+import logging
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import SQLModel
+
+import models  # noqa: F401 — регистрирует таблицы в SQLModel.metadata
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+VERSION_TABLE = "schema_version"
+
+# Ключ pg_advisory_lock: одновременно миграции применяет один процесс
+MIGRATION_LOCK_ID = 7_202_401
+
+logger = logging.getLogger("car_rental.migrate")
+
+
+class MigrationError(Exception):
+    pass
+
+
+def migration_files() -> list:
+    """[(версия, имя, путь)] по возрастанию версии."""
+    files = []
+    for path in MIGRATIONS_DIR.glob("*.sql"):
+        match = re.match(r"(\d+)_", path.name)
+        if match:
+            files.append((int(match.group(1)), path.stem, path))
+    return sorted(files)
+
+
+def latest_version() -> int:
+    files = migration_files()
+    return files[-1][0] if files else 0
+
+
+def split_statements(sql: str) -> list:
+    """Делит файл на команды по ';' вне строк, комментариев и тел $$...$$."""
+    statements, current, i = [], [], 0
+    quote = None  # "'" или метка $tag$
+    while i < len(sql):
+        if quote is None:
+            if sql.startswith("--", i):
+                end = sql.find("\n", i)
+                i = len(sql) if end < 0 else end
+                continue
+            char = sql[i]
+            dollar = re.match(r"\$[A-Za-z_]*\$", sql[i:]) if char == "$" else None
+            if dollar:
+                quote = dollar.group(0)
+                current.append(quote)
+                i += len(quote)
+                continue
+            if char == "'":
+                quote = "'"
+            elif char == ";":
+                statements.append("".join(current).strip())
+                current = []
+                i += 1
+                continue
+            current.append(char)
+            i += 1
+        else:
+            # i — сразу за открывающей кавычкой; '' внутри строки — две строки подряд, результат тот же
+            end = sql.find(quote, i)
+            end = len(sql) if end < 0 else end + len(quote)
+            current.append(sql[i:end])
+            i = end
+            quote = None
+    statements.append("".join(current).strip())
+    return [statement for statement in statements if statement]
+
+
+def applied_version(connection) -> Optional[int]:
+    """Версия схемы в БД; None — таблицы версий нет (БД создана не через migrate.py)."""
+    if not inspect(connection).has_table(VERSION_TABLE):
+        return None
+    return connection.execute(text(f"SELECT max(version) FROM {VERSION_TABLE}")).scalar()
+
+
+def _record(connection, version: int, name: str):
+    connection.execute(
+        text(f"INSERT INTO {VERSION_TABLE} (version, name, applied_at) VALUES (:version, :name, CURRENT_TIMESTAMP)"),
+        {"version": version, "name": name},
+    )
+
+
+def _create_version_table(connection):
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+        "version integer PRIMARY KEY, name varchar(200) NOT NULL, applied_at timestamp NOT NULL)"
+    ))
+
+
+def _run_file(engine, path: Path):
+    # Через соединение драйвера без параметров: знаки % в телах функций не считаются плейсхолдерами
+    raw = engine.raw_connection()
+    try:
+        raw.driver_connection.autocommit = True
+        with raw.driver_connection.cursor() as cursor:
+            for statement in split_statements(path.read_text(encoding="utf-8")):
+                cursor.execute(statement)
+    finally:
+        raw.close()
+
+
+@contextmanager
+def migration_lock(engine):
+    """pg_advisory_lock на весь запуск: второй migrate.py ждёт, пока первый применит и отметит файлы."""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        connection.commit()  # блокировка уровня сессии переживает commit; транзакцию открытой не держим
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+            connection.commit()
+
+
+def migrate(engine, baseline: Optional[int] = None) -> list:
+    """Применяет недостающие миграции; возвращает имена применённых (или отмеченных при baseline)."""
+    # Версия читается уже под блокировкой — после параллельного запуска она актуальна
+    with migration_lock(engine):
+        return _migrate(engine, baseline)
+
+
+def _migrate(engine, baseline: Optional[int]) -> list:
+    postgres = engine.dialect.name == "postgresql"
+    done = []
+    with engine.begin() as connection:
+        current = applied_version(connection)
+        if current is None:
+            if baseline is None and inspect(connection).has_table("rentalorder"):
+                raise MigrationError(
+                    "Таблицы уже есть, но версия схемы не записана: укажите, до какой миграции "
+                    "БД приведена вручную, например python migrate.py --baseline 6"
+                )
+            _create_version_table(connection)
+            SQLModel.metadata.create_all(connection)  # версия 0; существующие таблицы не трогает
+            _record(connection, 0, "models")
+            current = 0
+    for version, name, path in migration_files():
+        if version <= current:
+            continue
+        if baseline is not None and version > baseline:
+            break
+        if postgres and baseline is None:
+            logger.info("Миграция %s", name)
+            _run_file(engine, path)
+        with engine.begin() as connection:
+            _record(connection, version, name)
+        done.append(name)
+    return done
+
+
+# ---------- Проверка при старте приложения ----------
+
+_schema = {"version": None, "expected": None, "ready": False, "error": None}
+
+
+def check_schema(engine) -> dict:
+    """Одним запросом сравнивает версию схемы в БД с последней миграцией; результат — в schema_status()."""
+    expected = latest_version()
+    try:
+        with engine.connect() as connection:
+            version = connection.execute(text(f"SELECT max(version) FROM {VERSION_TABLE}")).scalar()
+        error = None if version is not None and version >= expected else (
+            f"Схема БД версии {version}, нужна {expected}: выполните python migrate.py"
+        )
+    except DBAPIError as e:
+        version, error = None, f"Версия схемы недоступна ({e.orig}): выполните python migrate.py"
+    _schema.update(version=version, expected=expected, ready=error is None, error=error)
+    if error:
+        logger.error(error)
+    return schema_status()
+
+
+def schema_status() -> dict:
+    return dict(_schema)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    parser.add_argument("--status", action="store_true", help="показать версию и не применять миграции")
+    parser.add_argument("--baseline", type=int, help="отметить миграции до этой версии применёнными, не выполняя их")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    from database import engine
+    if args.status:
+        with engine.connect() as connection:
+            current = applied_version(connection)
+        pending = [name for version, name, _ in migration_files() if current is None or version > current]
+        print(f"версия схемы: {current if current is not None else 'нет'}, последняя миграция: {latest_version()}")
+        for name in pending:
+            print(f"  ожидает: {name}")
+        return
+    try:
+        done = migrate(engine, args.baseline)
+    except MigrationError as e:
+        raise SystemExit(str(e))
+    for name in done:
+        print(f"{'отмечена' if args.baseline is not None else 'применена'}: {name}")
+    print(f"версия схемы: {latest_version() if args.baseline is None else args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+-- Индексы по внешним ключам и статусам.
+-- create_all() не добавляет индексы в уже существующие таблицы, поэтому на рабочей БД
+-- миграция применяется вручную:  psql -d car_rental_db -f migrations/001_fk_status_indexes.sql
+-- CONCURRENTLY не блокирует запись в таблицы, но не работает внутри транзакции (не запускайте с psql -1).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_vehicle_model_id ON vehicle (model_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_vehicle_status ON vehicle (status);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_rentalorder_client_id ON rentalorder (client_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_rentalorder_employee_id ON rentalorder (employee_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_rentalorder_order_status ON rentalorder (order_status);
+-- Покрывает и поиск по vehicle_id (левый префикс), отдельный индекс по vehicle_id не нужен
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_rentalorder_vehicle_id_order_status ON rentalorder (vehicle_id, order_status);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_maintenance_vehicle_id ON maintenance (vehicle_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_insurancepolicy_vehicle_id ON insurancepolicy (vehicle_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_fine_order_id ON fine (order_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_payment_order_id ON payment (order_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_review_order_id ON review (order_id);
+
+ANALYZE vehicle, rentalorder, maintenance, insurancepolicy, fine, payment, review;
@@ -0,0 +1,36 @@
+-- Интервальные индексы для поиска свободных авто и защита от пересечения бронирований.
+-- psql -d car_rental_db -f migrations/002_booking_intervals.sql
+--
+-- Перед применением убедитесь, что в данных нет пересечений, иначе ADD CONSTRAINT завершится ошибкой:
+--   SELECT a.id, b.id FROM rentalorder a JOIN rentalorder b
+--     ON a.vehicle_id = b.vehicle_id AND a.id < b.id
+--    AND tsrange(a.start_date, COALESCE(a.end_date_actual, a.end_date_planned))
+--     && tsrange(b.start_date, COALESCE(b.end_date_actual, b.end_date_planned))
+--    WHERE a.order_status <> 'Cancelled' AND b.order_status <> 'Cancelled';
+
+-- btree_gist нужен, чтобы в одном GiST-индексе сочетать равенство по vehicle_id и пересечение диапазонов
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- Заказ занимает машину на [start_date, end_date_actual или end_date_planned).
+-- Ограничение строит GiST-индекс, который использует availability.order_overlap,
+-- и атомарно отклоняет пересекающуюся вставку даже при одновременных запросах.
+-- У ADD CONSTRAINT нет IF NOT EXISTS — повторный запуск файла пропускает уже созданное ограничение.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'rentalorder_vehicle_no_overlap') THEN
+        ALTER TABLE rentalorder
+            ADD CONSTRAINT rentalorder_vehicle_no_overlap
+            EXCLUDE USING gist (
+                vehicle_id WITH =,
+                tsrange(start_date, COALESCE(end_date_actual, end_date_planned)) WITH &&
+            )
+            WHERE (order_status <> 'Cancelled');
+    END IF;
+END;
+$$;
+
+-- Ремонт занимает машину на дни [start_date, end_date]; end_date = NULL — ремонт ещё идёт
+CREATE INDEX IF NOT EXISTS ix_maintenance_vehicle_period
+    ON maintenance USING gist (vehicle_id, daterange(start_date, end_date, '[]'));
+
+ANALYZE rentalorder, maintenance;
@@ -0,0 +1,124 @@
+-- Счётчики для панели /stats/, которые поддерживают триггеры в той же транзакции, что и изменение данных.
+-- psql -d car_rental_db -f migrations/003_fleet_stats.sql
+--
+-- fleet_counter(metric, key, value):
+--   vehicles_by_status / <статус>      — число машин
+--   orders_by_status   / <статус>      — число заказов
+--   unpaid_fines_count / ''            — число неоплаченных штрафов
+--   unpaid_fines_total / ''            — их сумма
+--   revenue_by_day     / YYYY-MM-DD    — сумма платежей с типом Income за день (stats.REVENUE_PAYMENT_TYPES)
+-- Триггеры срабатывают и для COPY (import_data.py, generate_data.py). TRUNCATE счётчики не обновляет —
+-- после него выполните SELECT fleet_stats_rebuild(); или GET /stats/check?fix=true.
+
+CREATE TABLE IF NOT EXISTS fleet_counter (
+    metric text NOT NULL,
+    key    text NOT NULL DEFAULT '',
+    value  numeric(16, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (metric, key)
+);
+
+CREATE OR REPLACE FUNCTION fleet_counter_add(p_metric text, p_key text, p_delta numeric) RETURNS void AS $$
+BEGIN
+    IF p_key IS NULL OR p_delta = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO fleet_counter (metric, key, value) VALUES (p_metric, p_key, p_delta)
+    ON CONFLICT (metric, key) DO UPDATE SET value = fleet_counter.value + EXCLUDED.value;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Машины по статусам
+CREATE OR REPLACE FUNCTION fleet_stats_vehicle() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM fleet_counter_add('vehicles_by_status', OLD.status, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM fleet_counter_add('vehicles_by_status', NEW.status, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fleet_stats_vehicle ON vehicle;
+CREATE TRIGGER fleet_stats_vehicle
+    AFTER INSERT OR DELETE OR UPDATE OF status ON vehicle
+    FOR EACH ROW EXECUTE FUNCTION fleet_stats_vehicle();
+
+-- Заказы по статусам
+CREATE OR REPLACE FUNCTION fleet_stats_order() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM fleet_counter_add('orders_by_status', OLD.order_status, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM fleet_counter_add('orders_by_status', NEW.order_status, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fleet_stats_order ON rentalorder;
+CREATE TRIGGER fleet_stats_order
+    AFTER INSERT OR DELETE OR UPDATE OF order_status ON rentalorder
+    FOR EACH ROW EXECUTE FUNCTION fleet_stats_order();
+
+-- Неоплаченные штрафы
+CREATE OR REPLACE FUNCTION fleet_stats_fine() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND NOT OLD.is_paid THEN
+        PERFORM fleet_counter_add('unpaid_fines_count', '', -1);
+        PERFORM fleet_counter_add('unpaid_fines_total', '', -OLD.amount);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NOT NEW.is_paid THEN
+        PERFORM fleet_counter_add('unpaid_fines_count', '', 1);
+        PERFORM fleet_counter_add('unpaid_fines_total', '', NEW.amount);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fleet_stats_fine ON fine;
+CREATE TRIGGER fleet_stats_fine
+    AFTER INSERT OR DELETE OR UPDATE OF is_paid, amount ON fine
+    FOR EACH ROW EXECUTE FUNCTION fleet_stats_fine();
+
+-- Выручка по дням
+CREATE OR REPLACE FUNCTION fleet_stats_payment() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.payment_type = 'Income' THEN
+        PERFORM fleet_counter_add('revenue_by_day', OLD.payment_date::date::text, -OLD.amount);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.payment_type = 'Income' THEN
+        PERFORM fleet_counter_add('revenue_by_day', NEW.payment_date::date::text, NEW.amount);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fleet_stats_payment ON payment;
+CREATE TRIGGER fleet_stats_payment
+    AFTER INSERT OR DELETE OR UPDATE OF payment_type, payment_date, amount ON payment
+    FOR EACH ROW EXECUTE FUNCTION fleet_stats_payment();
+
+-- Полный пересчёт. Блокирует запись в исходные таблицы на время пересчёта,
+-- чтобы счётчики совпали с данными на момент commit.
+CREATE OR REPLACE FUNCTION fleet_stats_rebuild() RETURNS void AS $$
+BEGIN
+    LOCK TABLE vehicle, rentalorder, fine, payment IN SHARE MODE;
+    DELETE FROM fleet_counter;
+    INSERT INTO fleet_counter (metric, key, value)
+        SELECT 'vehicles_by_status', status, count(*) FROM vehicle GROUP BY status;
+    INSERT INTO fleet_counter (metric, key, value)
+        SELECT 'orders_by_status', order_status, count(*) FROM rentalorder GROUP BY order_status;
+    INSERT INTO fleet_counter (metric, key, value)
+        SELECT 'unpaid_fines_count', '', count(*) FROM fine WHERE NOT is_paid;
+    INSERT INTO fleet_counter (metric, key, value)
+        SELECT 'unpaid_fines_total', '', COALESCE(sum(amount), 0) FROM fine WHERE NOT is_paid;
+    INSERT INTO fleet_counter (metric, key, value)
+        SELECT 'revenue_by_day', payment_date::date::text, sum(amount)
+        FROM payment WHERE payment_type = 'Income' GROUP BY payment_date::date;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT fleet_stats_rebuild();
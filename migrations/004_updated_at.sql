@@ -0,0 +1,30 @@
+-- Время последнего изменения записей для синхронизации списков по ?updated_since= (sync.py).
+-- psql -d car_rental_db -f migrations/004_updated_at.sql
+-- Таблицу надгробий tombstone создаёт миграция 007.
+--
+-- now() — не volatile-функция, поэтому ADD COLUMN ... DEFAULT не переписывает таблицу: у всех
+-- существующих строк updated_at будет временем миграции. Приложение пишет время в UTC,
+-- DEFAULT остаётся для вставок в обход API.
+-- Индексы строятся CONCURRENTLY — не запускайте файл с psql -1.
+
+ALTER TABLE carmodel        ADD COLUMN IF NOT EXISTS updated_at timestamp DEFAULT (now() AT TIME ZONE 'utc');
+ALTER TABLE vehicle         ADD COLUMN IF NOT EXISTS updated_at timestamp DEFAULT (now() AT TIME ZONE 'utc');
+ALTER TABLE client          ADD COLUMN IF NOT EXISTS updated_at timestamp DEFAULT (now() AT TIME ZONE 'utc');
+ALTER TABLE employee        ADD COLUMN IF NOT EXISTS updated_at timestamp DEFAULT (now() AT TIME ZONE 'utc');
+ALTER TABLE rentalorder     ADD COLUMN IF NOT EXISTS updated_at timestamp DEFAULT (now() AT TIME ZONE 'utc');
+ALTER TABLE maintenance     ADD COLUMN IF NOT EXISTS updated_at timestamp DEFAULT (now() AT TIME ZONE 'utc');
+ALTER TABLE fine            ADD COLUMN IF NOT EXISTS updated_at timestamp DEFAULT (now() AT TIME ZONE 'utc');
+ALTER TABLE payment         ADD COLUMN IF NOT EXISTS updated_at timestamp DEFAULT (now() AT TIME ZONE 'utc');
+ALTER TABLE insurancepolicy ADD COLUMN IF NOT EXISTS updated_at timestamp DEFAULT (now() AT TIME ZONE 'utc');
+ALTER TABLE review          ADD COLUMN IF NOT EXISTS updated_at timestamp DEFAULT (now() AT TIME ZONE 'utc');
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_carmodel_updated_at ON carmodel (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_vehicle_updated_at ON vehicle (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_client_updated_at ON client (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_employee_updated_at ON employee (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_rentalorder_updated_at ON rentalorder (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_maintenance_updated_at ON maintenance (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_fine_updated_at ON fine (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_payment_updated_at ON payment (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_insurancepolicy_updated_at ON insurancepolicy (updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_review_updated_at ON review (updated_at);
@@ -0,0 +1,56 @@
+-- Уведомления для ленты изменений GET /feed/ (feed.py).
+-- psql -d car_rental_db -f migrations/005_change_feed.sql
+--
+-- После каждой команды INSERT/UPDATE/DELETE (и COPY) по таблицам API триггер уровня команды
+-- отправляет pg_notify('table_changes', {"table", "op", "ids"}). Строки собираются из переходных
+-- таблиц, поэтому на команду приходит одно уведомление, а не по одному на строку. Уведомление
+-- доставляется только после commit. Если id не помещаются в лимит pg_notify (8000 байт) —
+-- вместо ids передаётся count, и клиенты синхронизируются по ?updated_since=.
+-- При запуске приложение находит функцию feed_notify() и переключает ленту на LISTEN (FEED_SOURCE=auto).
+
+CREATE OR REPLACE FUNCTION feed_notify() RETURNS trigger AS $$
+DECLARE
+    ids bigint[];
+    payload text;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        SELECT array_agg(id ORDER BY id) INTO ids FROM old_rows;
+    ELSE
+        SELECT array_agg(id ORDER BY id) INTO ids FROM new_rows;
+    END IF;
+    IF ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+    payload := json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'ids', ids)::text;
+    IF octet_length(payload) > 7900 THEN
+        payload := json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'count', cardinality(ids))::text;
+    END IF;
+    PERFORM pg_notify('table_changes', payload);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Переходные таблицы допускаются только у триггера на одно событие — по три триггера на таблицу
+DO $$
+DECLARE
+    t text;
+BEGIN
+    FOREACH t IN ARRAY ARRAY[
+        'carmodel', 'vehicle', 'client', 'employee', 'rentalorder',
+        'maintenance', 'fine', 'payment', 'insurancepolicy', 'review'
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS feed_insert ON %I', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS feed_update ON %I', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS feed_delete ON %I', t);
+        EXECUTE format(
+            'CREATE TRIGGER feed_insert AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION feed_notify()', t);
+        EXECUTE format(
+            'CREATE TRIGGER feed_update AFTER UPDATE ON %I REFERENCING NEW TABLE AS new_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION feed_notify()', t);
+        EXECUTE format(
+            'CREATE TRIGGER feed_delete AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION feed_notify()', t);
+    END LOOP;
+END;
+$$;
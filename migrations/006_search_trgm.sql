@@ -0,0 +1,15 @@
+-- Индексы поиска GET /search/ (search.py) по клиентам и автомобилям.
+-- psql -d car_rental_db -f migrations/006_search_trgm.sql
+--
+-- GiST, а не GIN: gist_trgm_ops поддерживает и фильтр ILIKE '%...%' / <%, и сортировку по
+-- расстоянию <<-> — запрос с ORDER BY ... LIMIT читает из индекса только лучшие строки.
+-- При запуске приложение находит расширение pg_trgm и переключает поиск на него (SEARCH_BACKEND=auto).
+-- Индексы строятся CONCURRENTLY — не запускайте файл с psql -1.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_client_full_name_trgm ON client USING gist (full_name gist_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_client_phone_trgm ON client USING gist (phone gist_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_client_driver_license_num_trgm ON client USING gist (driver_license_num gist_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_vehicle_license_plate_trgm ON vehicle USING gist (license_plate gist_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_vehicle_vin_code_trgm ON vehicle USING gist (vin_code gist_trgm_ops);
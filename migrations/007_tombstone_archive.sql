@@ -0,0 +1,69 @@
+-- Таблицы, которые раньше создавал create_all() при запуске приложения: надгробия для
+-- синхронизации по ?updated_since= (sync.py) и архив закрытых заказов (archive.py).
+-- python migrate.py  (или psql -d car_rental_db -f migrations/007_tombstone_archive.sql)
+-- Совпадают с моделями Tombstone, RentalOrderArchive, PaymentArchive, FineArchive, ReviewArchive.
+
+CREATE TABLE IF NOT EXISTS tombstone (
+    id         SERIAL PRIMARY KEY,
+    table_name VARCHAR NOT NULL,
+    row_id     INTEGER NOT NULL,
+    deleted_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_tombstone_table_name_deleted_at ON tombstone (table_name, deleted_at);
+
+CREATE TABLE IF NOT EXISTS rentalorderarchive (
+    id               INTEGER PRIMARY KEY,
+    client_id        INTEGER NOT NULL REFERENCES client (id),
+    vehicle_id       INTEGER NOT NULL REFERENCES vehicle (id),
+    employee_id      INTEGER NOT NULL REFERENCES employee (id),
+    start_date       TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    end_date_planned TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    end_date_actual  TIMESTAMP WITHOUT TIME ZONE,
+    total_cost       NUMERIC(10, 2),
+    payment_status   VARCHAR NOT NULL,
+    deposit_returned BOOLEAN NOT NULL,
+    order_status     VARCHAR NOT NULL,
+    updated_at       TIMESTAMP WITHOUT TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_rentalorderarchive_client_id ON rentalorderarchive (client_id);
+CREATE INDEX IF NOT EXISTS ix_rentalorderarchive_vehicle_id ON rentalorderarchive (vehicle_id);
+CREATE INDEX IF NOT EXISTS ix_rentalorderarchive_employee_id ON rentalorderarchive (employee_id);
+CREATE INDEX IF NOT EXISTS ix_rentalorderarchive_start_date ON rentalorderarchive (start_date);
+CREATE INDEX IF NOT EXISTS ix_rentalorderarchive_updated_at ON rentalorderarchive (updated_at);
+
+CREATE TABLE IF NOT EXISTS paymentarchive (
+    id           INTEGER PRIMARY KEY,
+    order_id     INTEGER NOT NULL REFERENCES rentalorderarchive (id),
+    amount       NUMERIC(10, 2) NOT NULL,
+    payment_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    payment_type VARCHAR NOT NULL,
+    method       VARCHAR NOT NULL,
+    updated_at   TIMESTAMP WITHOUT TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_paymentarchive_order_id ON paymentarchive (order_id);
+CREATE INDEX IF NOT EXISTS ix_paymentarchive_payment_date ON paymentarchive (payment_date);
+CREATE INDEX IF NOT EXISTS ix_paymentarchive_updated_at ON paymentarchive (updated_at);
+
+CREATE TABLE IF NOT EXISTS finearchive (
+    id             INTEGER PRIMARY KEY,
+    order_id       INTEGER NOT NULL REFERENCES rentalorderarchive (id),
+    violation_type VARCHAR NOT NULL,
+    amount         NUMERIC(10, 2) NOT NULL,
+    is_paid        BOOLEAN NOT NULL,
+    issue_date     DATE NOT NULL,
+    updated_at     TIMESTAMP WITHOUT TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_finearchive_order_id ON finearchive (order_id);
+CREATE INDEX IF NOT EXISTS ix_finearchive_issue_date ON finearchive (issue_date);
+CREATE INDEX IF NOT EXISTS ix_finearchive_updated_at ON finearchive (updated_at);
+
+CREATE TABLE IF NOT EXISTS reviewarchive (
+    id            INTEGER PRIMARY KEY,
+    order_id      INTEGER NOT NULL REFERENCES rentalorderarchive (id),
+    car_rating    INTEGER NOT NULL,
+    client_rating INTEGER NOT NULL,
+    comment       VARCHAR,
+    updated_at    TIMESTAMP WITHOUT TIME ZONE
+);
+CREATE INDEX IF NOT EXISTS ix_reviewarchive_order_id ON reviewarchive (order_id);
+CREATE INDEX IF NOT EXISTS ix_reviewarchive_updated_at ON reviewarchive (updated_at);
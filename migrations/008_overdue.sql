@@ -0,0 +1,14 @@
+-- Индексы для штрафов за просрочку возврата (overdue.py).
+-- python migrate.py  (или psql -d car_rental_db -f migrations/008_overdue.sql)
+--
+-- ix_rentalorder_overdue — частичный индекс только по открытым невозвращённым заказам: задача
+-- просрочки находит их, не читая закрытые. Условие совпадает с запросом overdue.overdue_filter.
+-- ux_fine_late_return — не больше одного штрафа 'Late return' на заказ: повторный или параллельный
+-- запуск задачи не создаёт второй штраф. Если такие штрафы вводили вручную, проверьте дубли:
+--   SELECT order_id, count(*) FROM fine WHERE violation_type = 'Late return' GROUP BY order_id HAVING count(*) > 1;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_rentalorder_overdue ON rentalorder (end_date_planned, id)
+    WHERE order_status = 'Open' AND end_date_actual IS NULL;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_fine_late_return ON fine (order_id)
+    WHERE violation_type = 'Late return';
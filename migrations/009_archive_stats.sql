@@ -0,0 +1,88 @@
+-- Счётчики /stats/ (migrations/003_fleet_stats.sql) не меняются при переносе заказов в архив (archive.py).
+-- python migrate.py  (или psql -d car_rental_db -f migrations/009_archive_stats.sql)
+--
+-- Перенос удаляет заказы, платежи и штрафы из оперативных таблиц, но для сводки они остаются:
+-- archive_batch выставляет в своей транзакции car_rental.archiving = 'on', и триггеры счётчиков
+-- такие DELETE пропускают. Полный пересчёт fleet_stats_rebuild учитывает архивные таблицы.
+-- Пересчёт в конце файла исправляет счётчики, уменьшенные переносами до этой миграции.
+
+CREATE OR REPLACE FUNCTION fleet_archiving() RETURNS boolean AS $$
+    SELECT coalesce(current_setting('car_rental.archiving', true), '') = 'on';
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION fleet_stats_order() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' AND fleet_archiving() THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM fleet_counter_add('orders_by_status', OLD.order_status, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM fleet_counter_add('orders_by_status', NEW.order_status, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fleet_stats_fine() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' AND fleet_archiving() THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND NOT OLD.is_paid THEN
+        PERFORM fleet_counter_add('unpaid_fines_count', '', -1);
+        PERFORM fleet_counter_add('unpaid_fines_total', '', -OLD.amount);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NOT NEW.is_paid THEN
+        PERFORM fleet_counter_add('unpaid_fines_count', '', 1);
+        PERFORM fleet_counter_add('unpaid_fines_total', '', NEW.amount);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fleet_stats_payment() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' AND fleet_archiving() THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.payment_type = 'Income' THEN
+        PERFORM fleet_counter_add('revenue_by_day', OLD.payment_date::date::text, -OLD.amount);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.payment_type = 'Income' THEN
+        PERFORM fleet_counter_add('revenue_by_day', NEW.payment_date::date::text, NEW.amount);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Полный пересчёт — по оперативным таблицам вместе с архивом (как stats.recompute_counters)
+CREATE OR REPLACE FUNCTION fleet_stats_rebuild() RETURNS void AS $$
+BEGIN
+    LOCK TABLE vehicle, rentalorder, fine, payment, rentalorderarchive, finearchive, paymentarchive IN SHARE MODE;
+    DELETE FROM fleet_counter;
+    INSERT INTO fleet_counter (metric, key, value)
+        SELECT 'vehicles_by_status', status, count(*) FROM vehicle GROUP BY status;
+    INSERT INTO fleet_counter (metric, key, value)
+        SELECT 'orders_by_status', order_status, count(*)
+        FROM (SELECT order_status FROM rentalorder UNION ALL SELECT order_status FROM rentalorderarchive) o
+        GROUP BY order_status;
+    INSERT INTO fleet_counter (metric, key, value)
+        SELECT 'unpaid_fines_count', '', count(*)
+        FROM (SELECT amount FROM fine WHERE NOT is_paid UNION ALL SELECT amount FROM finearchive WHERE NOT is_paid) f;
+    INSERT INTO fleet_counter (metric, key, value)
+        SELECT 'unpaid_fines_total', '', COALESCE(sum(amount), 0)
+        FROM (SELECT amount FROM fine WHERE NOT is_paid UNION ALL SELECT amount FROM finearchive WHERE NOT is_paid) f;
+    INSERT INTO fleet_counter (metric, key, value)
+        SELECT 'revenue_by_day', payment_date::date::text, sum(amount)
+        FROM (
+            SELECT payment_date, amount FROM payment WHERE payment_type = 'Income'
+            UNION ALL
+            SELECT payment_date, amount FROM paymentarchive WHERE payment_type = 'Income'
+        ) p
+        GROUP BY payment_date::date;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT fleet_stats_rebuild();
@@ -0,0 +1,31 @@
+-- Лента изменений (migrations/005_change_feed.sql) не сообщает о переносе заказов в архив (archive.py).
+-- python migrate.py  (или psql -d car_rental_db -f migrations/010_archive_feed.sql)
+--
+-- Перенесённые строки остаются видны в списках (UNION ALL с архивом), поэтому DELETE переноса —
+-- не удаление для клиентов: при car_rental.archiving = 'on' (migrations/009_archive_stats.sql)
+-- триггер ленты уведомление не отправляет. Остальное тело — как в 005.
+
+CREATE OR REPLACE FUNCTION feed_notify() RETURNS trigger AS $$
+DECLARE
+    ids bigint[];
+    payload text;
+BEGIN
+    IF TG_OP = 'DELETE' AND fleet_archiving() THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        SELECT array_agg(id ORDER BY id) INTO ids FROM old_rows;
+    ELSE
+        SELECT array_agg(id ORDER BY id) INTO ids FROM new_rows;
+    END IF;
+    IF ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+    payload := json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'ids', ids)::text;
+    IF octet_length(payload) > 7900 THEN
+        payload := json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'count', cardinality(ids))::text;
+    END IF;
+    PERFORM pg_notify('table_changes', payload);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -1,8 +1,20 @@
 from typing import Optional, List
-from datetime import date, datetime
+from datetime import date, datetime, timezone
 from decimal import Decimal
+from sqlalchemy import Index, text
 from sqlmodel import SQLModel, Field, Relationship
 
+
+def utcnow() -> datetime:
+    """Время изменения записи: UTC без часового пояса (колонки timestamp without time zone)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def updated_at_field():
+    # Время последнего изменения — для ?updated_since= (sync.py). Ставит приложение: значение
+    # по умолчанию при создании, onupdate — при любом UPDATE через SQLAlchemy
+    return Field(default_factory=utcnow, index=True, sa_column_kwargs={"onupdate": utcnow})
+
 # 1. CarModel (Справочник моделей)
 class CarModel(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -11,18 +23,20 @@ class CarModel(SQLModel, table=True):
     car_class: str = Field(alias="class") # В Python 'class' зарезервировано, в БД будет 'class'
     daily_rate: Decimal = Field(max_digits=10, decimal_places=2)
     deposit_amount: Decimal = Field(max_digits=10, decimal_places=2)
+    updated_at: Optional[datetime] = updated_at_field()
     
     vehicles: List["Vehicle"] = Relationship(back_populates="model")
 
 # 2. Vehicle (Автомобиль)
 class Vehicle(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    model_id: int = Field(foreign_key="carmodel.id")
+    model_id: int = Field(foreign_key="carmodel.id", index=True)
     license_plate: str
     vin_code: str
     color: str
     current_mileage: int
-    status: str  # Available, Rented, Maintenance
+    status: str = Field(index=True)  # Available, Rented, Maintenance
+    updated_at: Optional[datetime] = updated_at_field()
     
     model: Optional[CarModel] = Relationship(back_populates="vehicles")
     orders: List["RentalOrder"] = Relationship(back_populates="vehicle")
@@ -39,6 +53,7 @@ class Client(SQLModel, table=True):
     birth_date: date
     rating: Decimal = Field(default=5.0, max_digits=3, decimal_places=2)
     is_blacklisted: bool = Field(default=False)
+    updated_at: Optional[datetime] = updated_at_field()
     
     orders: List["RentalOrder"] = Relationship(back_populates="client")
 
@@ -48,15 +63,25 @@ class Employee(SQLModel, table=True):
     full_name: str
     position: str
     status: str = Field(default="Active") # Active, Fired, Vacation, Sick, Maternity
+    updated_at: Optional[datetime] = updated_at_field()
     
     orders: List["RentalOrder"] = Relationship(back_populates="employee")
 
 # 5. RentalOrder (Заказ)
 class RentalOrder(SQLModel, table=True):
+    # (vehicle_id, order_status) покрывает и поиск заказов авто, и проверку "есть ли открытый заказ"
+    __table_args__ = (
+        Index("ix_rentalorder_vehicle_id_order_status", "vehicle_id", "order_status"),
+        # Только открытые невозвращённые заказы — поиск просроченных (overdue.py)
+        Index("ix_rentalorder_overdue", "end_date_planned", "id",
+              postgresql_where=text("order_status = 'Open' AND end_date_actual IS NULL"),
+              sqlite_where=text("order_status = 'Open' AND end_date_actual IS NULL")),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    client_id: int = Field(foreign_key="client.id")
+    client_id: int = Field(foreign_key="client.id", index=True)
     vehicle_id: int = Field(foreign_key="vehicle.id")
-    employee_id: int = Field(foreign_key="employee.id")
+    employee_id: int = Field(foreign_key="employee.id", index=True)
     
     start_date: datetime
     end_date_planned: datetime
@@ -65,7 +90,8 @@ class RentalOrder(SQLModel, table=True):
     total_cost: Optional[Decimal] = Field(default=None, max_digits=10, decimal_places=2)
     payment_status: str # Paid, Unpaid, Partial
     deposit_returned: bool = Field(default=False)
-    order_status: str # Open, Closed
+    order_status: str = Field(index=True) # Open, Closed
+    updated_at: Optional[datetime] = updated_at_field()
     
     # Связи
     client: Optional[Client] = Relationship(back_populates="orders")
@@ -78,55 +104,134 @@ class RentalOrder(SQLModel, table=True):
 # 6. Maintenance (Ремонт)
 class Maintenance(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    vehicle_id: int = Field(foreign_key="vehicle.id")
+    vehicle_id: int = Field(foreign_key="vehicle.id", index=True)
     start_date: date
     end_date: Optional[date] = None
     service_type: str
     cost: Decimal = Field(max_digits=10, decimal_places=2)
     description: Optional[str] = None
+    updated_at: Optional[datetime] = updated_at_field()
     
     vehicle: Optional[Vehicle] = Relationship(back_populates="maintenances")
 
 # 7. Fine (Штраф)
 class Fine(SQLModel, table=True):
+    # Штраф за просрочку возврата — не больше одного на заказ (overdue.py)
+    __table_args__ = (
+        Index("ux_fine_late_return", "order_id", unique=True,
+              postgresql_where=text("violation_type = 'Late return'"),
+              sqlite_where=text("violation_type = 'Late return'")),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    order_id: int = Field(foreign_key="rentalorder.id")
+    order_id: int = Field(foreign_key="rentalorder.id", index=True)
     violation_type: str
     amount: Decimal = Field(max_digits=10, decimal_places=2)
     is_paid: bool = Field(default=False)
     issue_date: date
+    updated_at: Optional[datetime] = updated_at_field()
 
     order: Optional[RentalOrder] = Relationship(back_populates="fines")
 
 # 8. Payment (Платеж)
 class Payment(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    order_id: int = Field(foreign_key="rentalorder.id")
+    order_id: int = Field(foreign_key="rentalorder.id", index=True)
     amount: Decimal = Field(max_digits=10, decimal_places=2)
     payment_date: datetime
     payment_type: str
     method: str 
+    updated_at: Optional[datetime] = updated_at_field()
     
     order: Optional[RentalOrder] = Relationship(back_populates="payments")
 
 # 9. InsurancePolicy (Страховка)
 class InsurancePolicy(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    vehicle_id: int = Field(foreign_key="vehicle.id")
+    vehicle_id: int = Field(foreign_key="vehicle.id", index=True)
     policy_number: str
     insurance_company: str
     start_date: date
     end_date: date
     cost: Decimal = Field(max_digits=10, decimal_places=2)
+    updated_at: Optional[datetime] = updated_at_field()
 
     vehicle: Optional[Vehicle] = Relationship(back_populates="insurance")
 
 # 10. Review (Отзыв)
 class Review(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    order_id: int = Field(foreign_key="rentalorder.id")
+    order_id: int = Field(foreign_key="rentalorder.id", index=True)
     car_rating: int
     client_rating: int
     comment: Optional[str] = None
+    updated_at: Optional[datetime] = updated_at_field()
     
     order: Optional[RentalOrder] = Relationship(back_populates="review")
+
+# Архив закрытых заказов (archive.py): те же колонки и те же id, что в оперативных таблицах.
+# Списки и ведомость читают архив вместе с ними, только когда этого требует диапазон дат
+class RentalOrderArchive(SQLModel, table=True):
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    client_id: int = Field(foreign_key="client.id", index=True)
+    vehicle_id: int = Field(foreign_key="vehicle.id", index=True)
+    employee_id: int = Field(foreign_key="employee.id", index=True)
+    start_date: datetime = Field(index=True)
+    end_date_planned: datetime
+    end_date_actual: Optional[datetime] = None
+    total_cost: Optional[Decimal] = Field(default=None, max_digits=10, decimal_places=2)
+    payment_status: str
+    deposit_returned: bool = Field(default=False)
+    order_status: str
+    updated_at: Optional[datetime] = Field(default=None, index=True)
+
+class PaymentArchive(SQLModel, table=True):
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    order_id: int = Field(foreign_key="rentalorderarchive.id", index=True)
+    amount: Decimal = Field(max_digits=10, decimal_places=2)
+    payment_date: datetime = Field(index=True)
+    payment_type: str
+    method: str
+    updated_at: Optional[datetime] = Field(default=None, index=True)
+
+class FineArchive(SQLModel, table=True):
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    order_id: int = Field(foreign_key="rentalorderarchive.id", index=True)
+    violation_type: str
+    amount: Decimal = Field(max_digits=10, decimal_places=2)
+    is_paid: bool = Field(default=False)
+    issue_date: date = Field(index=True)
+    updated_at: Optional[datetime] = Field(default=None, index=True)
+
+class ReviewArchive(SQLModel, table=True):
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    order_id: int = Field(foreign_key="rentalorderarchive.id", index=True)
+    car_rating: int
+    client_rating: int
+    comment: Optional[str] = None
+    updated_at: Optional[datetime] = Field(default=None, index=True)
+
+# 11. Tombstone (Удалённые записи) — для синхронизации клиентов по ?updated_since=
+class Tombstone(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_tombstone_table_name_deleted_at", "table_name", "deleted_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    table_name: str
+    row_id: int
+    deleted_at: datetime = Field(default_factory=utcnow)
+
+# Реестр ресурсов API: сегмент URL -> модель
+RESOURCES = {
+    "models": CarModel,
+    "vehicles": Vehicle,
+    "clients": Client,
+    "employees": Employee,
+    "orders": RentalOrder,
+    "maintenance": Maintenance,
+    "fines": Fine,
+    "payments": Payment,
+    "insurance": InsurancePolicy,
+    "reviews": Review,
+}
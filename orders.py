@@ -0,0 +1,129 @@
+"""Бизнес-правила заказов, общие для синхронных и асинхронных обработчиков.
+
+Функции работают с синхронной Session и ничего не коммитят; асинхронные обработчики
+вызывают их через AsyncSession.run_sync.
+"""
+from datetime import datetime
+
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from models import Vehicle, RentalOrder
+from availability import is_vehicle_busy, lock_vehicle, INACTIVE_ORDER_STATUSES
+from crud import apply_changes, coerce_changes, insert_returning, update_returning, validated
+from feed import record
+from pricing import quote_total
+
+# Поля заказа, от которых зависит занятость машины
+INTERVAL_FIELDS = {"vehicle_id", "start_date", "end_date_planned", "end_date_actual", "order_status"}
+
+BUSY_DETAIL = "Машина занята на выбранные даты"
+
+# Ограничение EXCLUDE из migrations/002_booking_intervals.sql и код его нарушения в PostgreSQL
+OVERLAP_CONSTRAINT = "rentalorder_vehicle_no_overlap"
+EXCLUSION_VIOLATION = "23P01"
+
+
+def is_overlap_violation(error: IntegrityError) -> bool:
+    """Нарушено ли ограничение на пересечение бронирований (psycopg2, psycopg, asyncpg)."""
+    orig = error.orig
+    code = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+    constraint = getattr(getattr(orig, "diag", None), "constraint_name", None)
+    return code == EXCLUSION_VIOLATION or constraint == OVERLAP_CONSTRAINT or OVERLAP_CONSTRAINT in str(orig)
+
+
+def integrity_error(error: IntegrityError) -> HTTPException:
+    """409 «Машина занята» для пересечения бронирований, 400 с причиной — для остальных ограничений."""
+    if is_overlap_violation(error):
+        return HTTPException(status_code=409, detail=BUSY_DETAIL)
+    return HTTPException(status_code=400, detail=f"Запись отклонена базой данных: {error.orig}")
+
+
+def check_booking(session: Session, order: RentalOrder) -> RentalOrder:
+    """Проверяет, что машина свободна на весь срок; возвращает заказ, приведённый к типам модели."""
+    order = validated(RentalOrder, order)
+    if order.end_date_planned <= order.start_date:
+        raise HTTPException(status_code=400, detail="Дата окончания должна быть позже даты начала")
+
+    # Блокируем строку машины: параллельные бронирования одного авто проверяются по очереди
+    vehicle = lock_vehicle(session, order.vehicle_id)
+    if not vehicle:
+        raise HTTPException(status_code=400, detail="Машина не найдена")
+
+    # Проверка доступности машины на весь срок заказа (заказы и ремонты)
+    if is_vehicle_busy(session, vehicle.id, order.start_date, order.end_date_planned):
+        raise HTTPException(status_code=409, detail=BUSY_DETAIL)
+
+    # Стоимость не указана — по тарифу модели на плановый срок (pricing.py)
+    if order.total_cost is None:
+        order.total_cost = quote_total(session, vehicle.model_id, order.start_date, order.end_date_planned)
+
+    # Статус отражает текущее состояние: "В аренде" только если аренда уже началась
+    if order.start_date <= datetime.now(order.start_date.tzinfo) < order.end_date_planned:
+        vehicle.status = "Rented"
+        session.add(vehicle)
+        record(session, Vehicle, "update", [vehicle.id])
+    return order
+
+
+def book_order(session: Session, order: RentalOrder) -> RentalOrder:
+    """Проверяет, что машина свободна на весь срок, и добавляет заказ в сессию."""
+    order = check_booking(session, order)
+    session.add(order)
+    return order
+
+
+def insert_order(session: Session, order: RentalOrder) -> RentalOrder:
+    """Проверяет бронирование и вставляет заказ одним INSERT ... RETURNING."""
+    return insert_returning(session, RentalOrder, check_booking(session, order))
+
+
+def check_interval(session: Session, order: RentalOrder):
+    """Проверяет сроки изменённого заказа и пересечения с другими заказами и ремонтами машины."""
+    end = order.end_date_actual or order.end_date_planned
+    if end <= order.start_date:
+        raise HTTPException(status_code=400, detail="Дата окончания должна быть позже даты начала")
+    lock_vehicle(session, order.vehicle_id)
+    if order.order_status not in INACTIVE_ORDER_STATUSES and is_vehicle_busy(
+        session, order.vehicle_id, order.start_date, end, exclude_order_id=order.id
+    ):
+        raise HTTPException(status_code=409, detail=BUSY_DETAIL)
+
+
+def update_order_fields(session: Session, db_order: RentalOrder, changes: dict) -> RentalOrder:
+    """Применяет изменения заказа; если поменялись машина или сроки — заново проверяет пересечения."""
+    with session.no_autoflush:
+        apply_changes(RentalOrder, db_order, changes)
+        if INTERVAL_FIELDS & changes.keys():
+            check_interval(session, db_order)
+    return db_order
+
+
+def patch_order(session: Session, order_id: int, changes: dict) -> Optional[RentalOrder]:
+    """Изменяет заказ одним UPDATE ... RETURNING; None, если заказа нет.
+
+    Текущая версия заказа читается только если меняются машина или сроки — для проверки пересечений.
+    """
+    changes = coerce_changes(RentalOrder, changes)
+    if INTERVAL_FIELDS & changes.keys():
+        current = session.get(RentalOrder, order_id)
+        if current is None:
+            return None
+        check_interval(session, validated(RentalOrder, RentalOrder(**{**current.model_dump(), **changes})))
+    return update_returning(session, RentalOrder, order_id, changes)
+
+
+def release_vehicle(session: Session, order: RentalOrder):
+    """Если заказ активен, освобождает машину (вместе с удалением заказа)."""
+    if order.order_status == "Open":
+        released = session.execute(
+            update(Vehicle)
+            .where(Vehicle.id == order.vehicle_id, Vehicle.status == "Rented")
+            .values(status="Available")
+            .returning(Vehicle.id)
+        ).scalars().all()
+        record(session, Vehicle, "update", released)
@@ -0,0 +1,188 @@
+"""Просроченные заказы: открытые заказы, не возвращённые к end_date_planned, получают штраф за
+просрочку, а полностью оплаченные заказы с новым долгом — статус оплаты Partial.
+
+Просроченный заказ — order_status = Open без end_date_actual, плановый возврат больше
+OVERDUE_GRACE_HOURS часов назад. Такие заказы находит частичный индекс ix_rentalorder_overdue
+(в нём только открытые невозвращённые заказы), обход — пачками по OVERDUE_BATCH заказов
+по ключу (end_date_planned, id), каждая пачка — отдельная транзакция. В PostgreSQL заказы пачки
+блокируются FOR UPDATE SKIP LOCKED: параллельные запуски из нескольких процессов не ждут друг друга.
+
+Штраф — один на заказ, violation_type = LATE_FINE_TYPE, сумма = начатые сутки просрочки × daily_rate
+модели × OVERDUE_FINE_RATE. Повторный запуск не создаёт второй штраф, а доводит сумму неоплаченного
+штрафа до текущего числа суток; оплаченный штраф не меняется. Уникальный частичный индекс
+ux_fine_late_return (migrations/008_overdue.sql) не даёт задвоить штраф и при гонке запусков.
+
+Запуск — задача overdue планировщика (scheduler.py) раз в OVERDUE_INTERVAL_SECONDS или вручную:
+    python overdue.py
+"""
+import logging
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import and_, bindparam, insert, literal, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from feed import record
+from models import CarModel, Fine, RentalOrder, Vehicle, utcnow
+
+OVERDUE_INTERVAL_SECONDS = float(os.getenv("OVERDUE_INTERVAL_SECONDS", "0"))
+OVERDUE_GRACE_HOURS = float(os.getenv("OVERDUE_GRACE_HOURS", "2"))
+OVERDUE_BATCH = int(os.getenv("OVERDUE_BATCH", "500"))
+OVERDUE_FINE_RATE = Decimal(os.getenv("OVERDUE_FINE_RATE", "1"))
+
+# Тип штрафа за просрочку (совпадает с условием индекса ux_fine_late_return)
+LATE_FINE_TYPE = "Late return"
+OPEN_STATUS = "Open"
+
+logger = logging.getLogger("car_rental.overdue")
+
+
+def overdue_filter(now: datetime):
+    # Первые два условия — условие частичного индекса ix_rentalorder_overdue. Статус подставляется
+    # в SQL константой: по параметру планировщик не может доказать, что частичный индекс подходит
+    return and_(
+        RentalOrder.order_status == literal(OPEN_STATUS, literal_execute=True),
+        RentalOrder.end_date_actual.is_(None),
+        RentalOrder.end_date_planned < now - timedelta(hours=OVERDUE_GRACE_HOURS),
+    )
+
+
+def late_fee(daily_rate, planned: datetime, now: datetime) -> Decimal:
+    days = max(1, math.ceil((now - planned).total_seconds() / 86400))
+    return (Decimal(daily_rate) * days * OVERDUE_FINE_RATE).quantize(Decimal("0.01"))
+
+
+def _insert_fines(session: Session, rows: list) -> list:
+    """Вставляет штрафы, пропуская заказы, где штраф уже есть; возвращает id вставленных."""
+    table = Fine.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        statement = (pg_insert if dialect == "postgresql" else sqlite_insert)(table).on_conflict_do_nothing(
+            index_elements=[table.c.order_id], index_where=text(f"violation_type = '{LATE_FINE_TYPE}'"),
+        )
+    else:
+        statement = insert(table)
+    return session.execute(statement.returning(table.c.id), rows).scalars().all()
+
+
+def fine_batch(session: Session, now: datetime, after=None, batch: int = OVERDUE_BATCH) -> dict:
+    """Одна пачка просроченных заказов после ключа after; коммитит.
+
+    Возвращает счётчики пачки и "after" — ключ последнего заказа (None, если заказов нет).
+    """
+    statement = (
+        select(RentalOrder.id, RentalOrder.end_date_planned, RentalOrder.payment_status, CarModel.daily_rate)
+        .join(Vehicle, Vehicle.id == RentalOrder.vehicle_id)
+        .join(CarModel, CarModel.id == Vehicle.model_id)
+        .where(overdue_filter(now))
+        .order_by(RentalOrder.end_date_planned, RentalOrder.id)
+        .limit(batch)
+    )
+    if after is not None:
+        statement = statement.where(tuple_(RentalOrder.end_date_planned, RentalOrder.id) > tuple_(*after))
+    if session.get_bind().dialect.name == "postgresql":
+        statement = statement.with_for_update(of=RentalOrder, skip_locked=True)
+    orders = session.execute(statement).all()
+    counts = {"orders": len(orders), "created": 0, "raised": 0, "marked": 0, "after": None}
+    if not orders:
+        session.rollback()
+        return counts
+    counts["after"] = (orders[-1].end_date_planned, orders[-1].id)
+
+    ids = [order.id for order in orders]
+    fines = {
+        fine.order_id: fine
+        for fine in session.execute(
+            select(Fine.id, Fine.order_id, Fine.amount, Fine.is_paid)
+            .where(Fine.order_id.in_(ids), Fine.violation_type == LATE_FINE_TYPE)
+        )
+    }
+    today, changed_at = now.date(), utcnow()
+    new, raised, marked = [], [], []
+    for order in orders:
+        amount = late_fee(order.daily_rate, order.end_date_planned, now)
+        fine = fines.get(order.id)
+        if fine is None:
+            new.append({"order_id": order.id, "violation_type": LATE_FINE_TYPE, "amount": amount,
+                        "is_paid": False, "issue_date": today, "updated_at": changed_at})
+        elif not fine.is_paid and fine.amount < amount:
+            raised.append({"fine_id": fine.id, "new_amount": amount})
+        else:
+            continue
+        if order.payment_status == "Paid":
+            marked.append(order.id)
+
+    if new:
+        created = _insert_fines(session, new)
+        counts["created"] = len(created)
+        record(session, Fine, "insert", created)
+    if raised:
+        table = Fine.__table__
+        session.execute(
+            update(table).where(table.c.id == bindparam("fine_id")).values(amount=bindparam("new_amount")),
+            raised,
+        )
+        counts["raised"] = len(raised)
+        record(session, Fine, "update", [row["fine_id"] for row in raised])
+    if marked:
+        session.execute(
+            update(RentalOrder.__table__)
+            .where(RentalOrder.id.in_(marked), RentalOrder.payment_status == "Paid")
+            .values(payment_status="Partial")
+        )
+        counts["marked"] = len(marked)
+        record(session, RentalOrder, "update", marked)
+    session.commit()
+    return counts
+
+
+_status = {"overdue": 0, "created": 0, "raised": 0, "marked": 0}
+
+
+def fine_overdue_orders(engine, batch: int = OVERDUE_BATCH) -> dict:
+    """Обходит все просроченные заказы пачками; возвращает итог запуска."""
+    now = datetime.now()
+    started = time.monotonic()
+    total = {"overdue": 0, "created": 0, "raised": 0, "marked": 0}
+    after = None
+    while True:
+        with Session(engine) as session:
+            counts = fine_batch(session, now, after, batch)
+        total["overdue"] += counts["orders"]
+        for key in ("created", "raised", "marked"):
+            total[key] += counts[key]
+        after = counts["after"]
+        if counts["orders"] < batch:
+            break
+    # overdue — сколько просроченных заказов сейчас, остальное копится с запуска процесса
+    _status.update(overdue=total["overdue"], created=_status["created"] + total["created"],
+                   raised=_status["raised"] + total["raised"], marked=_status["marked"] + total["marked"])
+    if total["created"] or total["raised"]:
+        logger.info("Просрочка: заказов %s, новых штрафов %s, увеличено %s за %.1f с", total["overdue"],
+                    total["created"], total["raised"], time.monotonic() - started)
+    return total
+
+
+def overdue_status() -> dict:
+    return {
+        "interval_seconds": OVERDUE_INTERVAL_SECONDS,
+        "grace_hours": OVERDUE_GRACE_HOURS,
+        "fine_rate": str(OVERDUE_FINE_RATE),
+        **_status,
+    }
+
+
+def main():
+    from database import engine
+    total = fine_overdue_orders(engine)
+    print(f"просроченных заказов: {total['overdue']}, новых штрафов: {total['created']}, "
+          f"увеличено: {total['raised']}, отмечено Partial: {total['marked']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""Курсорная (keyset) пагинация, фильтры и серверная сортировка для списочных эндпоинтов."""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Generic, List, Optional, TypeVar, Union
+
+from fastapi import HTTPException, Query, Response
+from pydantic import BaseModel
+from sqlalchemy import and_, or_, tuple_
+from sqlmodel import Session, select
+
+from archive import entities_with_archive, needs_archive, with_archive
+from fastjson import FAST_JSON, FastJSONResponse, row_dicts
+from sync import SYNC_TOKEN_HEADER, deleted_ids, parse_since, sync_token
+from models import (
+    CarModel, Vehicle, Client, Employee, RentalOrder,
+    Maintenance, Fine, Payment, InsurancePolicy, Review
+)
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# Заголовок, в котором возвращается курсор следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+T = TypeVar("T")
+
+
+class DeltaPage(BaseModel, Generic[T]):
+    """Ответ списка с ?updated_since= (sync.py)."""
+    items: List[T]
+    deleted: List[int]
+
+
+def page_model(model):
+    """response_model списка: страница записей или, с ?updated_since=, DeltaPage — для схемы OpenAPI."""
+    return Union[List[model], DeltaPage[model]]
+
+# Белый список фильтров: имя query-параметра -> (колонка, оператор)
+FILTERS = {
+    CarModel: {
+        "brand": (CarModel.brand, "eq"),
+        "car_class": (CarModel.car_class, "eq"),
+    },
+    Vehicle: {
+        "id": (Vehicle.id, "eq"),
+        "status": (Vehicle.status, "eq"),
+        "model_id": (Vehicle.model_id, "eq"),
+    },
+    Client: {
+        "id": (Client.id, "eq"),
+        "is_blacklisted": (Client.is_blacklisted, "eq"),
+    },
+    Employee: {
+        "status": (Employee.status, "eq"),
+    },
+    RentalOrder: {
+        "id": (RentalOrder.id, "eq"),
+        "order_status": (RentalOrder.order_status, "eq"),
+        "payment_status": (RentalOrder.payment_status, "eq"),
+        "client_id": (RentalOrder.client_id, "eq"),
+        "vehicle_id": (RentalOrder.vehicle_id, "eq"),
+        "employee_id": (RentalOrder.employee_id, "eq"),
+        "start_from": (RentalOrder.start_date, "ge"),
+        "start_to": (RentalOrder.start_date, "le"),
+    },
+    Maintenance: {
+        "vehicle_id": (Maintenance.vehicle_id, "eq"),
+        "start_from": (Maintenance.start_date, "ge"),
+        "start_to": (Maintenance.start_date, "le"),
+    },
+    Fine: {
+        "order_id": (Fine.order_id, "eq"),
+        "is_paid": (Fine.is_paid, "eq"),
+        "issue_from": (Fine.issue_date, "ge"),
+        "issue_to": (Fine.issue_date, "le"),
+    },
+    Payment: {
+        "order_id": (Payment.order_id, "eq"),
+        "payment_type": (Payment.payment_type, "eq"),
+        "method": (Payment.method, "eq"),
+        "payment_from": (Payment.payment_date, "ge"),
+        "payment_to": (Payment.payment_date, "le"),
+    },
+    InsurancePolicy: {
+        "vehicle_id": (InsurancePolicy.vehicle_id, "eq"),
+    },
+    Review: {
+        "order_id": (Review.order_id, "eq"),
+    },
+}
+
+# Колонки для order_by (кроме id — по нему сортирует любой список). NULL в необязательных
+# колонках идут последними при любом направлении (см. order_keys, after_condition)
+SORTABLE = {
+    CarModel: {
+        "brand": CarModel.brand, "model_name": CarModel.model_name,
+        "car_class": CarModel.car_class, "class": CarModel.car_class,  # 'class' — алиас в JSON
+        "daily_rate": CarModel.daily_rate, "deposit_amount": CarModel.deposit_amount,
+    },
+    Vehicle: {
+        "model_id": Vehicle.model_id, "license_plate": Vehicle.license_plate, "vin_code": Vehicle.vin_code,
+        "color": Vehicle.color, "current_mileage": Vehicle.current_mileage, "status": Vehicle.status,
+    },
+    Client: {
+        "full_name": Client.full_name, "phone": Client.phone, "birth_date": Client.birth_date,
+        "rating": Client.rating, "is_blacklisted": Client.is_blacklisted,
+        "driver_license_num": Client.driver_license_num, "passport_data": Client.passport_data,
+    },
+    Employee: {
+        "full_name": Employee.full_name, "position": Employee.position, "status": Employee.status,
+    },
+    RentalOrder: {
+        "client_id": RentalOrder.client_id, "vehicle_id": RentalOrder.vehicle_id,
+        "employee_id": RentalOrder.employee_id, "start_date": RentalOrder.start_date,
+        "end_date_planned": RentalOrder.end_date_planned, "payment_status": RentalOrder.payment_status,
+        "order_status": RentalOrder.order_status, "end_date_actual": RentalOrder.end_date_actual,
+        "total_cost": RentalOrder.total_cost, "deposit_returned": RentalOrder.deposit_returned,
+    },
+    Maintenance: {
+        "vehicle_id": Maintenance.vehicle_id, "start_date": Maintenance.start_date,
+        "service_type": Maintenance.service_type, "cost": Maintenance.cost,
+        "end_date": Maintenance.end_date, "description": Maintenance.description,
+    },
+    Fine: {
+        "order_id": Fine.order_id, "violation_type": Fine.violation_type, "amount": Fine.amount,
+        "is_paid": Fine.is_paid, "issue_date": Fine.issue_date,
+    },
+    Payment: {
+        "order_id": Payment.order_id, "amount": Payment.amount, "payment_date": Payment.payment_date,
+        "payment_type": Payment.payment_type, "method": Payment.method,
+    },
+    InsurancePolicy: {
+        "vehicle_id": InsurancePolicy.vehicle_id, "policy_number": InsurancePolicy.policy_number,
+        "insurance_company": InsurancePolicy.insurance_company, "start_date": InsurancePolicy.start_date,
+        "end_date": InsurancePolicy.end_date, "cost": InsurancePolicy.cost,
+    },
+    Review: {
+        "order_id": Review.order_id, "car_rating": Review.car_rating, "client_rating": Review.client_rating,
+        "comment": Review.comment,
+    },
+}
+
+
+class PageParams:
+    """Общие параметры страницы: размер, курсор и сортировка."""
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT, description="Размер страницы"),
+        after: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
+        order_by: Optional[str] = Query(None, description="Поле сортировки, '-' в начале — по убыванию"),
+        fields: Optional[str] = Query(None, description="Только эти поля через запятую, например id,full_name,phone"),
+        updated_since: Optional[str] = Query(
+            None, description="Токен из заголовка X-Sync-Token: только записи, изменённые и удалённые после него"
+        ),
+    ):
+        self.limit = limit
+        self.after = after
+        self.order_by = order_by
+        self.fields = fields
+        # Нижняя граница updated_at (с запасом SYNC_LAG_SECONDS, см. sync.py) или None
+        self.updated_since = parse_since(updated_since) if updated_since else None
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _python_type(column):
+    try:
+        return column.type.python_type
+    except NotImplementedError:  # AutoString из SQLModel не объявляет python_type
+        return str
+
+
+def _decode_value(column, value):
+    python_type = _python_type(column)
+    if value is None or isinstance(value, python_type):
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def parse_query_value(column, raw: str):
+    """Приводит строку из query-параметра к типу колонки (для обобщённых эндпоинтов)."""
+    if _python_type(column) is bool:
+        if raw.lower() in ("true", "1", "yes"):
+            return True
+        if raw.lower() in ("false", "0", "no"):
+            return False
+        raise ValueError(raw)
+    return _decode_value(column, raw)
+
+
+def filters_from_query(model, query_params) -> dict:
+    """Собирает фильтры из белого списка FILTERS прямо из строки запроса."""
+    filters = {}
+    for name, (column, _) in FILTERS.get(model, {}).items():
+        raw = query_params.get(name)
+        if raw is None:
+            continue
+        try:
+            filters[name] = parse_query_value(column, raw)
+        except (ValueError, ArithmeticError):
+            raise HTTPException(status_code=400, detail=f"Некорректное значение фильтра '{name}'")
+    return filters
+
+
+def encode_cursor(order_by: Optional[str], value, last_id: int) -> str:
+    raw = json.dumps({"k": order_by, "v": _encode_value(value), "id": last_id})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(data, dict) or "id" not in data:
+            raise ValueError(cursor)
+        return data
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Некорректный курсор пагинации")
+
+
+def _sort_column(model, order_by: Optional[str]):
+    """Возвращает (колонка или None, по убыванию?) для параметра order_by; None — сортировка по id."""
+    if not order_by:
+        return None, False
+    descending = order_by.startswith("-")
+    name = order_by.lstrip("-")
+    if name == "id":
+        return None, descending
+    column = SORTABLE.get(model, {}).get(name)
+    if column is None:
+        raise HTTPException(status_code=400, detail=f"Сортировка по полю '{name}' не поддерживается")
+    return column, descending
+
+
+def is_nullable(model, column) -> bool:
+    return column is not None and model.__table__.c[column.key].nullable
+
+
+def order_keys(column, id_column, descending: bool, nullable: bool = False) -> list:
+    """ORDER BY страницы: колонка (NULL последними) и id для однозначного порядка."""
+    last = id_column.desc() if descending else id_column
+    if column is None:
+        return [last]
+    key = column.desc() if descending else column.asc()
+    return [key.nulls_last() if nullable else key, last]
+
+
+def after_condition(column, id_column, descending: bool, value, last_id: int, nullable: bool = False):
+    """Условие keyset: строки после (value, last_id) в порядке order_keys."""
+    def beyond(key, bound):
+        return key < bound if descending else key > bound
+
+    if column is None:
+        return beyond(id_column, last_id)
+    after = beyond(tuple_(column, id_column), tuple_(value, last_id))
+    if not nullable:
+        return after
+    # NULL идут после всех значений: за NULL-строкой — только NULL с id дальше
+    if value is None:
+        return and_(column.is_(None), beyond(id_column, last_id))
+    return or_(after, column.is_(None))
+
+
+def projection(model, fields: Optional[str]) -> Optional[list]:
+    """Имена полей из ?fields= (алиасы вроде 'class' тоже принимаются); None — все поля."""
+    if not fields:
+        return None
+    columns = model.__table__.columns.keys()
+    aliases = {field.alias: name for name, field in model.model_fields.items() if field.alias}
+    names = []
+    for raw in fields.split(","):
+        raw = raw.strip()
+        name = aliases.get(raw, raw)
+        if not name:
+            continue
+        if name not in columns:
+            raise HTTPException(status_code=400, detail=f"Поле '{raw}' не поддерживается")
+        if name not in names:
+            names.append(name)
+    return names or None
+
+
+def page_columns(model, page: PageParams, fields: Optional[list]) -> list:
+    """Колонки select для быстрого пути: запрошенные поля плюс id и поле сортировки, нужные курсору."""
+    table = model.__table__
+    if fields is None:
+        return list(table.columns)
+    column, _ = _sort_column(model, page.order_by)
+    names = list(fields)
+    for name in ("id", column.key if column is not None else None):
+        if name and name not in names:
+            names.append(name)
+    return [table.c[name] for name in names]
+
+
+def apply_filters(statement, model, filters: dict):
+    """Накладывает на запрос фильтры из белого списка FILTERS; None-значения пропускаются."""
+    allowed = FILTERS.get(model, {})
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if name not in allowed:
+            raise HTTPException(status_code=400, detail=f"Фильтр '{name}' не поддерживается")
+        column, op = allowed[name]
+        if op == "eq":
+            statement = statement.where(column == value)
+        elif op == "ge":
+            statement = statement.where(column >= value)
+        elif op == "le":
+            statement = statement.where(column <= value)
+    return statement
+
+
+def build_page_query(model, page: PageParams, filters: dict):
+    """Строит SELECT одной страницы (limit + 1 строка, чтобы понять, есть ли следующая)."""
+    column, descending = _sort_column(model, page.order_by)
+    nullable = is_nullable(model, column)
+    statement = apply_filters(select(model), model, filters)
+    if page.updated_since is not None:
+        statement = statement.where(model.updated_at >= page.updated_since)
+
+    if page.after:
+        cursor = decode_cursor(page.after)
+        if cursor.get("k") != page.order_by:
+            raise HTTPException(status_code=400, detail="Курсор получен для другой сортировки")
+        try:
+            last_id = int(cursor["id"])
+            value = _decode_value(column, cursor.get("v")) if column is not None else None
+        except (TypeError, ValueError, ArithmeticError):
+            raise HTTPException(status_code=400, detail="Некорректный курсор пагинации")
+        statement = statement.where(after_condition(column, model.id, descending, value, last_id, nullable))
+
+    return statement.order_by(*order_keys(column, model.id, descending, nullable)).limit(page.limit + 1)
+
+
+def finish_page(model, page: PageParams, rows: list):
+    """Обрезает лишнюю строку и возвращает (элементы, курсор следующей страницы или None)."""
+    if len(rows) <= page.limit:
+        return rows, None
+    rows = rows[:page.limit]
+    column, _ = _sort_column(model, page.order_by)
+    last = rows[-1]
+    value = getattr(last, column.key) if column is not None else None
+    return rows, encode_cursor(page.order_by, value, last.id)
+
+
+def paginate(session: Session, model, page: PageParams, response: Response, **filters):
+    """Выполняет запрос страницы и кладёт курсор следующей страницы в заголовок ответа."""
+    token = sync_token()  # до чтения: изменения, сделанные во время запроса, попадут в следующую синхронизацию
+    statement = build_page_query(model, page, filters)
+    fields = projection(model, page.fields)
+    if page.updated_since is not None:
+        statement = statement.with_only_columns(*page_columns(model, page, fields))
+        deleted = deleted_ids(session, model, page.updated_since) if not page.after else []
+        result = delta_page(model, page, session.connection().execute(statement), deleted, fields)
+        return with_sync_token(result, page, token)
+    # Архив (archive.py) — только если фильтры могут задеть архивные строки; изменения в нём
+    # не бывают, поэтому синхронизация выше его не читает
+    archived = needs_archive(session, model, filters)
+    if FAST_JSON or fields:
+        # Core-запрос через соединение сессии: без ORM-загрузки объектов; ?fields= сужает SELECT
+        statement = statement.with_only_columns(*page_columns(model, page, fields))
+        if archived:
+            statement = with_archive(statement, model)
+        return with_sync_token(fast_page(model, page, session.connection().execute(statement), fields), page, token)
+    if archived:
+        rows = session.execute(entities_with_archive(model, statement)).scalars().all()
+    else:
+        rows = session.exec(statement).all()
+    items, next_cursor = finish_page(model, page, rows)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    with_sync_token(response, page, token)
+    return items
+
+
+def fast_page(model, page: PageParams, result, fields: Optional[list] = None) -> FastJSONResponse:
+    """Готовый ответ страницы из результата select колонок — минуя response_model (см. fastjson.py).
+
+    Неполные строки (?fields=) через response_model не прошли бы, поэтому проекция всегда идёт этим путём.
+    """
+    keys = list(result.keys())
+    rows, next_cursor = finish_page(model, page, result.all())
+    return FastJSONResponse(
+        row_dicts(keys, rows, fields),
+        headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None,
+    )
+
+
+def delta_page(model, page: PageParams, result, deleted: list, fields: Optional[list] = None) -> FastJSONResponse:
+    """Ответ ?updated_since=: {"items": изменённые записи страницы, "deleted": id удалённых}.
+
+    Удалённые id приходят только на первой странице (без after). Клиент сначала убирает
+    deleted, затем заменяет или добавляет items по id.
+    """
+    keys = list(result.keys())
+    rows, next_cursor = finish_page(model, page, result.all())
+    return FastJSONResponse(
+        {"items": row_dicts(keys, rows, fields), "deleted": deleted},
+        headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None,
+    )
+
+
+def with_sync_token(response: Response, page: PageParams, token: str) -> Response:
+    """Токен синхронизации — только на первой странице: хранить нужно его, токен более поздней
+    страницы пропустил бы изменения уже прочитанных."""
+    if not page.after:
+        response.headers[SYNC_TOKEN_HEADER] = token
+    return response
@@ -0,0 +1,86 @@
+"""Пул соединений с метриками ожидания (для подбора размера пула под реальную нагрузку)."""
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+
+class PoolStats:
+    """Счётчики выдачи соединений из пула."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0      # всего выдано соединений
+        self.waits = 0          # выдач, когда пул был исчерпан (size + overflow заняты) и пришлось ждать
+        self.wait_time = 0.0    # суммарное время ожидания в таких выдачах, сек
+        self.max_wait = 0.0     # самое долгое ожидание, сек
+        self.timeouts = 0       # ожидание закончилось ошибкой QueuePool limit ... timed out
+
+    def record(self, elapsed: float, waited: bool):
+        with self._lock:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.wait_time += elapsed
+                self.max_wait = max(self.max_wait, elapsed)
+
+    def record_timeout(self, elapsed: float):
+        with self._lock:
+            self.waits += 1
+            self.timeouts += 1
+            self.wait_time += elapsed
+            self.max_wait = max(self.max_wait, elapsed)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "wait_time_total_ms": round(self.wait_time * 1000, 3),
+                "wait_time_max_ms": round(self.max_wait * 1000, 3),
+                "wait_time_avg_ms": round(self.wait_time * 1000 / self.waits, 3) if self.waits else 0.0,
+            }
+
+
+def metered(pool_cls):
+    """Подкласс QueuePool/AsyncAdaptedQueuePool, который считает ожидания соединения."""
+
+    class MeteredPool(pool_cls):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.stats = PoolStats()
+
+        def _do_get(self):
+            # Пул исчерпан, если свободных соединений нет и лимит overflow выбран
+            exhausted = self.checkedin() == 0 and self._max_overflow > -1 and self._overflow >= self._max_overflow
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except PoolTimeoutError:
+                self.stats.record_timeout(time.perf_counter() - started)
+                raise
+            self.stats.record(time.perf_counter() - started, exhausted)
+            return connection
+
+    MeteredPool.__name__ = f"Metered{pool_cls.__name__}"
+    return MeteredPool
+
+
+def pool_status(engine) -> dict:
+    """Текущее состояние пула движка и накопленные счётчики ожиданий."""
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    if hasattr(pool, "checkedout"):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout_s": pool.timeout(),
+        })
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        status.update(stats.as_dict())
+    return status
@@ -0,0 +1,254 @@
+"""Расчёт стоимости аренды: POST /quotes/batch — цены сразу для многих вариантов (модель или машина, сроки)
+и автоматическая total_cost при создании заказа без неё.
+
+Правило (суммы в копейках, округление до копейки):
+- сутки = начатые сутки аренды (как при генерации данных), не меньше одних;
+- base      = сутки × daily_rate модели;
+- surcharge = сутки, приходящиеся на субботу и воскресенье (по дате начала) × daily_rate
+              × PRICING_WEEKEND_SURCHARGE;
+- discount  = (base + surcharge) × скидка за длительность: наибольшая из PRICING_DURATION_DISCOUNTS,
+              чей порог в сутках не больше срока ("7:0.05,30:0.15" — от 7 суток 5%, от 30 — 15%);
+- total     = base + surcharge − discount; deposit — deposit_amount модели.
+По умолчанию надбавок и скидок нет: total = сутки × daily_rate.
+
+Ставки моделей и модели машин читаются из БД один раз и держатся в памяти процесса таблицей
+(RateTable); не чаще раза в PRICING_REFRESH_SECONDS одним запросом сверяется число строк и
+max(updated_at) carmodel и vehicle, и при изменении таблица перечитывается.
+
+Пачка считается векторно через NumPy: поиск ставок — searchsorted по отсортированным id, сутки
+выходных — busday_count. Без NumPy (необязательная зависимость) — тот же расчёт циклом Python.
+"""
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from models import CarModel, Vehicle
+
+try:
+    import numpy as np
+except ImportError:  # необязательная зависимость — без неё расчёт циклом Python
+    np = None
+
+PRICING_WEEKEND_SURCHARGE = float(os.getenv("PRICING_WEEKEND_SURCHARGE", "0"))
+PRICING_DURATION_DISCOUNTS = os.getenv("PRICING_DURATION_DISCOUNTS", "")
+PRICING_REFRESH_SECONDS = float(os.getenv("PRICING_REFRESH_SECONDS", "5"))
+QUOTE_MAX_ITEMS = int(os.getenv("QUOTE_MAX_ITEMS", "1000"))
+
+DAY = timedelta(days=1)
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+# Наибольший id, который помещается в int64 (массивы NumPy); pydantic принимает целые любой длины
+MAX_ID = 2 ** 63 - 1
+
+
+def parse_discounts(raw: str) -> list:
+    """"7:0.05,30:0.15" -> [(7, 0.05), (30, 0.15)] по возрастанию порога."""
+    tiers = []
+    for part in filter(None, (p.strip() for p in raw.split(","))):
+        days, _, rate = part.partition(":")
+        tiers.append((int(days), float(rate)))
+    return sorted(tiers)
+
+
+DISCOUNT_TIERS = parse_discounts(PRICING_DURATION_DISCOUNTS)
+
+
+class QuoteRequest(BaseModel):
+    model_id: Optional[int] = None
+    vehicle_id: Optional[int] = None
+    start: datetime
+    end: datetime
+
+
+# ---------- Таблица ставок ----------
+
+class RateTable:
+    """Ставки и залоги моделей (в копейках) и модель каждой машины."""
+
+    def __init__(self, models: list, vehicles: list):
+        self.rates = {model_id: (_kopecks(rate), _kopecks(deposit)) for model_id, rate, deposit in models}
+        self.vehicle_models = dict(vehicles)
+        self.loaded_at = datetime.now()
+        if np is not None:
+            # Первая строка — заглушка с наименьшим id: массивы не пустые и для пустого справочника
+            ids = sorted(self.rates)
+            self.model_ids = np.array([np.iinfo(np.int64).min, *ids], dtype=np.int64)
+            self.model_rates = np.array([0, *(self.rates[i][0] for i in ids)], dtype=np.int64)
+            self.model_deposits = np.array([0, *(self.rates[i][1] for i in ids)], dtype=np.int64)
+
+
+def _kopecks(value) -> int:
+    return int(Decimal(value) * 100)
+
+
+def _money(kopecks: int) -> str:
+    # Строкой, как Decimal в остальных ответах API
+    return str(Decimal(int(kopecks)).scaleb(-2))
+
+
+def _signature(session: Session) -> tuple:
+    # Одним запросом: изменения (updated_at) и удаления (число строк) справочника и машин
+    return tuple(session.execute(select(
+        select(func.count(CarModel.id)).scalar_subquery(),
+        select(func.max(CarModel.updated_at)).scalar_subquery(),
+        select(func.count(Vehicle.id)).scalar_subquery(),
+        select(func.max(Vehicle.updated_at)).scalar_subquery(),
+    )).one())
+
+
+_table: Optional[RateTable] = None
+_table_signature = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def rate_table(session: Session) -> RateTable:
+    """Таблица ставок процесса; перечитывается, если справочник или машины изменились."""
+    global _table, _table_signature, _checked_at
+    with _lock:
+        if _table is not None and time.monotonic() - _checked_at < PRICING_REFRESH_SECONDS:
+            return _table
+        signature = _signature(session)
+        if _table is None or signature != _table_signature:
+            models = session.execute(select(CarModel.id, CarModel.daily_rate, CarModel.deposit_amount)).all()
+            vehicles = session.execute(select(Vehicle.id, Vehicle.model_id)).all()
+            _table, _table_signature = RateTable(models, vehicles), signature
+        _checked_at = time.monotonic()
+        return _table
+
+
+# ---------- Расчёт ----------
+
+def _naive(value: datetime) -> datetime:
+    # Выходные считаются по дате в часовом поясе клиента — пояс просто отбрасывается
+    return value.replace(tzinfo=None)
+
+
+def _price_numpy(table: RateTable, model_ids: list, starts: list, ends: list) -> dict:
+    model_ids = np.array(model_ids, dtype=np.int64)
+    positions = np.searchsorted(table.model_ids, model_ids).clip(max=len(table.model_ids) - 1)
+    found = table.model_ids[positions] == model_ids
+    rates = np.where(found, table.model_rates[positions], 0)
+    deposits = np.where(found, table.model_deposits[positions], 0)
+
+    # Микросекунды от эпохи: np.array(datetime) разбирает объекты на порядок медленнее
+    start = np.fromiter(((d - EPOCH) // MICROSECOND for d in starts), np.int64, len(starts))
+    end = np.fromiter(((d - EPOCH) // MICROSECOND for d in ends), np.int64, len(ends))
+    day = DAY // MICROSECOND
+    days = np.maximum(1, -((start - end) // day))
+    first_day = (start // day).astype("datetime64[D]")
+    weekend = days - np.busday_count(first_day, first_day + days)
+
+    base = days * rates
+    surcharge = np.round(weekend * rates * PRICING_WEEKEND_SURCHARGE).astype(np.int64)
+    discount_rate = np.zeros(len(days))
+    for threshold, rate in DISCOUNT_TIERS:
+        discount_rate = np.where(days >= threshold, rate, discount_rate)
+    discount = np.round((base + surcharge) * discount_rate).astype(np.int64)
+    return {
+        "found": found.tolist(), "days": days.tolist(), "weekend_days": weekend.tolist(),
+        "daily_rate": rates.tolist(), "base": base.tolist(), "surcharge": surcharge.tolist(),
+        "discount": discount.tolist(), "total": (base + surcharge - discount).tolist(),
+        "deposit": deposits.tolist(),
+    }
+
+
+def _weekend_days(first_day: date, days: int) -> int:
+    weeks, rest = divmod(days, 7)
+    weekday = first_day.weekday()
+    return weeks * 2 + sum(1 for k in range(rest) if (weekday + k) % 7 >= 5)
+
+
+def _price_python(table: RateTable, model_ids: list, starts: list, ends: list) -> dict:
+    result = {key: [] for key in ("found", "days", "weekend_days", "daily_rate", "base",
+                                  "surcharge", "discount", "total", "deposit")}
+    for model_id, start, end in zip(model_ids, starts, ends):
+        rate, deposit = table.rates.get(model_id, (0, 0))
+        days = max(1, -(-(end - start) // DAY))
+        weekend = _weekend_days(start.date(), days)
+        base = days * rate
+        surcharge = round(weekend * rate * PRICING_WEEKEND_SURCHARGE)
+        discount_rate = 0.0
+        for threshold, tier in DISCOUNT_TIERS:
+            if days >= threshold:
+                discount_rate = tier
+        discount = round((base + surcharge) * discount_rate)
+        for key, value in (("found", model_id in table.rates), ("days", days), ("weekend_days", weekend),
+                           ("daily_rate", rate), ("base", base), ("surcharge", surcharge),
+                           ("discount", discount), ("total", base + surcharge - discount), ("deposit", deposit)):
+            result[key].append(value)
+    return result
+
+
+MONEY_FIELDS = ("daily_rate", "base", "surcharge", "discount", "total", "deposit")
+
+
+def quote_batch(session: Session, requests: List[QuoteRequest]) -> dict:
+    """Цены по каждому запросу пачки (по индексу в исходном массиве), как у пакетных операций."""
+    if len(requests) > QUOTE_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Слишком большая пачка: максимум {QUOTE_MAX_ITEMS} расчётов")
+    table = rate_table(session)
+    results = [None] * len(requests)
+    valid, model_ids, starts, ends = [], [], [], []
+    for index, request in enumerate(requests):
+        if (request.model_id is None) == (request.vehicle_id is None):
+            error = "Укажите ровно одно из полей model_id или vehicle_id"
+        elif request.vehicle_id is not None and request.vehicle_id not in table.vehicle_models:
+            error = f"vehicle_id={request.vehicle_id}: машина не найдена"
+        elif request.model_id is not None and not 0 < request.model_id <= MAX_ID:
+            error = f"model_id={request.model_id}: модель не найдена"
+        elif _naive(request.end) <= _naive(request.start):
+            error = "Дата окончания должна быть позже даты начала"
+        else:
+            error = None
+        if error:
+            results[index] = {"index": index, "ok": False, "error": error}
+            continue
+        valid.append(index)
+        model_ids.append(request.model_id if request.model_id is not None else table.vehicle_models[request.vehicle_id])
+        starts.append(_naive(request.start))
+        ends.append(_naive(request.end))
+
+    if valid:
+        priced = (_price_numpy if np is not None else _price_python)(table, model_ids, starts, ends)
+        for position, index in enumerate(valid):
+            request = requests[index]
+            if not priced["found"][position]:
+                results[index] = {"index": index, "ok": False, "error": f"model_id={model_ids[position]}: модель не найдена"}
+                continue
+            results[index] = {
+                "index": index, "ok": True,
+                "model_id": model_ids[position], "vehicle_id": request.vehicle_id,
+                "start": request.start, "end": request.end,
+                "days": priced["days"][position], "weekend_days": priced["weekend_days"][position],
+                **{key: _money(priced[key][position]) for key in MONEY_FIELDS},
+            }
+    succeeded = sum(1 for r in results if r["ok"])
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+
+def quote_total(session: Session, model_id: int, start: datetime, end: datetime) -> Optional[Decimal]:
+    """Стоимость одной аренды модели (total) — для заказа без total_cost; None, если модели нет."""
+    table = rate_table(session)
+    priced = (_price_numpy if np is not None else _price_python)(table, [model_id], [_naive(start)], [_naive(end)])
+    return Decimal(_money(priced["total"][0])) if priced["found"][0] else None
+
+
+def pricing_status() -> dict:
+    table = _table
+    return {
+        "engine": "numpy" if np is not None else "python",
+        "weekend_surcharge": PRICING_WEEKEND_SURCHARGE,
+        "duration_discounts": DISCOUNT_TIERS,
+        "models": len(table.rates) if table else None,
+        "vehicles": len(table.vehicle_models) if table else None,
+        "loaded_at": table.loaded_at.isoformat(timespec="seconds") if table else None,
+    }
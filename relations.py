@@ -0,0 +1,86 @@
+"""Загрузка связанных записей одним-двумя запросами через Relationship из models.py.
+
+Записи, перенесённые в архив (archive.py), находятся в архивных таблицах; их связи ищутся
+там же по тем же внешним ключам, а в ответе есть "archived": true.
+"""
+from sqlalchemy.orm import MANYTOONE, joinedload, selectinload
+from sqlmodel import Session, select
+
+from archive import ARCHIVES
+from models import (
+    CarModel, Vehicle, Client, Employee, RentalOrder,
+    Maintenance, Fine, Payment, InsurancePolicy, Review
+)
+
+# Какие Relationship показываются в окне "Связанные записи" для каждой модели
+RELATED = {
+    CarModel: ("vehicles",),
+    Vehicle: ("maintenances", "orders", "insurance"),
+    Client: ("orders",),
+    Employee: ("orders",),
+    RentalOrder: ("payments", "fines", "review", "vehicle", "client"),
+    Maintenance: ("vehicle",),
+    InsurancePolicy: ("vehicle",),
+    Review: ("order",),
+    Payment: ("order",),
+    Fine: ("order",),
+}
+
+
+def _loader(attr):
+    # Родителей (many-to-one) подтягиваем JOIN'ом в основном запросе,
+    # коллекции детей — одним SELECT ... WHERE fk IN (...) на каждую связь
+    if attr.property.uselist:
+        return selectinload(attr)
+    return joinedload(attr)
+
+
+def _dump(obj):
+    return obj.model_dump(mode="json", by_alias=True)
+
+
+def load_related(session: Session, model, item_id: int):
+    """Возвращает {'item': ..., 'related': {имя связи: запись | список | None}} или None, если записи нет."""
+    names = RELATED.get(model, ())
+    attrs = [getattr(model, name) for name in names]
+    statement = select(model).where(model.id == item_id).options(*[_loader(a) for a in attrs])
+    item = session.exec(statement).unique().first()
+    if item is None:
+        return load_archived(session, model, item_id) if model in ARCHIVES else None
+
+    related = {}
+    for name, attr in zip(names, attrs):
+        value = getattr(item, name)
+        if attr.property.uselist:
+            related[name] = [_dump(x) for x in value]
+        else:
+            related[name] = _dump(value) if value is not None else None
+    return {"item": _dump(item), "related": related}
+
+
+def load_archived(session: Session, model, item_id: int):
+    """То же для архивной записи: связи по внешним ключам, архивные — из архивных таблиц.
+
+    Отдельный запрос на каждую связь: архивные записи открывают редко.
+    """
+    item = session.get(ARCHIVES[model], item_id)
+    if item is None:
+        return None
+    related = {}
+    for name in RELATED.get(model, ()):
+        prop = getattr(model, name).property
+        target = prop.mapper.class_
+        source = ARCHIVES.get(target, target)
+        if prop.direction is MANYTOONE:
+            # Родитель: заказ архивной записи — тоже в архиве, машина и клиент — в оперативных таблицах
+            (column,) = prop.local_columns
+            parent = session.get(source, getattr(item, column.key))
+            related[name] = _dump(parent) if parent is not None else None
+        else:
+            (column,) = prop.remote_side
+            children = session.exec(select(source).where(getattr(source, column.key) == item_id)).all()
+            if prop.uselist:
+                related[name] = [_dump(x) for x in children]
+            else:
+                related[name] = _dump(children[0]) if children else None
+    return {"item": _dump(item), "related": related, "archived": True}
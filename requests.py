@@ -1,15 +1,16 @@
 # requests.py
-from sqlmodel import SQLModel, Session, select, func
+from sqlmodel import Session, select, func
 from datetime import datetime, timedelta, date
 from decimal import Decimal
 
 # Импортируем наши файлы
 from database import engine
+from migrate import migrate
 from models import *
 
 def create_db_and_tables():
-    """Создает таблицы в БД PostgreSQL"""
-    SQLModel.metadata.create_all(engine)
+    """Создает таблицы в БД PostgreSQL и применяет миграции (migrate.py)"""
+    migrate(engine)
     print("Таблицы успешно созданы!")
 
 def seed_data():
@@ -0,0 +1,210 @@
+"""Планировщик фоновых задач: периодические задачи выполняются по очереди одним рабочим потоком.
+
+Задачи (configure_scheduler), интервал 0 — только ручной запуск POST /jobs/{name}/run:
+- archive — перенос старых закрытых заказов в архив и очистка надгробий (archive.py),
+  ARCHIVE_INTERVAL_SECONDS;
+- overdue — штрафы за просрочку возврата (overdue.py), OVERDUE_INTERVAL_SECONDS.
+
+Поток таймера ставит наступившие задачи в очередь на SCHEDULER_QUEUE_SIZE задач, рабочий поток
+выполняет их по одной, поэтому задачи не нагружают БД одновременно. Задача, которая уже ждёт
+в очереди или выполняется, второй раз не ставится, при заполненной очереди запуск пропускается
+(skipped) — долгая задача не копит отставание.
+
+Где выполняются задачи (SCHEDULER):
+- app — (по умолчанию) в каждом процессе приложения. Задачи можно запускать параллельно из
+  нескольких процессов (FOR UPDATE SKIP LOCKED, уникальные индексы), но лишняя работа повторяется;
+- off — в приложении планировщик не запускается, задачи выполняет отдельный процесс:
+    python scheduler.py
+
+Состояние — GET /health/jobs и метрики app_job_* в /metrics.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from archive import ARCHIVE_INTERVAL_SECONDS, archive_job
+from overdue import OVERDUE_INTERVAL_SECONDS, fine_overdue_orders
+
+SCHEDULER = os.getenv("SCHEDULER", "app")
+SCHEDULER_QUEUE_SIZE = int(os.getenv("SCHEDULER_QUEUE_SIZE", "10"))
+
+logger = logging.getLogger("car_rental.scheduler")
+
+
+class Job:
+    """Периодическая задача и статистика её запусков."""
+
+    def __init__(self, name: str, interval: float, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = time.monotonic() + interval if interval > 0 else None
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.running = False
+        self.last_run = None
+        self.last_seconds = None
+        self.last_result = None
+        self.error = None
+
+    def status(self) -> dict:
+        return {
+            "interval_seconds": self.interval, "running": self.running,
+            "runs": self.runs, "failures": self.failures, "skipped": self.skipped,
+            "last_run": self.last_run, "last_seconds": self.last_seconds,
+            "last_result": self.last_result, "error": self.error,
+        }
+
+
+class Scheduler:
+    def __init__(self, max_queue: int = SCHEDULER_QUEUE_SIZE):
+        self.jobs = {}
+        self.queue = queue.Queue(maxsize=max_queue)
+        self._pending = set()  # имена задач в очереди или в работе
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def add(self, name: str, interval: float, func):
+        self.jobs[name] = Job(name, interval, func)
+
+    @property
+    def started(self) -> bool:
+        return bool(self._threads)
+
+    def submit(self, name: str) -> bool:
+        """Ставит задачу в очередь; False — она уже в очереди или выполняется, либо очередь заполнена."""
+        job = self.jobs[name]
+        with self._lock:
+            if name in self._pending:
+                job.skipped += 1
+                return False
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                job.skipped += 1
+                logger.warning("Задача %s пропущена: очередь заполнена", name)
+                return False
+            self._pending.add(name)
+        return True
+
+    def run(self, job: Job):
+        started = time.monotonic()
+        job.running = True
+        try:
+            job.last_result = job.func()
+            job.error = None
+        except Exception as e:
+            job.failures += 1
+            job.error = str(e)
+            logger.exception("Задача %s: ошибка", job.name)
+        finally:
+            job.running = False
+            job.runs += 1
+            job.last_seconds = round(time.monotonic() - started, 3)
+            job.last_run = datetime.now().isoformat(timespec="seconds")
+
+    def _tick(self):
+        while True:
+            now = time.monotonic()
+            periodic = [job for job in self.jobs.values() if job.next_run is not None]
+            for job in periodic:
+                if job.next_run <= now:
+                    # Следующий запуск отсчитывается от постановки в очередь, а не от завершения
+                    job.next_run = now + job.interval
+                    self.submit(job.name)
+            wait = min(job.next_run for job in periodic) - time.monotonic() if periodic else None
+            if self._stop.wait(max(wait, 0) if wait is not None else None):
+                return
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            try:
+                self.run(job)
+            finally:
+                with self._lock:
+                    self._pending.discard(job.name)
+
+    def start(self):
+        if self.started:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._tick, name="scheduler", daemon=True),
+            threading.Thread(target=self._work, name="scheduler-worker", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Останавливает таймер; задачи из очереди не выполняются, текущая дорабатывает в фоне."""
+        if not self.started:
+            return
+        self._stop.set()
+        with self._lock:
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._pending = {job.name for job in self.jobs.values() if job.running}
+        self.queue.put(None)
+        self._threads = []
+
+    def status(self) -> dict:
+        return {
+            "started": self.started,
+            "queued": self.queue.qsize(),
+            "max_queue": self.queue.maxsize,
+            "jobs": {name: job.status() for name, job in self.jobs.items()},
+        }
+
+
+scheduler = Scheduler()
+
+
+def configure_scheduler(engine):
+    """Регистрирует задачи; в приложении запускать их будет start_scheduler."""
+    if scheduler.jobs:
+        return
+    scheduler.add("archive", ARCHIVE_INTERVAL_SECONDS, lambda: archive_job(engine))
+    scheduler.add("overdue", OVERDUE_INTERVAL_SECONDS, lambda: fine_overdue_orders(engine))
+
+
+def start_scheduler():
+    if SCHEDULER == "app":
+        scheduler.start()
+
+
+def stop_scheduler():
+    scheduler.stop()
+
+
+def scheduler_status() -> dict:
+    return {"mode": SCHEDULER, **scheduler.status()}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    from database import engine
+    configure_scheduler(engine)
+    scheduler.start()
+    logger.info("Планировщик: задачи %s", ", ".join(
+        f"{name} раз в {job.interval:g} с" for name, job in scheduler.jobs.items() if job.interval > 0
+    ) or "без расписания")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""Поиск клиентов и автомобилей по фрагменту: GET /search/?q=ива&resources=clients,vehicles&limit=20.
+
+Поля поиска — SEARCH_FIELDS: ФИО, телефон и номер прав клиента, госномер и VIN автомобиля.
+Находятся записи, где запрос входит в поле как подстрока (регистр не важен), а также похожие
+с опечаткой. Результаты по каждому ресурсу упорядочены по score (0..1, больше — лучше).
+
+Индекс (SEARCH_BACKEND):
+- trgm  — PostgreSQL с pg_trgm: GiST-индексы из migrations/006_search_trgm.sql. По каждому полю
+  один запрос "ILIKE '%q%' или q <% поле" с ORDER BY по расстоянию <<-> и LIMIT — индекс сразу
+  отдаёт лучшие строки, не перебирая все совпадения. score — word_similarity;
+- ngram — индекс триграмм в памяти процесса (SQLite, PostgreSQL без pg_trgm). Строится при первом
+  поиске по ресурсу и догружает изменения по updated_at и надгробиям (sync.py) не чаще раза
+  в SEARCH_REFRESH_SECONDS. Занимает память порядка размера проиндексированных полей;
+- auto  — (по умолчанию) trgm, если расширение pg_trgm установлено, иначе ngram.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import literal, or_, text
+from sqlmodel import Session, select
+
+from models import Client, Vehicle, utcnow
+from sync import SYNC_LAG_SECONDS, deleted_ids
+
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+SEARCH_MIN_LENGTH = int(os.getenv("SEARCH_MIN_LENGTH", "3"))
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "100"))
+SEARCH_REFRESH_SECONDS = float(os.getenv("SEARCH_REFRESH_SECONDS", "2"))
+# Доля общих триграмм, с которой запись без точного вхождения считается похожей
+SEARCH_FUZZY_THRESHOLD = float(os.getenv("SEARCH_FUZZY_THRESHOLD", "0.6"))
+
+logger = logging.getLogger("car_rental.search")
+
+# Ресурс -> (модель, поля поиска)
+SEARCH_FIELDS = {
+    "clients": (Client, ("full_name", "phone", "driver_license_num")),
+    "vehicles": (Vehicle, ("license_plate", "vin_code")),
+}
+
+# Сколько строк читать за раз при построении индекса в памяти
+NGRAM_LOAD_CHUNK = 10000
+
+
+def normalize(value: str) -> str:
+    return " ".join(value.lower().split())
+
+
+def parse_query(q: str) -> str:
+    query = normalize(q)
+    if len(query) < SEARCH_MIN_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Запрос короче {SEARCH_MIN_LENGTH} символов")
+    return query
+
+
+def parse_resources(raw) -> list:
+    wanted = [r.strip() for r in raw.split(",") if r.strip()] if raw else list(SEARCH_FIELDS)
+    unknown = sorted(set(wanted) - SEARCH_FIELDS.keys())
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Поиск не поддерживается для: {', '.join(unknown)}")
+    return list(dict.fromkeys(wanted))
+
+
+# Символ экранирования в LIKE: не обратная косая черта, чтобы литерал не зависел от диалекта
+LIKE_ESCAPE = "!"
+
+
+def _like_pattern(query: str) -> str:
+    escaped = query.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    return f"%{escaped}%"
+
+
+# ---------- PostgreSQL: pg_trgm ----------
+
+def _search_trgm(session: Session, model, fields, query: str, limit: int) -> list:
+    """[(score, id, поле)] — лучшие limit по каждому полю, по записи остаётся лучшее поле."""
+    pattern = _like_pattern(query)
+    best = {}
+    for name in fields:
+        column = getattr(model, name)
+        distance = literal(query).op("<<->")(column)
+        statement = (
+            select(model.id, distance)
+            .where(or_(column.ilike(pattern, escape=LIKE_ESCAPE), literal(query).op("<%", is_comparison=True)(column)))
+            .order_by(distance)
+            .limit(limit)
+        )
+        for row_id, dist in session.execute(statement):
+            score = 1.0 - float(dist)
+            if row_id not in best or score > best[row_id][0]:
+                best[row_id] = (score, row_id, name)
+    return list(best.values())
+
+
+# ---------- Индекс триграмм в памяти ----------
+
+def trigrams(value: str) -> set:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class NgramIndex:
+    """Триграммы полей -> id записей одного ресурса. Все обращения — под блокировкой."""
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self.docs = {}      # id -> нормализованные значения полей
+        self.postings = {}  # триграмма -> id
+        self.synced_at = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def _add(self, row_id: int, values: tuple):
+        self.docs[row_id] = values
+        for gram in set().union(*(trigrams(v) for v in values)):
+            self.postings.setdefault(gram, set()).add(row_id)
+
+    def _remove(self, row_id: int):
+        values = self.docs.pop(row_id, None)
+        if values is None:
+            return
+        for gram in set().union(*(trigrams(v) for v in values)):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(row_id)
+                if not ids:
+                    del self.postings[gram]
+
+    def _load(self, session: Session, since=None):
+        columns = [getattr(self.model, name) for name in self.fields]
+        statement = select(self.model.id, *columns).execution_options(yield_per=NGRAM_LOAD_CHUNK)
+        if since is not None:
+            statement = statement.where(self.model.updated_at >= since)
+        for row_id, *values in session.execute(statement):
+            self._remove(row_id)
+            self._add(row_id, tuple(normalize(v or "") for v in values))
+
+    def refresh(self, session: Session):
+        """Первый вызов строит индекс, следующие догружают изменения и удаления."""
+        if time.monotonic() - self.checked_at < SEARCH_REFRESH_SECONDS:
+            return
+        # Как и у токена синхронизации: время берётся до чтения, изменения — с запасом
+        now = utcnow()
+        if self.synced_at is None:
+            started = time.monotonic()
+            self._load(session)
+            logger.info("Поиск: индекс %s построен, %s записей за %.1f с",
+                        self.model.__tablename__, len(self.docs), time.monotonic() - started)
+        else:
+            since = self.synced_at - timedelta(seconds=SYNC_LAG_SECONDS)
+            self._load(session, since)
+            for row_id in deleted_ids(session, self.model, since):
+                self._remove(row_id)
+        self.synced_at = now
+        self.checked_at = time.monotonic()
+
+    def _matches(self, grams: set) -> set:
+        # Пересечение списков, начиная с самого короткого
+        lists = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+        if not lists or not lists[0]:
+            return set()
+        result = set(lists[0])
+        for ids in lists[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def search(self, query: str, limit: int) -> list:
+        """[(score, id, поле)]: вхождения подстроки — score от 0.5 до 1 (точное совпадение — 1),
+        похожие без вхождения — ниже 0.5."""
+        grams = trigrams(query)
+        found = {}
+        for row_id in self._matches(grams):
+            for name, value in zip(self.fields, self.docs[row_id]):
+                if query in value:
+                    score = 0.5 + 0.5 * len(query) / len(value)
+                    if score > found.get(row_id, (0,))[0]:
+                        found[row_id] = (score, row_id, name)
+        if len(found) < limit and grams:
+            # Опечатки: записи, у которых есть большая часть триграмм запроса
+            shared = Counter()
+            for gram in grams:
+                shared.update(self.postings.get(gram, ()))
+            need = SEARCH_FUZZY_THRESHOLD * len(grams)
+            for row_id, count in shared.items():
+                if count >= need and row_id not in found:
+                    found[row_id] = (0.5 * count / len(grams), row_id, self._best_field(row_id, grams))
+        return heapq.nlargest(limit, found.values(), key=lambda hit: (hit[0], -hit[1]))
+
+    def _best_field(self, row_id: int, grams: set) -> str:
+        values = self.docs[row_id]
+        return max(zip(self.fields, values), key=lambda item: len(grams & trigrams(item[1])))[0]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _ngram_index(resource: str) -> NgramIndex:
+    with _indexes_lock:
+        if resource not in _indexes:
+            _indexes[resource] = NgramIndex(*SEARCH_FIELDS[resource])
+        return _indexes[resource]
+
+
+def _search_ngram(session: Session, resource: str, query: str, limit: int) -> list:
+    index = _ngram_index(resource)
+    with index.lock:
+        index.refresh(session)
+        return index.search(query, limit)
+
+
+# ---------- Выбор индекса и запрос ----------
+
+_backend = "ngram"
+
+
+def configure_search(engine):
+    """Выбирает индекс поиска при старте приложения (SEARCH_BACKEND)."""
+    global _backend
+    backend = SEARCH_BACKEND
+    if backend == "auto":
+        backend = "trgm" if _has_trgm(engine) else "ngram"
+    _backend = backend
+    logger.info("Поиск: индекс %s", backend)
+
+
+def _has_trgm(engine) -> bool:
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
+
+def search(session: Session, q: str, resources=None, limit: int = 20) -> dict:
+    """{ресурс: [{"score", "field", "item"}]} — не больше limit записей на ресурс."""
+    query = parse_query(q)
+    result = {}
+    for resource in parse_resources(resources):
+        model, fields = SEARCH_FIELDS[resource]
+        if _backend == "trgm":
+            hits = _search_trgm(session, model, fields, query, limit)
+            hits = heapq.nlargest(limit, hits, key=lambda hit: (hit[0], -hit[1]))
+        else:
+            hits = _search_ngram(session, resource, query, limit)
+        rows = {}
+        if hits:
+            statement = select(model).where(model.id.in_([hit[1] for hit in hits]))
+            rows = {row.id: row for row in session.exec(statement)}
+        # Запись могла быть удалена после построения индекса — такие пропускаем
+        result[resource] = [
+            {"score": round(score, 3), "field": field, "item": rows[row_id]}
+            for score, row_id, field in hits if row_id in rows
+        ]
+    return result
+
+
+def search_status() -> dict:
+    status = {"backend": _backend}
+    if _backend == "ngram":
+        status["indexes"] = {
+            resource: {"records": len(index.docs), "trigrams": len(index.postings),
+                       "synced_at": index.synced_at.isoformat() + "Z" if index.synced_at else None}
+            for resource, index in _indexes.items()
+        }
+    return status
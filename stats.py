@@ -0,0 +1,137 @@
+"""Сводка для панели автопарка: машины по статусам, заказы по статусам, неоплаченные штрафы, выручка за день.
+
+В PostgreSQL значения хранятся в таблице fleet_counter и обновляются триггерами
+из migrations/003_fleet_stats.sql в той же транзакции, что и изменение данных, поэтому
+GET /stats/ читает несколько строк независимо от размера таблиц. Без миграции (и в SQLite)
+сводка считается агрегатными запросами по исходным таблицам.
+
+GET /stats/check пересчитывает все счётчики с нуля и сравнивает с сохранёнными.
+
+Заказы, платежи и штрафы, перенесённые в архив (archive.py), в сводке остаются: пересчёт читает
+их вместе с архивом, а триггеры пропускают DELETE переноса (migrations/009_archive_stats.sql).
+"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, select, text
+from sqlmodel import Session
+
+from archive import with_archive
+from models import Vehicle, RentalOrder, Fine, Payment
+
+COUNTER_TABLE = "fleet_counter"
+
+# Какие платежи считаются выручкой (должно совпадать с триггером fleet_stats_payment)
+REVENUE_PAYMENT_TYPES = ("Income",)
+
+# Метрики-количества; остальные — денежные суммы
+COUNT_METRICS = ("vehicles_by_status", "orders_by_status", "unpaid_fines_count")
+
+
+def _day_key(value) -> str:
+    # date() в PostgreSQL возвращает date, в SQLite — строку
+    return value if isinstance(value, str) else value.isoformat()
+
+
+def recompute_counters(session: Session, day: date = None) -> dict:
+    """Счётчики по исходным таблицам и архиву: {(metric, key): value}. day — выручка только за этот день."""
+    counters = {}
+    for status, count in session.execute(select(Vehicle.status, func.count()).group_by(Vehicle.status)):
+        counters[("vehicles_by_status", status)] = count
+    orders = select(RentalOrder.order_status, func.count()).group_by(RentalOrder.order_status)
+    for status, count in session.execute(with_archive(orders, RentalOrder)):
+        counters[("orders_by_status", status)] = count
+
+    count, total = session.execute(with_archive(
+        select(func.count(), func.coalesce(func.sum(Fine.amount), 0)).where(Fine.is_paid == False),  # noqa: E712
+        Fine,
+    )).one()
+    counters[("unpaid_fines_count", "")] = count
+    counters[("unpaid_fines_total", "")] = total
+
+    payment_day = func.date(Payment.payment_date)
+    revenue = select(payment_day, func.sum(Payment.amount)).where(Payment.payment_type.in_(REVENUE_PAYMENT_TYPES))
+    if day is not None:
+        # Диапазон, а не date(payment_date) = day, чтобы работал индекс по payment_date
+        start = datetime.combine(day, time.min)
+        revenue = revenue.where(Payment.payment_date >= start, Payment.payment_date < start + timedelta(days=1))
+    for payment_date, amount in session.execute(with_archive(revenue.group_by(payment_day), Payment)):
+        counters[("revenue_by_day", _day_key(payment_date))] = amount
+    return counters
+
+
+def has_counter_table(session: Session) -> bool:
+    if session.get_bind().dialect.name != "postgresql":
+        return False
+    return session.execute(text(f"SELECT to_regclass('{COUNTER_TABLE}')")).scalar() is not None
+
+
+def read_counters(session: Session, day: date = None) -> dict:
+    """Сохранённые триггерами счётчики; day — из выручки только этот день."""
+    statement = f"SELECT metric, key, value FROM {COUNTER_TABLE}"
+    params = {}
+    if day is not None:
+        statement += " WHERE metric <> 'revenue_by_day' OR key = :day"
+        params["day"] = day.isoformat()
+    return {(metric, key): value for metric, key, value in session.execute(text(statement), params)}
+
+
+def _normalize(counters: dict) -> dict:
+    # Нулевые строки (все машины ушли из статуса) равносильны отсутствующим
+    result = {}
+    for (metric, key), value in counters.items():
+        value = int(value) if metric in COUNT_METRICS else Decimal(value).quantize(Decimal("0.01"))
+        if value:
+            result[(metric, key)] = value
+    return result
+
+
+def summary(counters: dict, day: date) -> dict:
+    counters = _normalize(counters)
+
+    def by_key(metric):
+        return {key: value for (m, key), value in sorted(counters.items()) if m == metric}
+
+    orders = by_key("orders_by_status")
+    return {
+        "day": day.isoformat(),
+        "vehicles_by_status": by_key("vehicles_by_status"),
+        "orders_by_status": orders,
+        "open_orders": orders.get("Open", 0),
+        "unpaid_fines": {
+            "count": counters.get(("unpaid_fines_count", ""), 0),
+            "total": str(counters.get(("unpaid_fines_total", ""), Decimal("0.00"))),
+        },
+        "revenue": str(counters.get(("revenue_by_day", day.isoformat()), Decimal("0.00"))),
+    }
+
+
+def get_stats(session: Session, day: date) -> dict:
+    if has_counter_table(session):
+        return {**summary(read_counters(session, day), day), "source": "counters"}
+    return {**summary(recompute_counters(session, day), day), "source": "recompute"}
+
+
+def check_stats(session: Session, fix: bool = False) -> dict:
+    """Полный пересчёт и сравнение со счётчиками; fix=True перестраивает счётчики."""
+    if session.get_bind().dialect.name == "postgresql":
+        # Счётчики и пересчёт должны видеть один снимок данных, иначе параллельные записи дадут ложные расхождения
+        session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    if not has_counter_table(session):
+        return {"consistent": True, "source": "recompute", "differences": [], "fixed": False}
+
+    stored = _normalize(read_counters(session))
+    actual = _normalize(recompute_counters(session))
+    differences = [
+        {"metric": metric, "key": key, "counter": str(stored.get((metric, key), 0)), "actual": str(actual.get((metric, key), 0))}
+        for metric, key in sorted(stored.keys() | actual.keys())
+        if stored.get((metric, key), 0) != actual.get((metric, key), 0)
+    ]
+    fixed = False
+    if differences and fix:
+        # Перестройка — в новой транзакции READ COMMITTED: после LOCK TABLE она видит все зафиксированные изменения
+        session.commit()
+        session.execute(text("SELECT fleet_stats_rebuild()"))
+        session.commit()
+        fixed = True
+    return {"consistent": not differences, "source": "counters", "differences": differences, "fixed": fixed}
@@ -0,0 +1,87 @@
+"""Синхронизация списков по изменениям: ?updated_since=<токен> вместо повторной загрузки всего ресурса.
+
+У каждой записи есть updated_at (models.updated_at_field), удаления оставляют надгробие в
+таблице tombstone. Первая страница любого списка отдаёт токен синхронизации в заголовке
+X-Sync-Token — время сервера на момент запроса. Клиент сохраняет его и позже запрашивает
+GET /{resource}/?updated_since=<токен>: в ответе {"items": [изменённые и новые записи],
+"deleted": [id удалённых]} и новый токен.
+
+Транзакция, начатая до выдачи токена, может зафиксироваться после неё со старым updated_at,
+поэтому изменения отбираются с запасом SYNC_LAG_SECONDS: часть строк придёт повторно, и клиент
+просто заменяет их по id. Надгробия старше TOMBSTONE_DAYS удаляет archive.py (фоном или вручную);
+токен старше этого срока отклоняется с 410 — клиенту нужно загрузить список заново. Так же (410)
+отклоняется токен, после которого удалено больше SYNC_MAX_DELETED записей: список deleted не
+растёт без предела, а загрузить список заново тогда не дороже.
+
+Время изменения ставит приложение (crud, bulk, импорт). Изменения в обход API (psql) не учитываются.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert
+from sqlmodel import Session, select
+
+from models import Tombstone, utcnow
+
+SYNC_LAG_SECONDS = float(os.getenv("SYNC_LAG_SECONDS", "5"))
+TOMBSTONE_DAYS = int(os.getenv("TOMBSTONE_DAYS", "30"))
+SYNC_MAX_DELETED = int(os.getenv("SYNC_MAX_DELETED", "10000"))
+
+# Заголовок, в котором первая страница списка возвращает токен синхронизации
+SYNC_TOKEN_HEADER = "X-Sync-Token"
+
+
+def sync_token() -> str:
+    """Токен — время сервера в UTC (ISO 8601). Берётся до чтения страницы."""
+    return utcnow().isoformat() + "Z"
+
+
+def parse_since(raw: str) -> datetime:
+    """Нижняя граница updated_at для токена: время токена минус SYNC_LAG_SECONDS."""
+    try:
+        since = datetime.fromisoformat(raw.strip())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный токен синхронизации (updated_since)")
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    if since < utcnow() - timedelta(days=TOMBSTONE_DAYS):
+        raise HTTPException(
+            status_code=410,
+            detail=f"Токен синхронизации старше {TOMBSTONE_DAYS} дн.: загрузите список заново",
+        )
+    return since - timedelta(seconds=SYNC_LAG_SECONDS)
+
+
+def record_deletes(session: Session, model, ids: Iterable[int]):
+    """Надгробия удалённых записей — в той же транзакции, что и DELETE."""
+    rows = [{"table_name": model.__tablename__, "row_id": row_id, "deleted_at": utcnow()} for row_id in ids]
+    if rows:
+        session.execute(insert(Tombstone), rows)
+
+
+def deleted_ids(session: Session, model, since: datetime) -> list:
+    """id записей таблицы, удалённых начиная с since; больше SYNC_MAX_DELETED — 410."""
+    statement = (
+        select(Tombstone.row_id)
+        .where(Tombstone.table_name == model.__tablename__, Tombstone.deleted_at >= since)
+        .distinct()
+        .order_by(Tombstone.row_id)
+        .limit(SYNC_MAX_DELETED + 1)
+    )
+    ids = list(session.execute(statement).scalars())
+    if len(ids) > SYNC_MAX_DELETED:
+        raise HTTPException(
+            status_code=410,
+            detail=f"После токена синхронизации удалено больше {SYNC_MAX_DELETED} записей: загрузите список заново",
+        )
+    return ids
+
+
+def prune_tombstones(session: Session) -> int:
+    """Удаляет надгробия старше TOMBSTONE_DAYS; возвращает их число."""
+    cutoff = utcnow() - timedelta(days=TOMBSTONE_DAYS)
+    result = session.execute(delete(Tombstone).where(Tombstone.deleted_at < cutoff))
+    session.commit()
+    return result.rowcount